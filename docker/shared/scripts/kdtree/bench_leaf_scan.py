@@ -0,0 +1,84 @@
+import os
+import time
+from typing import List, Tuple
+
+import cppyy
+
+from kdtree_6 import (
+    FILE,
+    BATCH,
+    START_DATE,
+    END_DATE,
+    DISC,
+    QTY_LT,
+    RESULT_DIR,
+    build_kd_tree,
+    date_to_int32,
+)
+from common_kdtree import to_scaled_int, write_csv_results
+
+NUM_RUNS = 20
+
+FIELDNAMES = [
+    "Box",
+    "Leaf Scan",
+    "Matches",
+    "Latency (s)",
+    "Speedup",
+]
+
+
+def _boxes() -> List[Tuple[str, List[int], List[int]]]:
+    start = date_to_int32(START_DATE)
+    end   = date_to_int32(END_DATE) - 1
+    disc  = to_scaled_int(DISC)
+    qty   = to_scaled_int(QTY_LT) - 1
+    return [
+        ("q6",        [start, disc, 0],      [end, disc, qty]),
+        ("q6_disc",   [start, disc - 1, 0],  [end, disc + 1, qty]),
+        ("year",      [start, 0, 0],         [end, to_scaled_int(1), to_scaled_int(100)]),
+        ("all_dates", [0, disc, 0],          [2**31 - 1, disc, qty]),
+    ]
+
+
+def _to_point(values: List[int]):
+    p = cppyy.gbl.std.array["int32_t", 3]()
+    for i, v in enumerate(values):
+        p[i] = v
+    return p
+
+
+def time_leaf_scan(kd_tree, lo, hi, scan, num_runs: int = NUM_RUNS):
+    kd_tree.setLeafScan(scan)
+    tree = kd_tree.tree()
+    matches = tree.range_query(lo, hi).size()
+    t0 = time.perf_counter()
+    for _ in range(num_runs):
+        tree.range_query(lo, hi)
+    return matches, (time.perf_counter() - t0) / num_runs
+
+
+if __name__ == "__main__":
+    os.makedirs(RESULT_DIR, exist_ok=True)
+
+    kd_tree, _, _ = build_kd_tree(
+        FILE, BATCH, "l_shipdate", "l_discount", "l_quantity"
+    )
+    LeafScan = cppyy.gbl.skd.LeafScan
+
+    rows = []
+    for name, lo, hi in _boxes():
+        lo_p, hi_p = _to_point(lo), _to_point(hi)
+        n_scalar, t_scalar = time_leaf_scan(kd_tree, lo_p, hi_p, LeafScan.Scalar)
+        n_simd,   t_simd   = time_leaf_scan(kd_tree, lo_p, hi_p, LeafScan.Simd)
+        if n_scalar != n_simd:
+            raise RuntimeError(
+                f"leaf scan mismatch on {name}: scalar={n_scalar} simd={n_simd}"
+            )
+        rows.append({"Box": name, "Leaf Scan": "scalar", "Matches": n_scalar,
+                     "Latency (s)": t_scalar, "Speedup": 1.0})
+        rows.append({"Box": name, "Leaf Scan": "avx2", "Matches": n_simd,
+                     "Latency (s)": t_simd,
+                     "Speedup": t_scalar / t_simd if t_simd > 0 else None})
+
+    write_csv_results(os.path.join(RESULT_DIR, "leaf_scan.csv"), FIELDNAMES, rows)
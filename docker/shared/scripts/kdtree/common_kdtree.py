@@ -1,12 +1,148 @@
 import os
 import sys
 import csv
-from typing import Dict, Iterable
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import cppyy
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from datafusion import SessionContext
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from common import measure_query_execution
 
+DECIMAL_SCALE = 100
+BUCKET_SIZES  = (8, 16, 32, 64, 128, 256)
+CURSOR_BLOCK  = 1 << 16
+INDEXES       = ("kdtree", "strtree")
+
+
+def to_scaled_int(value: float, scale: int = DECIMAL_SCALE) -> int:
+    return int(round(float(value) * scale))
+
+
+def epoch_days(arr) -> np.ndarray:
+    return pc.cast(arr, pa.int32()).to_numpy(zero_copy_only=False)
+
+
+def scaled_ints(arr, scale: int = DECIMAL_SCALE) -> np.ndarray:
+    vals = pc.cast(arr, pa.float64()).to_numpy(zero_copy_only=False)
+    return np.rint(vals * scale).astype(np.int32)
+
+
+def new_index(index: str, bucket_size: int = 32, split_rule: str = "Cycle"):
+    """Unbuilt 3-d int32 index: a KD-tree (leaf ``bucket_size``, axis chosen
+    by ``split_rule``) or an STR R-tree (node capacity ``bucket_size``)."""
+    if index == "strtree":
+        tree = cppyy.gbl.vec.TripleIntStrTree()
+        tree.setNodeCapacity(bucket_size)
+        return tree
+    tree = cppyy.gbl.vec.TripleIntKdTree()
+    tree.setSplitRule(getattr(cppyy.gbl.skd.SplitRule, split_rule))
+    tree.setBucketSize(bucket_size)
+    return tree
+
+
+def build_from_columns(tree,
+                       columns: Sequence[np.ndarray],
+                       row_ids: Optional[np.ndarray] = None,
+                       threads: int = 1):
+    """Bulk-load ``tree`` from one array per dimension.
+
+    The columns are stacked into a single contiguous buffer of the tree's
+    scalar type and handed to ``vKdTree.build_from_arrays``; ``row_ids``
+    defaults to the row positions 0..n-1.
+    """
+    cols = np.ascontiguousarray(np.asarray(columns))
+    n = cols.shape[1]
+    if row_ids is None:
+        ids = cppyy.nullptr
+    else:
+        ids = np.ascontiguousarray(row_ids, dtype=np.uint64)
+    tree.build_from_arrays(cols.ravel(), ids, n, threads)
+    return tree
+
+
+def cursor_mask(cursor, num_rows: int, block: int = CURSOR_BLOCK) -> np.ndarray:
+    """Drain a vKdTree cursor into a per-row selection mask, one block of
+    row ids at a time."""
+    mask = np.zeros(num_rows, dtype=bool)
+    buf  = np.empty(block, dtype=np.uint64)
+    while True:
+        n = cursor.next(buf, block)
+        if n == 0:
+            return mask
+        mask[buf[:n]] = True
+
+
+def write_filtered_parquet(file_path: str,
+                           mask: np.ndarray,
+                           batch_size: int,
+                           dest: str,
+                           float_cols: Iterable[str] = ()) -> int:
+    """Stream ``file_path`` batch by batch, ``take`` the rows selected by
+    ``mask`` and append them to ``dest``; ``float_cols`` are cast to float64
+    on the way. Returns the number of rows written."""
+    pf     = pq.ParquetFile(file_path)
+    schema = pf.schema_arrow
+    for name in float_cols:
+        if name in schema.names:
+            schema = schema.set(schema.get_field_index(name),
+                                pa.field(name, pa.float64()))
+
+    offset = written = 0
+    with pq.ParquetWriter(dest, schema) as writer:
+        for batch in pf.iter_batches(batch_size):
+            n     = batch.num_rows
+            local = np.flatnonzero(mask[offset:offset + n])
+            if len(local):
+                taken = pa.Table.from_batches([batch.take(pa.array(local))])
+                writer.write_table(taken.cast(schema))
+                written += len(local)
+            offset += n
+    return written
+
+
+def autotune_bucket_size(make_tree: Callable[[], object],
+                         columns: Sequence[np.ndarray],
+                         boxes: Sequence[Sequence[int]],
+                         bucket_sizes: Iterable[int] = BUCKET_SIZES,
+                         threads: int = 1,
+                         num_runs: int = 5) -> Tuple[int, List[Dict[str, float]]]:
+    """Build one tree per bucket size and time ``boxes`` against each.
+
+    ``make_tree`` returns an unbuilt vKdTree with its split rule (and
+    workload) already set; each box holds 2*Dim bounds. Returns the bucket
+    size with the lowest mean latency over the whole box set, plus one row
+    per candidate.
+    """
+    rows = []
+    for bucket in bucket_sizes:
+        tree = make_tree()
+        tree.setBucketSize(bucket)
+        t0 = time.perf_counter()
+        build_from_columns(tree, columns, threads=threads)
+        build_secs = time.perf_counter() - t0
+
+        for box in boxes:
+            tree.rangeSearchMany(box)
+        t0 = time.perf_counter()
+        for _ in range(num_runs):
+            for box in boxes:
+                tree.rangeSearchMany(box)
+        rows.append({
+            "Bucket Size":               bucket,
+            "Latency (s)":               (time.perf_counter() - t0) / num_runs,
+            "KD Tree Size (MB)":         tree.getMemoryUsage() / (1024 * 1024),
+            "KD Tree Creation Time (s)": build_secs,
+        })
+        del tree
+
+    best = min(rows, key=lambda r: r["Latency (s)"])["Bucket Size"]
+    return best, rows
+
 
 def aggregate_metrics(*metric_dicts: Dict[str, float]) -> Dict[str, float]:
     out: Dict[str, float] = {}
@@ -1,17 +1,25 @@
 import os
 import time
-from typing import Dict, List, Set, Tuple
+import argparse
+from typing import Dict, List, Tuple
 
 import duckdb
 import cppyy
+import numpy as np
 import pandas as pd
 import pyarrow.parquet as pq
 
 cppyy.add_include_path("./kdtree/src")
 cppyy.include("vkdtree.hpp")
+cppyy.include("strtree.hpp")
 cppyy.load_library("./kdtree/lib/libfast.so")
 
 from common_kdtree import (
+    to_scaled_int,
+    scaled_ints,
+    INDEXES,
+    new_index,
+    build_from_columns,
     measure_query_duckdb,
     measure_query_datafusion,
     write_csv_results,
@@ -25,6 +33,7 @@ PART_FILE = "../data/tpch/parquet/part.parquet"
 BATCH = 6_000_000
 QUERY_PATH = "../data/tpch/queries/19.sql"
 RESULT_DIR = "../results/kdtree/"
+BUILD_THREADS = os.cpu_count() or 1
 
 FIELDNAMES = [
     "Query",
@@ -45,10 +54,10 @@ SPECS: List[Tuple[str, List[str], int, int]] = [
 ]
 
 
-def _encode(value: str, mapping: Dict[str, int]) -> int:
-    if value not in mapping:
-        mapping[value] = len(mapping)
-    return mapping[value]
+def _codes(column) -> Tuple[np.ndarray, Dict[str, int]]:
+    encoded = column.combine_chunks().dictionary_encode()
+    mapping = {v: i for i, v in enumerate(encoded.dictionary.to_pylist())}
+    return encoded.indices.to_numpy().astype(np.int32), mapping
 
 
 def _cast_numeric(df: pd.DataFrame):
@@ -61,69 +70,66 @@ def build_kd_tree(
     lineitem_path: str,
     part_path: str,
     batch_size: int,
+    threads: int = BUILD_THREADS,
+    index: str = "kdtree",
 ):
-    Entry3 = cppyy.gbl.vec.TripleEntry
-    KD3 = cppyy.gbl.vec.TripleKdTree
+    t0 = time.perf_counter()
 
-    part_df = pq.read_table(
+    part = pq.read_table(
         part_path, columns=["p_partkey", "p_brand", "p_container"]
-    ).to_pandas()
-    part_lookup = part_df.set_index("p_partkey")[["p_brand", "p_container"]]
-
-    brand_codes: Dict[str, int] = {}
-    container_codes: Dict[str, int] = {}
+    )
+    brand_idx, brand_codes = _codes(part.column("p_brand"))
+    cont_idx, container_codes = _codes(part.column("p_container"))
 
-    total_rows = pq.ParquetFile(lineitem_path).metadata.num_rows
-    cpp_entries = cppyy.gbl.std.vector[Entry3]()
-    cpp_entries.reserve(total_rows)
+    part_keys = part.column("p_partkey").to_numpy()
+    order = np.argsort(part_keys, kind="stable")
+    part_keys = part_keys[order]
+    brand_idx, cont_idx = brand_idx[order], cont_idx[order]
 
-    enc_bytes = 0                  
+    brands, containers, qtys, row_ids = [], [], [], []
     offset = 0
-    t0 = time.perf_counter()
 
     pf = pq.ParquetFile(lineitem_path)
-    for batch in pf.iter_batches(batch_size):
-        df_li = batch.to_pandas()
-        merged = df_li.join(part_lookup, on="l_partkey", how="inner")
-        merged["l_quantity"] = merged["l_quantity"].astype("float32")
+    for batch in pf.iter_batches(batch_size, columns=["l_partkey", "l_quantity"]):
+        partkey = batch.column("l_partkey").to_numpy()
+        pos = np.minimum(np.searchsorted(part_keys, partkey), len(part_keys) - 1)
+        hit = np.flatnonzero(part_keys[pos] == partkey)
 
-        enc_bytes += len(merged) * 3 * 4  
+        brands.append(brand_idx[pos[hit]])
+        containers.append(cont_idx[pos[hit]])
+        qtys.append(scaled_ints(batch.column("l_quantity"))[hit])
+        row_ids.append(hit.astype(np.uint64) + offset)
 
-        for local_idx, row in merged.iterrows():
-            brand_code = float(_encode(row["p_brand"], brand_codes))
-            cont_code = float(_encode(row["p_container"], container_codes))
-            qty = float(row["l_quantity"])
+        offset += batch.num_rows
 
-            e = Entry3()
-            e.key = [brand_code, cont_code, qty]
-            e.value = offset + local_idx
-            cpp_entries.push_back(e)
+    cols = np.stack([np.concatenate(brands),
+                     np.concatenate(containers),
+                     np.concatenate(qtys)])
+    enc_bytes = cols.nbytes
 
-        offset += len(merged)
-
-    tree = KD3()
-    tree.build(cpp_entries)
+    tree = build_from_columns(new_index(index), cols,
+                              np.concatenate(row_ids), threads)
     build_secs = time.perf_counter() - t0
 
     return tree, brand_codes, container_codes, enc_bytes, build_secs
 
 
 def materialize_filtered_indices(
-    file_path: str, indices: Set[int], batch_size: int
+    file_path: str, indices: np.ndarray, batch_size: int
 ) -> pd.DataFrame:
-    if not indices:
+    """Rows of ``file_path`` at ``indices``, which must be sorted and unique."""
+    if not len(indices):
         return pd.DataFrame()
 
-    wanted = set(indices)
     out = []
     offset = 0
     pf = pq.ParquetFile(file_path)
     for batch in pf.iter_batches(batch_size):
-        df = batch.to_pandas()
-        n = len(df)
-        local = [i for i in range(n) if (i + offset) in wanted]
-        if local:
-            out.append(df.iloc[local])
+        n = len(batch)
+        lo, hi = np.searchsorted(indices, [offset, offset + n])
+        if hi > lo:
+            local = (indices[lo:hi] - offset).astype(np.int64)
+            out.append(batch.to_pandas().iloc[local])
         offset += n
 
     return pd.concat(out, ignore_index=True) if out else pd.DataFrame()
@@ -155,26 +161,35 @@ def prepare_datafusion(df_lineitem: pd.DataFrame, part_file: str, query_file: st
     return ctx, open(query_file).read()
 
 
-def _collect_indices(kd_tree, brand_map, cont_map) -> Set[int]:
-    indices: Set[int] = set()
+def _query_boxes(brand_map, cont_map) -> List[int]:
+    boxes: List[int] = []
     for brand, containers, qmin, qmax in SPECS:
-        b_code = float(brand_map[brand])
+        b_code = brand_map[brand]
         for cont in containers:
-            c_code = float(cont_map[cont])
-            res = kd_tree.rangeSearch(
-                b_code, c_code, float(qmin),
-                b_code, c_code, float(qmax),
-            ).entries
-            indices.update(int(e.value) for e in res)
-    return indices
+            c_code = cont_map[cont]
+            boxes += [b_code, c_code, to_scaled_int(qmin),
+                      b_code, c_code, to_scaled_int(qmax)]
+    return boxes
+
+
+def _collect_indices(kd_tree, brand_map, cont_map) -> np.ndarray:
+    # rangeSearchMany returns each row id once, in the tree's slot order;
+    # sorting them lets materialize_filtered_indices slice batches directly.
+    return np.sort(np.array(kd_tree.rangeSearchMany(_query_boxes(brand_map, cont_map)),
+                            dtype=np.uint64), kind="stable")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TPC-H Q19 through a multidimensional index")
+    parser.add_argument("--index", choices=INDEXES, default="kdtree")
+    args = parser.parse_args()
+    csv_name = f"{args.index}_tpch.csv"
+
     os.makedirs(os.path.join(RESULT_DIR, "duckdb"), exist_ok=True)
     os.makedirs(os.path.join(RESULT_DIR, "datafusion"), exist_ok=True)
 
     kd_tree, brand_map, cont_map, enc_bytes, build_secs = build_kd_tree(
-        LINEITEM_FILE, PART_FILE, BATCH
+        LINEITEM_FILE, PART_FILE, BATCH, index=args.index
     )
     kd_tree_mb = kd_tree.getMemoryUsage() / (1024 * 1024)
     encoded_mb = enc_bytes / (1024 * 1024)     
@@ -182,7 +197,7 @@ if __name__ == "__main__":
     lookup_metrics = measure_query_execution(
         lambda: _collect_indices(kd_tree, brand_map, cont_map)
     )
-    filtered_idx = set(lookup_metrics["result"])
+    filtered_idx = lookup_metrics["result"]
     filtered_df = materialize_filtered_indices(LINEITEM_FILE, filtered_idx, BATCH)
 
     con, sql_duck = prepare_duckdb(filtered_df, PART_FILE, QUERY_PATH)
@@ -197,7 +212,7 @@ if __name__ == "__main__":
         }
     )
     write_csv_results(
-        os.path.join(RESULT_DIR, "duckdb", "kdtree_tpch.csv"),
+        os.path.join(RESULT_DIR, "duckdb", csv_name),
         FIELDNAMES,
         [combined_duck],
     )
@@ -214,7 +229,7 @@ if __name__ == "__main__":
         }
     )
     write_csv_results(
-        os.path.join(RESULT_DIR, "datafusion", "kdtree_tpch.csv"),
+        os.path.join(RESULT_DIR, "datafusion", csv_name),
         FIELDNAMES,
         [combined_df],
     )
@@ -1,17 +1,28 @@
 import os
 import sys
+import argparse
 import time
 import duckdb
+import numpy as np
 import pyarrow.parquet as pq
-import pandas as pd
 import cppyy
 from datetime import datetime
 
 cppyy.add_include_path("./kdtree/src")
 cppyy.include("vkdtree.hpp")
+cppyy.include("strtree.hpp")
 cppyy.load_library("./kdtree/lib/libfast.so")
 
 from common_kdtree import (
+    DECIMAL_SCALE,
+    to_scaled_int,
+    epoch_days,
+    scaled_ints,
+    INDEXES,
+    new_index,
+    build_from_columns,
+    cursor_mask,
+    write_filtered_parquet,
     measure_query_duckdb,
     measure_query_datafusion,
     write_csv_results,
@@ -27,7 +38,12 @@ END_DATE    = "1995-01-01"
 DISC        = 0.05
 QTY_LT      = 24
 QUERY_PATH  = "../data/tpch/queries/6.sql"
+FILTERED_PATH = "../data/tpch/parquet/filtered_lineitem.parquet"
+NUMERIC_COLS  = ("l_extendedprice", "l_quantity", "l_discount", "l_tax")
 RESULT_DIR  = "../results/kdtree/"
+BUILD_THREADS = os.cpu_count() or 1
+SPLIT_RULE    = "Cycle"
+BUCKET_SIZE   = 32
 
 FIELDNAMES = [
     "Query",
@@ -41,106 +57,111 @@ FIELDNAMES = [
     "KD Tree Creation Time (s)",
 ]
 
+AGG_FIELDNAMES = [
+    "Query",
+    "Latency (s)",
+    "CPU Usage (%)",
+    "Peak Memory Usage (MB)",
+    "Average Memory Usage (MB)",
+    "IOPS (ops/s)",
+    "Matches",
+    "Revenue",
+    "KD Tree Size (MB)",
+    "KD Tree Creation Time (s)",
+]
+
 def date_to_int32(date_str: str) -> int:
     dt    = datetime.strptime(date_str, "%Y-%m-%d")
     epoch = datetime(1970, 1, 1)
     return int((dt - epoch).days)
 
-def build_kd_tree(file_path: str,
-                  batch_size: int,
-                  date_col: str,
-                  disc_col: str,
-                  qty_col: str):
-
-    Entry3 = cppyy.gbl.vec.TripleEntry
-    KD3    = cppyy.gbl.vec.TripleKdTree
+def load_columns(file_path: str,
+                 batch_size: int,
+                 date_col: str,
+                 disc_col: str,
+                 qty_col: str):
 
-    total = pq.ParquetFile(file_path).metadata.num_rows
-    cpp_entries = cppyy.gbl.std.vector[Entry3]()
-    cpp_entries.reserve(total)
+    pf    = pq.ParquetFile(file_path)
+    total = pf.metadata.num_rows
+    cols  = np.empty((3, total), dtype=np.int32)
 
     orig_bytes = 0
     offset     = 0
-    t0 = time.perf_counter()
 
-    pf = pq.ParquetFile(file_path)
-    for batch in pf.iter_batches(batch_size):
-        df = batch.to_pandas()
-        df[date_col] = pd.to_datetime(df[date_col])
-        df[disc_col] = df[disc_col].astype("float32")
-        df[qty_col]  = df[qty_col].astype("float32")
-
-        orig_bytes += (
-            df[date_col].memory_usage(deep=True) +
-            df[disc_col].memory_usage(deep=True) +
-            df[qty_col].memory_usage(deep=True)
-        )
+    for batch in pf.iter_batches(batch_size, columns=[date_col, disc_col, qty_col]):
+        n = batch.num_rows
+        cols[0, offset:offset + n] = epoch_days(batch.column(date_col))
+        cols[1, offset:offset + n] = scaled_ints(batch.column(disc_col))
+        cols[2, offset:offset + n] = scaled_ints(batch.column(qty_col))
 
-        for local_idx, row in df.iterrows():
-            e = Entry3()
-            e.key = [
-                float(date_to_int32(row[date_col].strftime("%Y-%m-%d"))),
-                float(row[disc_col]),
-                float(row[qty_col])
-            ]
-            e.value = offset + local_idx
-            cpp_entries.push_back(e)
+        orig_bytes += sum(batch.column(c).nbytes
+                          for c in (date_col, disc_col, qty_col))
+        offset += n
 
-        offset += len(df)
+    return cols, orig_bytes
 
-    tree = KD3()
-    tree.build(cpp_entries)
+def build_kd_tree(file_path: str,
+                  batch_size: int,
+                  date_col: str,
+                  disc_col: str,
+                  qty_col: str,
+                  threads: int = BUILD_THREADS,
+                  split_rule: str = SPLIT_RULE,
+                  bucket_size: int = BUCKET_SIZE,
+                  index: str = "kdtree"):
+
+    t0 = time.perf_counter()
+    cols, orig_bytes = load_columns(
+        file_path, batch_size, date_col, disc_col, qty_col
+    )
+    tree = new_index(index, bucket_size, split_rule)
+    build_from_columns(tree, cols, threads=threads)
     build_secs = time.perf_counter() - t0
 
-    return tree, cpp_entries, orig_bytes, build_secs
-
-def materialize_filtered_indices(file_path: str,
-                                 indices: set,
-                                 batch_size: int) -> pd.DataFrame:
-
-    if not indices:
-        return pd.DataFrame()
-    wanted = set(indices)
-    out = []
-    offset = 0
-    pf = pq.ParquetFile(file_path)
-    for batch in pf.iter_batches(batch_size):
-        df = batch.to_pandas()
-        n  = len(df)
-        local = [i for i in range(n) if (i + offset) in wanted]
-        if local:
-            out.append(df.iloc[local])
-        offset += n
-    return pd.concat(out, ignore_index=True) if out else pd.DataFrame()
+    return tree, orig_bytes, build_secs
 
+# Both factors are scaled by DECIMAL_SCALE, so every product is an integer
+# below 2**53 and the subtree sums stay exact in double precision.
+def load_revenue_payload(file_path: str,
+                         batch_size: int,
+                         price_col: str,
+                         disc_col: str) -> np.ndarray:
 
-def _cast_numeric(df: pd.DataFrame):
-    for col in ("l_extendedprice", "l_quantity", "l_discount", "l_tax"):
-        if col in df.columns:
-            df[col] = df[col].astype("float64")
+    pf      = pq.ParquetFile(file_path)
+    payload = np.empty(pf.metadata.num_rows, dtype=np.float64)
+    offset  = 0
 
-def prepare_duckdb(df: pd.DataFrame, query_file: str):
-    _cast_numeric(df)
-    dest = "../data/tpch/parquet/filtered_lineitem.parquet"
-    df.to_parquet(dest, index=False, engine="pyarrow")
+    for batch in pf.iter_batches(batch_size, columns=[price_col, disc_col]):
+        n = batch.num_rows
+        payload[offset:offset + n] = (
+            scaled_ints(batch.column(price_col)).astype(np.float64) *
+            scaled_ints(batch.column(disc_col))
+        )
+        offset += n
+
+    return payload
+
+def prepare_duckdb(dest: str, query_file: str):
     con = duckdb.connect(":memory:")
     con.execute(f"CREATE TABLE lineitem AS SELECT * FROM read_parquet('{dest}')")
     return con, open(query_file).read()
 
-def prepare_datafusion(df: pd.DataFrame, query_file: str):
-    _cast_numeric(df)
-    dest = "../data/tpch/parquet/filtered_lineitem.parquet"
-    df.to_parquet(dest, index=False, engine="pyarrow")
+def prepare_datafusion(dest: str, query_file: str):
     ctx = SessionContext()
     ctx.register_parquet("lineitem", dest)
     return ctx, open(query_file).read()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TPC-H Q6 through a multidimensional index")
+    parser.add_argument("--index", choices=INDEXES, default="kdtree")
+    args = parser.parse_args()
+    csv_name = f"{args.index}_tpch.csv"
+
     os.makedirs(os.path.join(RESULT_DIR, "duckdb"),     exist_ok=True)
     os.makedirs(os.path.join(RESULT_DIR, "datafusion"), exist_ok=True)
 
-    kd_tree, cpp_entries, orig_bytes, build_secs = build_kd_tree(
-        FILE, BATCH, "l_shipdate", "l_discount", "l_quantity"
+    kd_tree, orig_bytes, build_secs = build_kd_tree(
+        FILE, BATCH, "l_shipdate", "l_discount", "l_quantity", index=args.index
     )
     kd_tree_mb  = kd_tree.getMemoryUsage() / (1024 * 1024)
     original_mb = orig_bytes / (1024 * 1024)
@@ -148,18 +169,20 @@ if __name__ == "__main__":
     start_int    = date_to_int32(START_DATE)
     end_int_incl = date_to_int32(END_DATE) - 1
 
+    bounds = [
+        start_int,    to_scaled_int(DISC), 0,
+        end_int_incl, to_scaled_int(DISC), to_scaled_int(QTY_LT) - 1,
+    ]
+    num_rows = pq.ParquetFile(FILE).metadata.num_rows
+
     lookup_metrics = measure_query_execution(
-        lambda: kd_tree.rangeSearch(
-            start_int, DISC,       0.0,
-            end_int_incl, DISC,    float(QTY_LT)
-        ).entries
+        lambda: cursor_mask(kd_tree.rangeCursor(bounds), num_rows)
     )
-    cpp_result = lookup_metrics["result"]
-    filtered_idx = set(int(e.value) for e in cpp_result)
+    mask = lookup_metrics["result"]
 
-    filtered_df = materialize_filtered_indices(FILE, filtered_idx, BATCH)
+    write_filtered_parquet(FILE, mask, BATCH, FILTERED_PATH, NUMERIC_COLS)
 
-    con, sql_duck       = prepare_duckdb(filtered_df, QUERY_PATH)
+    con, sql_duck       = prepare_duckdb(FILTERED_PATH, QUERY_PATH)
     eng_metrics_duck    = measure_query_duckdb(6, con, sql_duck)
     combined_duck       = aggregate_metrics(lookup_metrics, eng_metrics_duck)
     combined_duck.update({
@@ -169,11 +192,11 @@ if __name__ == "__main__":
         "KD Tree Creation Time (s)":     build_secs,
     })
     write_csv_results(
-        os.path.join(RESULT_DIR, "duckdb",  "kdtree_tpch.csv"),
+        os.path.join(RESULT_DIR, "duckdb",  csv_name),
         FIELDNAMES, [combined_duck]
     )
 
-    ctx, sql_df          = prepare_datafusion(filtered_df, QUERY_PATH)
+    ctx, sql_df          = prepare_datafusion(FILTERED_PATH, QUERY_PATH)
     eng_metrics_df       = measure_query_datafusion(6, ctx, sql_df)
     combined_df          = aggregate_metrics(lookup_metrics, eng_metrics_df)
     combined_df.update({
@@ -183,6 +206,41 @@ if __name__ == "__main__":
         "KD Tree Creation Time (s)":     build_secs,
     })
     write_csv_results(
-        os.path.join(RESULT_DIR, "datafusion", "kdtree_tpch.csv"),
+        os.path.join(RESULT_DIR, "datafusion", csv_name),
         FIELDNAMES, [combined_df]
     )
+
+    # Subtree sums are a KD-tree feature.
+    if args.index != "kdtree":
+        sys.exit(0)
+
+    t0 = time.perf_counter()
+    payload = load_revenue_payload(FILE, BATCH, "l_extendedprice", "l_discount")
+    kd_tree.setPayload(payload, len(payload))
+    agg_build_secs = build_secs + time.perf_counter() - t0
+
+    agg_metrics = measure_query_execution(
+        lambda: kd_tree.rangeAggregateBox(bounds)
+    )
+    agg     = agg_metrics.pop("result")
+    revenue = agg.sum / DECIMAL_SCALE**2
+
+    expected = con.execute(sql_duck).fetchone()[0]
+    matches  = int(mask.sum())
+    if agg.count != matches or abs(float(expected or 0) - revenue) > 0.005:
+        raise RuntimeError(
+            f"aggregate mismatch: kd-tree={revenue} ({agg.count} rows), "
+            f"duckdb={expected} ({matches} rows)"
+        )
+
+    agg_metrics.update({
+        "Query": 6,
+        "Matches":                   agg.count,
+        "Revenue":                   revenue,
+        "KD Tree Size (MB)":         kd_tree.getMemoryUsage() / (1024 * 1024),
+        "KD Tree Creation Time (s)": agg_build_secs,
+    })
+    write_csv_results(
+        os.path.join(RESULT_DIR, "aggregate.csv"),
+        AGG_FIELDNAMES, [agg_metrics]
+    )
@@ -0,0 +1,67 @@
+import os
+from typing import List
+
+import cppyy
+
+from kdtree_6 import (
+    FILE,
+    BATCH,
+    RESULT_DIR,
+    BUILD_THREADS,
+    date_to_int32,
+    load_columns,
+)
+from common_kdtree import autotune_bucket_size, to_scaled_int, write_csv_results
+
+SPLIT_RULES = ("Cycle", "WidestSpread", "Workload")
+
+FIELDNAMES = [
+    "Split Rule",
+    "Bucket Size",
+    "Latency (s)",
+    "KD Tree Size (MB)",
+    "KD Tree Creation Time (s)",
+    "Best",
+]
+
+
+# Q6 substitution parameters from the TPC-H spec: DATE is January 1st of
+# 1993..1997, DISCOUNT 0.02..0.09 (matched within +-0.01) and QUANTITY 24..25.
+def q6_boxes() -> List[List[int]]:
+    boxes = []
+    for year in range(1993, 1998):
+        start = date_to_int32(f"{year}-01-01")
+        end   = date_to_int32(f"{year + 1}-01-01") - 1
+        for disc in range(2, 10):
+            for qty in (24, 25):
+                boxes.append([
+                    start, disc - 1, 0,
+                    end,   disc + 1, to_scaled_int(qty) - 1,
+                ])
+    return boxes
+
+
+def make_tree(rule: str, boxes: List[List[int]]):
+    tree = cppyy.gbl.vec.TripleIntKdTree()
+    tree.setSplitRule(getattr(cppyy.gbl.skd.SplitRule, rule))
+    if rule == "Workload":
+        tree.setWorkload([v for box in boxes for v in box])
+    return tree
+
+
+if __name__ == "__main__":
+    os.makedirs(RESULT_DIR, exist_ok=True)
+
+    cols, _ = load_columns(FILE, BATCH, "l_shipdate", "l_discount", "l_quantity")
+    boxes = q6_boxes()
+
+    rows = []
+    for rule in SPLIT_RULES:
+        best, results = autotune_bucket_size(
+            lambda: make_tree(rule, boxes), cols, boxes, threads=BUILD_THREADS
+        )
+        for r in results:
+            r.update({"Split Rule": rule, "Best": r["Bucket Size"] == best})
+        rows += results
+
+    write_csv_results(os.path.join(RESULT_DIR, "autotune.csv"), FIELDNAMES, rows)
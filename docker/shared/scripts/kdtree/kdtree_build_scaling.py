@@ -0,0 +1,58 @@
+import os
+import time
+from typing import List
+
+import cppyy
+
+from kdtree_6 import FILE, BATCH, RESULT_DIR, load_columns
+from common_kdtree import build_from_columns, write_csv_results
+
+NUM_RUNS = 3
+
+FIELDNAMES = [
+    "Threads",
+    "Rows",
+    "KD Tree Creation Time (s)",
+    "Speedup",
+]
+
+
+def thread_counts(max_threads: int) -> List[int]:
+    counts, t = [], 1
+    while t < max_threads:
+        counts.append(t)
+        t *= 2
+    counts.append(max_threads)
+    return counts
+
+
+def time_build(cols, threads: int, num_runs: int = NUM_RUNS) -> float:
+    best = float("inf")
+    for _ in range(num_runs):
+        tree = cppyy.gbl.vec.TripleIntKdTree()
+        t0 = time.perf_counter()
+        build_from_columns(tree, cols, threads=threads)
+        best = min(best, time.perf_counter() - t0)
+        del tree
+    return best
+
+
+if __name__ == "__main__":
+    os.makedirs(RESULT_DIR, exist_ok=True)
+
+    cols, _ = load_columns(
+        FILE, BATCH, "l_shipdate", "l_discount", "l_quantity"
+    )
+
+    rows, base = [], None
+    for threads in thread_counts(os.cpu_count() or 1):
+        secs = time_build(cols, threads)
+        base = secs if base is None else base
+        rows.append({
+            "Threads": threads,
+            "Rows": cols.shape[1],
+            "KD Tree Creation Time (s)": secs,
+            "Speedup": base / secs if secs > 0 else None,
+        })
+
+    write_csv_results(os.path.join(RESULT_DIR, "build_scaling.csv"), FIELDNAMES, rows)
@@ -12,8 +12,11 @@ import matplotlib.pyplot as plt
 DEFAULT_PATHS = {
     "kdtree_datafusion": "../results/kdtree/datafusion/kdtree_tpch.csv",
     "kdtree_duckdb":     "../results/kdtree/duckdb/kdtree_tpch.csv",
+    "strtree_duckdb":    "../results/kdtree/duckdb/strtree_tpch.csv",
     "tpch_duckdb":       "../results/tpch_duckdb.csv",
     "tpch_datafusion":   "../results/tpch_datafusion.csv",
+    "build_scaling":     "../results/kdtree/build_scaling.csv",
+    "autotune":          "../results/kdtree/autotune.csv",
     "out_dir":           "../results/kdtree/plots",
 }
 
@@ -137,14 +140,57 @@ def _plot_kd_creation_time(
     plt.close(fig)
 
 
+def _plot_build_scaling(path: str, out_file: pathlib.Path) -> None:
+    p = pathlib.Path(path)
+    if not p.exists():
+        return
+    df = pd.read_csv(p).sort_values("Threads")
+
+    fig, ax = plt.subplots(figsize=(10, 6), dpi=100)
+    ax.plot(df["Threads"].values, df[KD_CREATION_METRIC].values, marker="o")
+    ax.set_xlabel("Threads")
+    ax.set_ylabel(KD_CREATION_METRIC)
+    ax.set_title(f"{KD_CREATION_METRIC} vs Build Threads")
+    ax.set_xticks(df["Threads"].values)
+    ax.set_ylim(bottom=0)
+    plt.savefig(out_file, bbox_inches="tight")
+    plt.close(fig)
+
+
+def _plot_autotune(path: str, out_file: pathlib.Path) -> None:
+    p = pathlib.Path(path)
+    if not p.exists():
+        return
+    df = pd.read_csv(p)
+
+    fig, ax = plt.subplots(figsize=(10, 6), dpi=100)
+    for rule, grp in df.groupby("Split Rule", sort=False):
+        grp = grp.sort_values("Bucket Size")
+        ax.plot(grp["Bucket Size"].values, grp["Latency (s)"].values,
+                marker="o", label=rule)
+    ax.set_xscale("log", base=2)
+    ax.set_xlabel("Bucket Size")
+    ax.set_ylabel("Latency (s)")
+    ax.set_title("Q6 Box Workload Latency vs Bucket Size")
+    ax.set_xticks(sorted(df["Bucket Size"].unique()))
+    ax.set_xticklabels([str(b) for b in sorted(df["Bucket Size"].unique())])
+    ax.set_ylim(bottom=0)
+    ax.legend(title="Split Rule")
+    plt.savefig(out_file, bbox_inches="tight")
+    plt.close(fig)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Generate TPCH KD-Tree comparison plots"
     )
     parser.add_argument("--kdtree-datafusion", default=DEFAULT_PATHS["kdtree_datafusion"])
     parser.add_argument("--kdtree-duckdb",     default=DEFAULT_PATHS["kdtree_duckdb"])
+    parser.add_argument("--strtree-duckdb",    default=DEFAULT_PATHS["strtree_duckdb"])
     parser.add_argument("--tpch-duckdb",       default=DEFAULT_PATHS["tpch_duckdb"])
     parser.add_argument("--tpch-datafusion",   default=DEFAULT_PATHS["tpch_datafusion"])
+    parser.add_argument("--build-scaling",     default=DEFAULT_PATHS["build_scaling"])
+    parser.add_argument("--autotune",          default=DEFAULT_PATHS["autotune"])
     parser.add_argument("--out-dir",           default=DEFAULT_PATHS["out_dir"])
     args = parser.parse_args()
 
@@ -189,6 +235,26 @@ def main() -> None:
 
     _plot_kd_creation_time(df_kd_db, "DuckDB",     out_dir / "kd_tree_creation_time.png")
 
+    _plot_build_scaling(args.build_scaling, out_dir / "kd_tree_build_scaling.png")
+
+    _plot_autotune(args.autotune, out_dir / "kd_tree_autotune.png")
+
+    if pathlib.Path(args.strtree_duckdb).exists():
+        df_str_db = _load_csv(args.strtree_duckdb,
+                              required_common + kd_extras,
+                              "STR-Tree DuckDB")
+        for metric, stem in (("Latency (s)", "latency"),
+                             (TREE_SIZE_METRICS[0], "size"),
+                             (KD_CREATION_METRIC, "creation_time")):
+            _plot_grouped_two_series(
+                df_kd_db,
+                df_str_db,
+                metric,
+                "KDTree DuckDB",
+                "STR-Tree DuckDB",
+                out_dir / f"{stem}_kdtree_vs_strtree.png",
+            )
+
 
 if __name__ == "__main__":
     main()
@@ -1 +1,16 @@
-#include "vkdtree.hpp"
\ No newline at end of file
+#include "vkdtree.hpp"
+#include "strtree.hpp"
+
+#define VKDTREE_INSTANTIATE(D, S)                            \
+    template class skd::KdTree<D, S>;                        \
+    template class vec::vKdTree<D, S>;                       \
+    template class vec::detail::IdCursor<skd::KdTree<D, S>>;
+VKDTREE_FOR_EACH(VKDTREE_INSTANTIATE)
+#undef VKDTREE_INSTANTIATE
+
+#define STRTREE_INSTANTIATE(D, S)                             \
+    template class skd::StrTree<D, S>;                        \
+    template class vec::vStrTree<D, S>;                       \
+    template class vec::detail::IdCursor<skd::StrTree<D, S>>;
+VKDTREE_FOR_EACH(STRTREE_INSTANTIATE)
+#undef STRTREE_INSTANTIATE
@@ -4,106 +4,742 @@
 #include <algorithm>
 #include <limits>
 #include <cstddef>
+#include <cstdint>
+#include <future>
+#include <stdexcept>
+#include <thread>
+#include <type_traits>
+#if defined(__AVX2__)
+#include <immintrin.h>
+#endif
 
 namespace skd {
 
+enum class LeafScan { Scalar, Simd };
+
+// Cycle splits on depth % Dim. WidestSpread picks the axis whose value range,
+// relative to the root's range on that axis, is widest in the node, so
+// low-cardinality columns stop being split once they are constant.
+// Workload picks the axis whose (sampled) median is straddled by the fewest
+// workload boxes reaching the node, breaking ties by spread.
+enum class SplitRule { Cycle, WidestSpread, Workload };
+
+struct Aggregate {
+    double        sum   = 0.0;
+    std::uint64_t count = 0;
+};
+
+namespace detail {
+
+#if defined(__AVX2__)
+// _mm256_permutevar8x32_epi32 lane orders that left-pack the set bits of an
+// 8-bit compare mask; AVX2 has no compress-store, so this emulates it.
+struct CompressTable {
+    alignas(32) std::uint32_t lanes[256][8]{};
+
+    constexpr CompressTable()
+    {
+        for (unsigned m = 0; m < 256; ++m) {
+            unsigned k = 0;
+            for (unsigned l = 0; l < 8; ++l)
+                if (m & (1u << l)) lanes[m][k++] = l;
+        }
+    }
+};
+
+inline constexpr CompressTable compress_table{};
+
+// Compare mask of the 8 records starting at i against [lo, hi]; columns are
+// float or int32 and padded so the load never runs past the end.
+template <std::size_t Dim, typename Scalar>
+inline unsigned chunk_mask(const std::array<std::vector<Scalar>, Dim>& cols,
+                           std::size_t i,
+                           const std::array<Scalar, Dim>& lo,
+                           const std::array<Scalar, Dim>& hi) noexcept
+{
+    if constexpr (std::is_same_v<Scalar, float>) {
+        __m256 in = _mm256_castsi256_ps(_mm256_set1_epi32(-1));
+        for (std::size_t d = 0; d < Dim; ++d) {
+            const __m256 v = _mm256_loadu_ps(cols[d].data() + i);
+            in = _mm256_and_ps(in, _mm256_cmp_ps(v, _mm256_set1_ps(lo[d]), _CMP_GE_OQ));
+            in = _mm256_and_ps(in, _mm256_cmp_ps(v, _mm256_set1_ps(hi[d]), _CMP_LE_OQ));
+        }
+        return static_cast<unsigned>(_mm256_movemask_ps(in));
+    } else {
+        __m256i out = _mm256_setzero_si256();
+        for (std::size_t d = 0; d < Dim; ++d) {
+            const __m256i v = _mm256_loadu_si256(
+                reinterpret_cast<const __m256i*>(cols[d].data() + i));
+            out = _mm256_or_si256(out, _mm256_cmpgt_epi32(_mm256_set1_epi32(lo[d]), v));
+            out = _mm256_or_si256(out, _mm256_cmpgt_epi32(v, _mm256_set1_epi32(hi[d])));
+        }
+        return ~static_cast<unsigned>(_mm256_movemask_ps(_mm256_castsi256_ps(out))) & 0xFFu;
+    }
+}
+
+// Writes the slots i..i+7 selected by mask to dst (always storing 8 lanes)
+// and returns the new end.
+inline std::uint32_t* compress_store(std::uint32_t* dst, std::uint32_t i,
+                                     unsigned mask) noexcept
+{
+    const __m256i slots = _mm256_add_epi32(
+        _mm256_set1_epi32(static_cast<int>(i)),
+        _mm256_setr_epi32(0, 1, 2, 3, 4, 5, 6, 7));
+    const __m256i perm  = _mm256_load_si256(
+        reinterpret_cast<const __m256i*>(compress_table.lanes[mask]));
+    _mm256_storeu_si256(reinterpret_cast<__m256i*>(dst),
+                        _mm256_permutevar8x32_epi32(slots, perm));
+    return dst + __builtin_popcount(mask);
+}
+#endif
+
+}
+
+// Implicit, pointer-less layout: the tree is complete down to m_height, node
+// k has children 2k+1 / 2k+2, only internal split values are stored, the
+// split axis is depth % Dim (or one byte per node for the other split rules)
+// and leaf ranges are recomputed from the median positions while descending.
+// BucketSz is only the default leaf size; set_bucket_size overrides it.
+//
+// An optional double payload per record can be attached after build; every
+// node then carries the payload sum of its subtree, and range_aggregate adds
+// whole subtrees whose cell lies inside the query box instead of visiting
+// their leaves. Cells are derived from the root bounds and the splits.
 template <std::size_t Dim,
           typename      Scalar    = float,
-          std::size_t   BucketSz  = 32>
+          std::size_t   BucketSz  = 32,
+          typename      Id        = std::uint32_t>
 class KdTree
 {
 public:
     using point_type = std::array<Scalar, Dim>;
-    using index_type = std::size_t;
+    using index_type = std::uint32_t;
+    using id_type    = Id;
+
+    struct Record {
+        point_type p{};
+        id_type    id{};
+    };
 
     KdTree()                                    = default;
     explicit KdTree(const std::vector<point_type>& pts) { build(pts); }
 
-    void build(const std::vector<point_type>& pts)
+    void build(const std::vector<point_type>& pts, unsigned threads = 1)
     {
-        m_points = pts;
-        m_nodes.clear();
-        if (!m_points.empty()) {
-            m_nodes.reserve(m_points.size());
-            build_rec(0, m_points.size(), 0);
-        }
+        std::vector<Record> recs(pts.size());
+        for (std::size_t i = 0; i < pts.size(); ++i)
+            recs[i] = {pts[i], static_cast<id_type>(i)};
+        build(std::move(recs), threads);
+    }
+
+    // threads == 0 uses every hardware thread. Both halves of a split are
+    // disjoint subranges, so subtrees above kParallelCutoff records are
+    // handed to std::async until the thread budget is spent.
+    void build(std::vector<Record>&& recs, unsigned threads = 1)
+    {
+        m_height = 0;
+        while (ceil_div(recs.size(), std::size_t{1} << m_height) > m_bucket)
+            ++m_height;
+
+        if (threads == 0) threads = std::max(1u, std::thread::hardware_concurrency());
+        std::size_t spawn_depth = 0;
+        while ((std::size_t{1} << spawn_depth) < threads) ++spawn_depth;
+
+        m_splits.assign((std::size_t{1} << m_height) - 1, Scalar{});
+        if (m_rule == SplitRule::Cycle) m_axes.clear();
+        else m_axes.assign(m_splits.size(), 0);
+        m_payload.clear();
+        m_sums.clear();
+        root_bounds(recs);
+
+        std::vector<std::uint32_t> boxes;
+        if (m_rule == SplitRule::Workload)
+            for (std::size_t k = 0; k < m_work_lo.size(); ++k)
+                boxes.push_back(static_cast<std::uint32_t>(k));
+
+        if (!recs.empty())
+            build_rec(recs, 0, 0, 0, static_cast<index_type>(recs.size()),
+                      boxes, spawn_depth);
+        store_columns(recs);
     }
 
+    // The split rule, bucket size and workload take effect on the next build.
+    void set_split_rule(SplitRule rule) noexcept { m_rule = rule; }
+    SplitRule split_rule() const noexcept { return m_rule; }
+
+    void set_bucket_size(std::size_t bucket) noexcept
+    {
+        m_bucket = std::max<std::size_t>(1, bucket);
+    }
+    std::size_t bucket_size() const noexcept { return m_bucket; }
+
+    // Sample query boxes for SplitRule::Workload.
+    void set_workload(std::vector<point_type> lo, std::vector<point_type> hi)
+    {
+        m_work_lo = std::move(lo);
+        m_work_hi = std::move(hi);
+    }
+
+    // Returns tree slots; use point()/id() to resolve them.
     std::vector<index_type> range_query(const point_type& lo,
                                         const point_type& hi) const
     {
         std::vector<index_type> res;
-        if (!m_nodes.empty()) range_query_impl(0, lo, hi, res);
+        if (size()) range_query_impl(0, 0, 0, size(), lo, hi, res);
+        return res;
+    }
+
+    // One traversal for a set of boxes; every slot is reported once even
+    // when it falls into several boxes.
+    std::vector<index_type> range_query_many(const std::vector<point_type>& lo,
+                                             const std::vector<point_type>& hi) const
+    {
+        std::vector<index_type> res;
+        if (!size()) return res;
+
+        for (std::size_t g = 0; g < lo.size(); g += kMaxBoxes) {
+            const std::size_t cnt = std::min(kMaxBoxes, lo.size() - g);
+            const box_mask active = cnt == kMaxBoxes ? ~box_mask{0}
+                                                     : (box_mask{1} << cnt) - 1;
+            range_query_many_impl(0, 0, 0, size(),
+                                  lo.data() + g, hi.data() + g, active, res);
+        }
+        if (lo.size() > kMaxBoxes) {
+            std::sort(res.begin(), res.end());
+            res.erase(std::unique(res.begin(), res.end()), res.end());
+        }
         return res;
     }
 
-    const point_type& point(index_type i) const noexcept { return m_points[i]; }
+    // values is indexed by record id, so every id must be below n.
+    void set_payload(const double* values, std::size_t n)
+    {
+        m_payload.resize(size());
+        for (index_type i = 0; i < size(); ++i) {
+            if (static_cast<std::size_t>(m_ids[i]) >= n)
+                throw std::out_of_range("KdTree: payload does not cover every id");
+            m_payload[i] = values[m_ids[i]];
+        }
+        m_sums.assign((std::size_t{2} << m_height) - 1, 0.0);
+        if (size()) sum_rec(0, 0, 0, size());
+    }
+
+    bool has_payload() const noexcept { return !m_sums.empty(); }
+
+    // Incremental form of range_query: an explicit traversal stack replaces
+    // the recursion and next() hands out at most cap slots per call, so a
+    // wide box never holds its whole result in memory. The tree must
+    // outlive the cursor and must not be rebuilt while it is in use.
+    class Cursor
+    {
+    public:
+        Cursor(const KdTree& tree, const point_type& lo, const point_type& hi)
+            : m_tree(&tree), m_lo(lo), m_hi(hi), m_stack()
+        {
+            if (tree.size()) m_stack.push_back({0, 0, 0, tree.size()});
+        }
+
+        // Writes up to cap slots into out; returns 0 once exhausted.
+        std::size_t next(index_type* out, std::size_t cap)
+        {
+            std::size_t n = 0;
+            while (n < cap) {
+                if (m_pending) {
+                    for (; m_pending && n < cap; m_pending &= m_pending - 1)
+                        out[n++] = m_i + static_cast<index_type>(__builtin_ctz(m_pending));
+                    if (!m_pending) m_i += kLanes;
+                } else if (m_i < m_e) {
+                    m_pending = m_tree->lane_mask(m_i, m_e, m_lo, m_hi);
+                    if (!m_pending) m_i += kLanes;
+                } else if (!advance()) {
+                    break;
+                }
+            }
+            return n;
+        }
+
+        bool done() const noexcept
+        {
+            return !m_pending && m_i >= m_e && m_stack.empty();
+        }
+
+    private:
+        struct Frame {
+            std::size_t node, depth;
+            index_type  b, e;
+        };
+
+        const KdTree*      m_tree;
+        point_type         m_lo, m_hi;
+        std::vector<Frame> m_stack;
+        index_type         m_i = 0, m_e = 0;
+        unsigned           m_pending = 0;
+
+        // Pops frames until the next leaf that intersects the box.
+        bool advance()
+        {
+            while (!m_stack.empty()) {
+                const Frame f = m_stack.back();
+                m_stack.pop_back();
+                if (f.depth == m_tree->m_height) {
+                    m_i = f.b;
+                    m_e = f.e;
+                    return true;
+                }
+                const std::size_t axis  = m_tree->axis_at(f.node, f.depth);
+                const Scalar      split = m_tree->m_splits[f.node];
+                const index_type  mid   = f.b + (f.e - f.b) / 2;
+                if (m_hi[axis] >= split) m_stack.push_back({2*f.node + 2, f.depth+1, mid, f.e});
+                if (m_lo[axis] <= split) m_stack.push_back({2*f.node + 1, f.depth+1, f.b, mid});
+            }
+            return false;
+        }
+    };
+
+    Cursor cursor(const point_type& lo, const point_type& hi) const
+    {
+        return Cursor(*this, lo, hi);
+    }
+
+    // Count and payload sum of the records inside [lo, hi]; the sum stays 0
+    // when no payload is attached.
+    Aggregate range_aggregate(const point_type& lo, const point_type& hi) const
+    {
+        Aggregate acc;
+        if (size())
+            range_aggregate_impl(0, 0, 0, size(), m_lo, m_hi, lo, hi, acc);
+        return acc;
+    }
+
+    point_type point(index_type slot) const noexcept
+    {
+        point_type p{};
+        for (std::size_t d = 0; d < Dim; ++d) p[d] = m_cols[d][slot];
+        return p;
+    }
+
+    id_type id(index_type slot) const noexcept { return m_ids[slot]; }
+    index_type size() const noexcept { return static_cast<index_type>(m_ids.size()); }
+
+    void set_leaf_scan(LeafScan scan) noexcept { m_scan = scan; }
+    LeafScan leaf_scan() const noexcept { return m_scan; }
 
     std::size_t memoryUsage() const noexcept
     {
+        std::size_t cols = 0;
+        for (auto const& c : m_cols) cols += c.capacity() * sizeof(Scalar);
         return sizeof(*this)
-             + m_points.capacity() * sizeof(point_type)
-             + m_nodes.capacity()  * sizeof(Node);
+             + cols
+             + m_ids.capacity()    * sizeof(id_type)
+             + m_splits.capacity() * sizeof(Scalar)
+             + m_axes.capacity()
+             + m_payload.capacity() * sizeof(double)
+             + m_sums.capacity()    * sizeof(double);
     }
 
 private:
-    struct Node {
-        index_type left  = npos;         
-        index_type right = npos;
-        index_type begin{}, end{};       
-        Scalar     split{};
-        std::size_t axis{};
-    };
-    static constexpr index_type npos = std::numeric_limits<index_type>::max();
+    using box_mask = std::uint64_t;
+
+    static constexpr std::size_t kLanes = 8;
+    static constexpr std::size_t kMaxBoxes = 64;
+    static constexpr std::size_t kParallelCutoff = std::size_t{1} << 16;
+    static constexpr std::size_t kMedianSample = 255;
+
+    static_assert(Dim <= 256, "split axes are stored in one byte");
+
+#if defined(__AVX2__)
+    static constexpr bool kSimd = std::is_same_v<Scalar, float>
+                               || std::is_same_v<Scalar, std::int32_t>;
+#else
+    static constexpr bool kSimd = false;
+#endif
+
+    std::vector<Scalar>                      m_splits;
+    std::vector<std::uint8_t>                m_axes;
+    std::array<std::vector<Scalar>, Dim>     m_cols;
+    std::vector<id_type>                     m_ids;
+    std::vector<double>                      m_payload;
+    std::vector<double>                      m_sums;
+    point_type                               m_lo{};
+    point_type                               m_hi{};
+    std::size_t                              m_height = 0;
+    LeafScan                                 m_scan = LeafScan::Simd;
+    SplitRule                                m_rule = SplitRule::Cycle;
+    std::size_t                              m_bucket = BucketSz;
+    std::vector<point_type>                  m_work_lo;
+    std::vector<point_type>                  m_work_hi;
+
+    static constexpr std::size_t ceil_div(std::size_t a, std::size_t b) noexcept
+    {
+        return (a + b - 1) / b;
+    }
+
+    std::size_t axis_at(std::size_t node, std::size_t depth) const noexcept
+    {
+        return m_axes.empty() ? depth % Dim : m_axes[node];
+    }
 
-    std::vector<Node>        m_nodes;
-    std::vector<point_type>  m_points;
+    void root_bounds(const std::vector<Record>& recs)
+    {
+        m_lo = recs.empty() ? point_type{} : recs.front().p;
+        m_hi = m_lo;
+        for (auto const& r : recs)
+            for (std::size_t d = 0; d < Dim; ++d) {
+                m_lo[d] = std::min(m_lo[d], r.p[d]);
+                m_hi[d] = std::max(m_hi[d], r.p[d]);
+            }
+    }
+
+    std::size_t choose_axis(const std::vector<Record>& recs,
+                            index_type b, index_type e, std::size_t depth,
+                            const std::vector<std::uint32_t>& boxes) const
+    {
+        if (m_rule == SplitRule::Cycle) return depth % Dim;
+
+        point_type mn = recs[b].p, mx = recs[b].p;
+        for (index_type i = b + 1; i < e; ++i)
+            for (std::size_t d = 0; d < Dim; ++d) {
+                mn[d] = std::min(mn[d], recs[i].p[d]);
+                mx[d] = std::max(mx[d], recs[i].p[d]);
+            }
+
+        std::array<double, Dim> spread{};
+        std::size_t widest = 0;
+        for (std::size_t d = 0; d < Dim; ++d) {
+            const double range = double(m_hi[d]) - double(m_lo[d]);
+            spread[d] = range > 0 ? (double(mx[d]) - double(mn[d])) / range : 0.0;
+            if (spread[d] > spread[widest]) widest = d;
+        }
+        if (m_rule == SplitRule::WidestSpread || boxes.empty()) return widest;
+
+        std::size_t best = widest, best_cost = boxes.size() + 1;
+        for (std::size_t d = 0; d < Dim; ++d) {
+            if (spread[d] <= 0.0) continue;
+            const Scalar med = sample_median(recs, b, e, d);
+            std::size_t cost = 0;
+            for (auto k : boxes)
+                cost += m_work_lo[k][d] <= med && m_work_hi[k][d] >= med;
+            if (cost < best_cost || (cost == best_cost && spread[d] > spread[best])) {
+                best = d;
+                best_cost = cost;
+            }
+        }
+        return best;
+    }
+
+    static Scalar sample_median(const std::vector<Record>& recs,
+                                index_type b, index_type e, std::size_t axis)
+    {
+        const std::size_t n    = e - b;
+        const std::size_t step = std::max<std::size_t>(1, n / kMedianSample);
+        std::vector<Scalar> sample;
+        sample.reserve(std::min(n, kMedianSample + 1));
+        for (std::size_t i = b; i < e; i += step) sample.push_back(recs[i].p[axis]);
+        auto mid = sample.begin() + sample.size() / 2;
+        std::nth_element(sample.begin(), mid, sample.end());
+        return *mid;
+    }
+
+    void build_rec(std::vector<Record>& recs, std::size_t node,
+                   std::size_t depth, index_type b, index_type e,
+                   const std::vector<std::uint32_t>& boxes,
+                   std::size_t spawn_depth)
+    {
+        if (depth == m_height) return;
+
+        const std::size_t axis = choose_axis(recs, b, e, depth, boxes);
+        const index_type  mid  = b + (e - b) / 2;
+        std::nth_element(recs.begin()+b, recs.begin()+mid,
+                         recs.begin()+e,
+                         [axis](const Record& a, const Record& c)
+                         { return a.p[axis] < c.p[axis]; });
+
+        const Scalar split = recs[mid].p[axis];
+        m_splits[node] = split;
+        if (!m_axes.empty()) m_axes[node] = static_cast<std::uint8_t>(axis);
+
+        std::vector<std::uint32_t> left_boxes, right_boxes;
+        for (auto k : boxes) {
+            if (m_work_lo[k][axis] <= split) left_boxes.push_back(k);
+            if (m_work_hi[k][axis] >= split) right_boxes.push_back(k);
+        }
+
+        if (spawn_depth > 0 && e - b > kParallelCutoff) {
+            auto left = std::async(std::launch::async, [&, node, depth, b, mid] {
+                build_rec(recs, 2*node + 1, depth+1, b, mid, left_boxes,
+                          spawn_depth - 1);
+            });
+            build_rec(recs, 2*node + 2, depth+1, mid, e, right_boxes,
+                      spawn_depth - 1);
+            left.get();
+            return;
+        }
+        build_rec(recs, 2*node + 1, depth+1, b  , mid, left_boxes , 0);
+        build_rec(recs, 2*node + 2, depth+1, mid, e  , right_boxes, 0);
+    }
 
-    index_type build_rec(index_type b, index_type e, std::size_t depth)
+    // Columns are padded by one vector width so the last bucket can be
+    // loaded unaligned without a scalar tail.
+    void store_columns(const std::vector<Record>& recs)
     {
-        const index_type id = m_nodes.size();
-        m_nodes.push_back({});
-        Node& n   = m_nodes.back();
-        n.begin   = b;  n.end = e;
-        n.axis    = depth % Dim;
+        const std::size_t n = recs.size();
+        for (std::size_t d = 0; d < Dim; ++d) {
+            m_cols[d].assign(n + kLanes, Scalar{});
+            for (std::size_t i = 0; i < n; ++i) m_cols[d][i] = recs[i].p[d];
+        }
+        m_ids.resize(n);
+        for (std::size_t i = 0; i < n; ++i) m_ids[i] = recs[i].id;
+    }
 
-        if (e - b <= BucketSz) return id;             
+    double sum_rec(std::size_t node, std::size_t depth,
+                   index_type b, index_type e)
+    {
+        double s = 0.0;
+        if (depth == m_height) {
+            for (index_type i = b; i < e; ++i) s += m_payload[i];
+        } else {
+            const index_type mid = b + (e - b) / 2;
+            s = sum_rec(2*node + 1, depth+1, b, mid)
+              + sum_rec(2*node + 2, depth+1, mid, e);
+        }
+        return m_sums[node] = s;
+    }
 
-        index_type mid = (b + e) / 2;
-        std::nth_element(m_points.begin()+b, m_points.begin()+mid,
-                         m_points.begin()+e,
-                         [&](const point_type& a, const point_type& c)
-                         { return a[n.axis] < c[n.axis]; });
+    static bool contains(const point_type& lo, const point_type& hi,
+                         const point_type& cell_lo,
+                         const point_type& cell_hi) noexcept
+    {
+        for (std::size_t d = 0; d < Dim; ++d)
+            if (cell_lo[d] < lo[d] || cell_hi[d] > hi[d]) return false;
+        return true;
+    }
 
-        n.split = m_points[mid][n.axis];
-        n.left  = build_rec(b  , mid, depth+1);
-        n.right = build_rec(mid, e  , depth+1);
-        return id;
+    void range_aggregate_impl(std::size_t node, std::size_t depth,
+                              index_type b, index_type e,
+                              const point_type& cell_lo,
+                              const point_type& cell_hi,
+                              const point_type& lo,
+                              const point_type& hi,
+                              Aggregate& acc) const
+    {
+        if (contains(lo, hi, cell_lo, cell_hi)) {
+            if (has_payload()) acc.sum += m_sums[node];
+            acc.count += e - b;
+            return;
+        }
+        if (depth == m_height) {
+            aggregate_leaf(b, e, lo, hi, acc);
+            return;
+        }
+
+        const std::size_t axis  = axis_at(node, depth);
+        const Scalar      split = m_splits[node];
+        const index_type  mid   = b + (e - b) / 2;
+        if (lo[axis] <= split) {
+            point_type child_hi = cell_hi;
+            child_hi[axis] = split;
+            range_aggregate_impl(2*node + 1, depth+1, b, mid,
+                                 cell_lo, child_hi, lo, hi, acc);
+        }
+        if (hi[axis] >= split) {
+            point_type child_lo = cell_lo;
+            child_lo[axis] = split;
+            range_aggregate_impl(2*node + 2, depth+1, mid, e,
+                                 child_lo, cell_hi, lo, hi, acc);
+        }
+    }
+
+    void aggregate_leaf(index_type b, index_type e,
+                        const point_type& lo, const point_type& hi,
+                        Aggregate& acc) const
+    {
+#if defined(__AVX2__)
+        if constexpr (kSimd)
+            if (m_scan == LeafScan::Simd) {
+                for (index_type i = b; i < e; i += kLanes) {
+                    unsigned mask = chunk_mask(i, lo, hi);
+                    if (e - i < kLanes) mask &= (1u << (e - i)) - 1;
+                    acc.count += static_cast<unsigned>(__builtin_popcount(mask));
+                    if (has_payload())
+                        for (; mask; mask &= mask - 1)
+                            acc.sum += m_payload[i + __builtin_ctz(mask)];
+                }
+                return;
+            }
+#endif
+        for (index_type i = b; i < e; ++i)
+            if (inside_scalar(i, lo, hi)) {
+                if (has_payload()) acc.sum += m_payload[i];
+                ++acc.count;
+            }
     }
 
-    void range_query_impl(index_type node,
+    void range_query_impl(std::size_t node, std::size_t depth,
+                          index_type b, index_type e,
                           const point_type& lo,
                           const point_type& hi,
                           std::vector<index_type>& out) const
     {
-        const Node& n = m_nodes[node];
+        if (depth == m_height)
+        {
+            if constexpr (kSimd)
+                if (m_scan == LeafScan::Simd) {
+                    scan_leaf_simd(b, e, lo, hi, out);
+                    return;
+                }
+            scan_leaf_scalar(b, e, lo, hi, out);
+            return;
+        }
 
-        if (n.left == npos)
+        const std::size_t axis  = axis_at(node, depth);
+        const Scalar      split = m_splits[node];
+        const index_type  mid   = b + (e - b) / 2;
+        if (lo[axis] <= split) range_query_impl(2*node + 1, depth+1, b  , mid, lo, hi, out);
+        if (hi[axis] >= split) range_query_impl(2*node + 2, depth+1, mid, e  , lo, hi, out);
+    }
+
+    void range_query_many_impl(std::size_t node, std::size_t depth,
+                               index_type b, index_type e,
+                               const point_type* lo,
+                               const point_type* hi,
+                               box_mask active,
+                               std::vector<index_type>& out) const
+    {
+        if (depth == m_height)
         {
-            for (index_type i = n.begin; i < n.end; ++i) {
-                bool inside = true;
-                for (std::size_t d = 0; d < Dim; ++d)
-                    if (m_points[i][d] < lo[d] || m_points[i][d] > hi[d]) {
-                        inside = false; break;
-                    }
-                if (inside) out.push_back(i);
-            }
+            if constexpr (kSimd)
+                if (m_scan == LeafScan::Simd) {
+                    scan_leaf_many_simd(b, e, lo, hi, active, out);
+                    return;
+                }
+            scan_leaf_many_scalar(b, e, lo, hi, active, out);
             return;
         }
 
-        if (lo[n.axis] <= n.split) range_query_impl(n.left , lo, hi, out);
-        if (hi[n.axis] >= n.split) range_query_impl(n.right, lo, hi, out);
+        const std::size_t axis  = axis_at(node, depth);
+        const Scalar      split = m_splits[node];
+        const index_type  mid   = b + (e - b) / 2;
+
+        box_mask go_left = 0, go_right = 0;
+        for (box_mask m = active; m; m &= m - 1) {
+            const unsigned k = static_cast<unsigned>(__builtin_ctzll(m));
+            if (lo[k][axis] <= split) go_left  |= box_mask{1} << k;
+            if (hi[k][axis] >= split) go_right |= box_mask{1} << k;
+        }
+        if (go_left)
+            range_query_many_impl(2*node + 1, depth+1, b, mid, lo, hi, go_left, out);
+        if (go_right)
+            range_query_many_impl(2*node + 2, depth+1, mid, e, lo, hi, go_right, out);
+    }
+
+    // Lanes of the chunk starting at slot i that fall inside the box, clipped
+    // to the leaf end e.
+    unsigned lane_mask(index_type i, index_type e,
+                       const point_type& lo, const point_type& hi) const noexcept
+    {
+        unsigned mask = 0;
+        if constexpr (kSimd)
+            if (m_scan == LeafScan::Simd) {
+                mask = chunk_mask(i, lo, hi);
+                return e - i < kLanes ? mask & ((1u << (e - i)) - 1) : mask;
+            }
+        for (index_type l = 0; l < kLanes && i + l < e; ++l)
+            if (inside_scalar(i + l, lo, hi)) mask |= 1u << l;
+        return mask;
+    }
+
+    bool inside_scalar(index_type i,
+                       const point_type& lo, const point_type& hi) const noexcept
+    {
+        for (std::size_t d = 0; d < Dim; ++d)
+            if (m_cols[d][i] < lo[d] || m_cols[d][i] > hi[d]) return false;
+        return true;
+    }
+
+    void scan_leaf_scalar(index_type b, index_type e,
+                          const point_type& lo, const point_type& hi,
+                          std::vector<index_type>& out) const
+    {
+        for (index_type i = b; i < e; ++i)
+            if (inside_scalar(i, lo, hi)) out.push_back(i);
+    }
+
+    void scan_leaf_many_scalar(index_type b, index_type e,
+                               const point_type* lo, const point_type* hi,
+                               box_mask active,
+                               std::vector<index_type>& out) const
+    {
+        for (index_type i = b; i < e; ++i)
+            for (box_mask m = active; m; m &= m - 1) {
+                const unsigned k = static_cast<unsigned>(__builtin_ctzll(m));
+                if (inside_scalar(i, lo[k], hi[k])) { out.push_back(i); break; }
+            }
+    }
+
+#if defined(__AVX2__)
+    unsigned chunk_mask(index_type i,
+                        const point_type& lo, const point_type& hi) const noexcept
+    {
+        return detail::chunk_mask(m_cols, i, lo, hi);
+    }
+
+    static index_type* compress_store(index_type* dst, index_type i, unsigned mask) noexcept
+    {
+        return detail::compress_store(dst, i, mask);
+    }
+
+    void scan_leaf_simd(index_type b, index_type e,
+                        const point_type& lo, const point_type& hi,
+                        std::vector<index_type>& out) const
+    {
+        const std::size_t base = out.size();
+        out.resize(base + (e - b) + kLanes);
+        index_type* dst = out.data() + base;
+
+        for (index_type i = b; i < e; i += kLanes) {
+            unsigned mask = chunk_mask(i, lo, hi);
+            if (e - i < kLanes) mask &= (1u << (e - i)) - 1;
+            if (mask) dst = compress_store(dst, i, mask);
+        }
+        out.resize(static_cast<std::size_t>(dst - out.data()));
+    }
+
+    void scan_leaf_many_simd(index_type b, index_type e,
+                             const point_type* lo, const point_type* hi,
+                             box_mask active,
+                             std::vector<index_type>& out) const
+    {
+        const std::size_t base = out.size();
+        out.resize(base + (e - b) + kLanes);
+        index_type* dst = out.data() + base;
+
+        for (index_type i = b; i < e; i += kLanes) {
+            unsigned mask = 0;
+            for (box_mask m = active; m && mask != 0xFFu; m &= m - 1) {
+                const unsigned k = static_cast<unsigned>(__builtin_ctzll(m));
+                mask |= chunk_mask(i, lo[k], hi[k]);
+            }
+            if (e - i < kLanes) mask &= (1u << (e - i)) - 1;
+            if (mask) dst = compress_store(dst, i, mask);
+        }
+        out.resize(static_cast<std::size_t>(dst - out.data()));
+    }
+#else
+    void scan_leaf_simd(index_type b, index_type e,
+                        const point_type& lo, const point_type& hi,
+                        std::vector<index_type>& out) const
+    {
+        scan_leaf_scalar(b, e, lo, hi, out);
+    }
+
+    void scan_leaf_many_simd(index_type b, index_type e,
+                             const point_type* lo, const point_type* hi,
+                             box_mask active,
+                             std::vector<index_type>& out) const
+    {
+        scan_leaf_many_scalar(b, e, lo, hi, active, out);
     }
+#endif
 };
 
 }
@@ -0,0 +1,550 @@
+#pragma once
+#include "vkdtree.hpp"
+#include <cmath>
+
+namespace skd {
+
+// Packed R-tree bulk-loaded with Sort-Tile-Recursive: records are sorted on
+// the first axis and cut into ceil(P^(1/Dim)) slabs (P = leaf count), each
+// slab is tiled the same way on the remaining axes, and runs of m_cap
+// records become leaves. Every upper level tiles the centres of the level
+// below the same way. Records are stored column-wise in leaf order, as in
+// KdTree; nodes are flat, level by level, with the root last.
+template <std::size_t Dim,
+          typename      Scalar   = float,
+          std::size_t   NodeCap  = 32,
+          typename      Id       = std::uint32_t>
+class StrTree
+{
+public:
+    using point_type = std::array<Scalar, Dim>;
+    using index_type = std::uint32_t;
+    using id_type    = Id;
+
+    struct Record {
+        point_type p{};
+        id_type    id{};
+    };
+
+    // first/count index records for leaves and nodes otherwise.
+    struct Node {
+        point_type lo{}, hi{};
+        index_type first = 0, count = 0;
+    };
+
+    // threads == 0 uses every hardware thread; the slabs of the first axis
+    // are tiled concurrently.
+    void build(std::vector<Record>&& recs, unsigned threads = 1)
+    {
+        if (threads == 0) threads = std::max(1u, std::thread::hardware_concurrency());
+
+        std::vector<std::size_t> cuts;
+        tile(recs, 0, recs.size(), 0,
+             [](const Record& r) { return r.p; }, cuts, threads);
+        store_columns(recs);
+
+        std::vector<Node> level;
+        std::size_t b = 0;
+        for (auto e : cuts) {
+            level.push_back(leaf_node(static_cast<index_type>(b),
+                                      static_cast<index_type>(e)));
+            b = e;
+        }
+
+        m_nodes.clear();
+        m_leaves = static_cast<index_type>(level.size());
+        while (level.size() > 1) {
+            std::vector<std::size_t> groups;
+            tile(level, 0, level.size(), 0, centre, groups, 1);
+
+            const auto base = static_cast<index_type>(m_nodes.size());
+            m_nodes.insert(m_nodes.end(), level.begin(), level.end());
+
+            std::vector<Node> parents;
+            b = 0;
+            for (auto e : groups) {
+                parents.push_back(parent_node(base, static_cast<index_type>(b),
+                                              static_cast<index_type>(e)));
+                b = e;
+            }
+            level = std::move(parents);
+        }
+        m_nodes.insert(m_nodes.end(), level.begin(), level.end());
+    }
+
+    std::vector<index_type> range_query(const point_type& lo,
+                                        const point_type& hi) const
+    {
+        std::vector<index_type> res;
+        if (!m_nodes.empty()) range_query_impl(root(), lo, hi, res);
+        return res;
+    }
+
+    std::vector<index_type> range_query_many(const std::vector<point_type>& lo,
+                                             const std::vector<point_type>& hi) const
+    {
+        std::vector<index_type> res;
+        if (m_nodes.empty()) return res;
+
+        for (std::size_t g = 0; g < lo.size(); g += kMaxBoxes) {
+            const std::size_t cnt = std::min(kMaxBoxes, lo.size() - g);
+            const box_mask active = cnt == kMaxBoxes ? ~box_mask{0}
+                                                     : (box_mask{1} << cnt) - 1;
+            range_query_many_impl(root(), lo.data() + g, hi.data() + g, active, res);
+        }
+        if (lo.size() > kMaxBoxes) {
+            std::sort(res.begin(), res.end());
+            res.erase(std::unique(res.begin(), res.end()), res.end());
+        }
+        return res;
+    }
+
+    // Same contract as KdTree::Cursor.
+    class Cursor
+    {
+    public:
+        Cursor(const StrTree& tree, const point_type& lo, const point_type& hi)
+            : m_tree(&tree), m_lo(lo), m_hi(hi), m_stack()
+        {
+            if (!tree.m_nodes.empty()) m_stack.push_back(tree.root());
+        }
+
+        std::size_t next(index_type* out, std::size_t cap)
+        {
+            std::size_t n = 0;
+            while (n < cap) {
+                if (m_pending) {
+                    for (; m_pending && n < cap; m_pending &= m_pending - 1)
+                        out[n++] = m_i + static_cast<index_type>(__builtin_ctz(m_pending));
+                    if (!m_pending) m_i += kLanes;
+                } else if (m_i < m_e) {
+                    m_pending = m_tree->lane_mask(m_i, m_e, m_lo, m_hi);
+                    if (!m_pending) m_i += kLanes;
+                } else if (!advance()) {
+                    break;
+                }
+            }
+            return n;
+        }
+
+        bool done() const noexcept
+        {
+            return !m_pending && m_i >= m_e && m_stack.empty();
+        }
+
+    private:
+        const StrTree*          m_tree;
+        point_type              m_lo, m_hi;
+        std::vector<index_type> m_stack;
+        index_type              m_i = 0, m_e = 0;
+        unsigned                m_pending = 0;
+
+        bool advance()
+        {
+            while (!m_stack.empty()) {
+                const Node& node = m_tree->m_nodes[m_stack.back()];
+                const bool  leaf = m_stack.back() < m_tree->m_leaves;
+                m_stack.pop_back();
+                if (!intersects(node, m_lo, m_hi)) continue;
+                if (leaf) {
+                    m_i = node.first;
+                    m_e = node.first + node.count;
+                    return true;
+                }
+                for (index_type c = node.first + node.count; c-- > node.first; )
+                    m_stack.push_back(c);
+            }
+            return false;
+        }
+    };
+
+    Cursor cursor(const point_type& lo, const point_type& hi) const
+    {
+        return Cursor(*this, lo, hi);
+    }
+
+    point_type point(index_type slot) const noexcept
+    {
+        point_type p{};
+        for (std::size_t d = 0; d < Dim; ++d) p[d] = m_cols[d][slot];
+        return p;
+    }
+
+    id_type id(index_type slot) const noexcept { return m_ids[slot]; }
+    index_type size() const noexcept { return static_cast<index_type>(m_ids.size()); }
+
+    void set_leaf_scan(LeafScan scan) noexcept { m_scan = scan; }
+    LeafScan leaf_scan() const noexcept { return m_scan; }
+
+    // Takes effect on the next build.
+    void set_node_capacity(std::size_t cap) noexcept
+    {
+        m_cap = std::max<std::size_t>(2, cap);
+    }
+    std::size_t node_capacity() const noexcept { return m_cap; }
+
+    std::size_t memoryUsage() const noexcept
+    {
+        std::size_t cols = 0;
+        for (auto const& c : m_cols) cols += c.capacity() * sizeof(Scalar);
+        return sizeof(*this)
+             + cols
+             + m_ids.capacity()   * sizeof(id_type)
+             + m_nodes.capacity() * sizeof(Node);
+    }
+
+private:
+    using box_mask = std::uint64_t;
+
+    static constexpr std::size_t kLanes = 8;
+    static constexpr std::size_t kMaxBoxes = 64;
+    static constexpr std::size_t kParallelCutoff = std::size_t{1} << 16;
+
+#if defined(__AVX2__)
+    static constexpr bool kSimd = std::is_same_v<Scalar, float>
+                               || std::is_same_v<Scalar, std::int32_t>;
+#else
+    static constexpr bool kSimd = false;
+#endif
+
+    std::array<std::vector<Scalar>, Dim>     m_cols;
+    std::vector<id_type>                     m_ids;
+    std::vector<Node>                        m_nodes;
+    index_type                               m_leaves = 0;
+    std::size_t                              m_cap = NodeCap;
+    LeafScan                                 m_scan = LeafScan::Simd;
+
+    static constexpr std::size_t ceil_div(std::size_t a, std::size_t b) noexcept
+    {
+        return (a + b - 1) / b;
+    }
+
+    index_type root() const noexcept
+    {
+        return static_cast<index_type>(m_nodes.size() - 1);
+    }
+
+    static point_type centre(const Node& n) noexcept
+    {
+        point_type c{};
+        for (std::size_t d = 0; d < Dim; ++d) c[d] = n.lo[d] + (n.hi[d] - n.lo[d]) / 2;
+        return c;
+    }
+
+    // Sorts v[b, e) on axis d, cuts it into slabs and recurses on d+1; on
+    // the last axis appends the end of every run of m_cap items to cuts.
+    template <typename T, typename Key>
+    void tile(std::vector<T>& v, std::size_t b, std::size_t e, std::size_t d,
+              Key key, std::vector<std::size_t>& cuts, unsigned threads) const
+    {
+        if (b == e) return;
+        std::sort(v.begin() + b, v.begin() + e,
+                  [&](const T& x, const T& y) { return key(x)[d] < key(y)[d]; });
+
+        if (d + 1 == Dim) {
+            for (std::size_t s = b; s < e; s += m_cap)
+                cuts.push_back(std::min(s + m_cap, e));
+            return;
+        }
+
+        const std::size_t pages = ceil_div(e - b, m_cap);
+        const auto        slabs = static_cast<std::size_t>(
+            std::ceil(std::pow(double(pages), 1.0 / double(Dim - d))));
+        const std::size_t slab  = m_cap * ceil_div(pages, slabs);
+        const std::size_t n_slabs = ceil_div(e - b, slab);
+
+        if (threads > 1 && e - b > kParallelCutoff) {
+            std::vector<std::vector<std::size_t>> parts(n_slabs);
+            std::vector<std::future<void>>        jobs;
+            const std::size_t per_job = ceil_div(n_slabs, threads);
+            for (std::size_t k0 = 0; k0 < n_slabs; k0 += per_job)
+                jobs.push_back(std::async(std::launch::async, [&, k0] {
+                    for (std::size_t k = k0; k < std::min(k0 + per_job, n_slabs); ++k)
+                        tile(v, b + k*slab, std::min(b + (k+1)*slab, e), d + 1,
+                             key, parts[k], 1);
+                }));
+            for (auto& j : jobs) j.get();
+            for (auto const& p : parts) cuts.insert(cuts.end(), p.begin(), p.end());
+            return;
+        }
+        for (std::size_t s = b; s < e; s += slab)
+            tile(v, s, std::min(s + slab, e), d + 1, key, cuts, 1);
+    }
+
+    // Columns are padded by one vector width, as in KdTree.
+    void store_columns(const std::vector<Record>& recs)
+    {
+        const std::size_t n = recs.size();
+        for (std::size_t d = 0; d < Dim; ++d) {
+            m_cols[d].assign(n + kLanes, Scalar{});
+            for (std::size_t i = 0; i < n; ++i) m_cols[d][i] = recs[i].p[d];
+        }
+        m_ids.resize(n);
+        for (std::size_t i = 0; i < n; ++i) m_ids[i] = recs[i].id;
+    }
+
+    Node leaf_node(index_type b, index_type e) const
+    {
+        Node n;
+        n.first = b;
+        n.count = e - b;
+        n.lo = n.hi = point(b);
+        for (index_type i = b + 1; i < e; ++i)
+            for (std::size_t d = 0; d < Dim; ++d) {
+                n.lo[d] = std::min(n.lo[d], m_cols[d][i]);
+                n.hi[d] = std::max(n.hi[d], m_cols[d][i]);
+            }
+        return n;
+    }
+
+    Node parent_node(index_type base, index_type b, index_type e) const
+    {
+        Node n;
+        n.first = base + b;
+        n.count = e - b;
+        n.lo = m_nodes[base + b].lo;
+        n.hi = m_nodes[base + b].hi;
+        for (index_type c = base + b + 1; c < base + e; ++c)
+            for (std::size_t d = 0; d < Dim; ++d) {
+                n.lo[d] = std::min(n.lo[d], m_nodes[c].lo[d]);
+                n.hi[d] = std::max(n.hi[d], m_nodes[c].hi[d]);
+            }
+        return n;
+    }
+
+    static bool intersects(const Node& n, const point_type& lo,
+                           const point_type& hi) noexcept
+    {
+        for (std::size_t d = 0; d < Dim; ++d)
+            if (n.hi[d] < lo[d] || n.lo[d] > hi[d]) return false;
+        return true;
+    }
+
+    static bool contains(const Node& n, const point_type& lo,
+                         const point_type& hi) noexcept
+    {
+        for (std::size_t d = 0; d < Dim; ++d)
+            if (n.lo[d] < lo[d] || n.hi[d] > hi[d]) return false;
+        return true;
+    }
+
+    void range_query_impl(index_type node, const point_type& lo,
+                          const point_type& hi,
+                          std::vector<index_type>& out) const
+    {
+        const Node& n = m_nodes[node];
+        if (!intersects(n, lo, hi)) return;
+        if (node >= m_leaves) {
+            for (index_type c = n.first; c < n.first + n.count; ++c)
+                range_query_impl(c, lo, hi, out);
+            return;
+        }
+        if (contains(n, lo, hi)) {
+            for (index_type i = n.first; i < n.first + n.count; ++i) out.push_back(i);
+            return;
+        }
+        if constexpr (kSimd)
+            if (m_scan == LeafScan::Simd) {
+                scan_leaf_simd(n.first, n.first + n.count, lo, hi, out);
+                return;
+            }
+        for (index_type i = n.first; i < n.first + n.count; ++i)
+            if (inside_scalar(i, lo, hi)) out.push_back(i);
+    }
+
+    void range_query_many_impl(index_type node,
+                               const point_type* lo, const point_type* hi,
+                               box_mask active,
+                               std::vector<index_type>& out) const
+    {
+        const Node& n = m_nodes[node];
+        box_mask hit = 0;
+        for (box_mask m = active; m; m &= m - 1) {
+            const unsigned k = static_cast<unsigned>(__builtin_ctzll(m));
+            if (intersects(n, lo[k], hi[k])) {
+                if (node < m_leaves && contains(n, lo[k], hi[k])) {
+                    for (index_type i = n.first; i < n.first + n.count; ++i)
+                        out.push_back(i);
+                    return;
+                }
+                hit |= box_mask{1} << k;
+            }
+        }
+        if (!hit) return;
+        if (node >= m_leaves) {
+            for (index_type c = n.first; c < n.first + n.count; ++c)
+                range_query_many_impl(c, lo, hi, hit, out);
+            return;
+        }
+        for (index_type i = n.first; i < n.first + n.count; i += kLanes) {
+            const index_type e = n.first + n.count;
+            unsigned mask = 0;
+            for (box_mask m = hit; m && mask != 0xFFu; m &= m - 1) {
+                const unsigned k = static_cast<unsigned>(__builtin_ctzll(m));
+                mask |= lane_mask(i, e, lo[k], hi[k]);
+            }
+            for (; mask; mask &= mask - 1)
+                out.push_back(i + static_cast<index_type>(__builtin_ctz(mask)));
+        }
+    }
+
+    bool inside_scalar(index_type i,
+                       const point_type& lo, const point_type& hi) const noexcept
+    {
+        for (std::size_t d = 0; d < Dim; ++d)
+            if (m_cols[d][i] < lo[d] || m_cols[d][i] > hi[d]) return false;
+        return true;
+    }
+
+    unsigned lane_mask(index_type i, index_type e,
+                       const point_type& lo, const point_type& hi) const noexcept
+    {
+        unsigned mask = 0;
+#if defined(__AVX2__)
+        if constexpr (kSimd)
+            if (m_scan == LeafScan::Simd) {
+                mask = detail::chunk_mask(m_cols, i, lo, hi);
+                return e - i < kLanes ? mask & ((1u << (e - i)) - 1) : mask;
+            }
+#endif
+        for (index_type l = 0; l < kLanes && i + l < e; ++l)
+            if (inside_scalar(i + l, lo, hi)) mask |= 1u << l;
+        return mask;
+    }
+
+#if defined(__AVX2__)
+    void scan_leaf_simd(index_type b, index_type e,
+                        const point_type& lo, const point_type& hi,
+                        std::vector<index_type>& out) const
+    {
+        const std::size_t base = out.size();
+        out.resize(base + (e - b) + kLanes);
+        index_type* dst = out.data() + base;
+
+        for (index_type i = b; i < e; i += kLanes) {
+            unsigned mask = detail::chunk_mask(m_cols, i, lo, hi);
+            if (e - i < kLanes) mask &= (1u << (e - i)) - 1;
+            if (mask) dst = detail::compress_store(dst, i, mask);
+        }
+        out.resize(static_cast<std::size_t>(dst - out.data()));
+    }
+#else
+    void scan_leaf_simd(index_type b, index_type e,
+                        const point_type& lo, const point_type& hi,
+                        std::vector<index_type>& out) const
+    {
+        for (index_type i = b; i < e; ++i)
+            if (inside_scalar(i, lo, hi)) out.push_back(i);
+    }
+#endif
+};
+
+}
+
+namespace vec {
+
+// vKdTree's build and box-query interface over skd::StrTree.
+template <std::size_t Dim = 3, typename Scalar = float>
+class vStrTree
+{
+public:
+    using scalar_type = Scalar;
+    using entry_type  = Entry<Dim, Scalar>;
+    using tree_type   = skd::StrTree<Dim, Scalar>;
+
+    using record_type = typename tree_type::Record;
+    using id_type     = typename tree_type::id_type;
+
+    void build(const std::vector<entry_type>& entries, unsigned threads = 1)
+    {
+        std::vector<record_type> recs(entries.size());
+        for (std::size_t i = 0; i < entries.size(); ++i)
+            recs[i] = {entries[i].key, detail::checked_id<id_type>(entries[i].value)};
+        m_tree.build(std::move(recs), threads);
+    }
+
+    void build_from_arrays(const Scalar* cols, const std::uint64_t* row_ids,
+                           std::size_t n, unsigned threads = 1)
+    {
+        std::vector<record_type> recs(n);
+        for (std::size_t i = 0; i < n; ++i) {
+            for (std::size_t d = 0; d < Dim; ++d)
+                recs[i].p[d] = cols[d*n + i];
+            recs[i].id = detail::checked_id<id_type>(row_ids ? row_ids[i] : i);
+        }
+        m_tree.build(std::move(recs), threads);
+    }
+
+    struct Result { std::vector<entry_type> entries; };
+
+    template <typename... Bounds>
+    Result rangeSearch(Bounds... bounds) const
+    {
+        static_assert(sizeof...(bounds) == Dim*2,
+                      "need exactly 2*Dim bounds");
+        return rangeSearchBox({static_cast<Scalar>(bounds)...});
+    }
+
+    Result rangeSearchBox(const std::vector<Scalar>& bounds) const
+    {
+        std::array<Scalar, Dim> lo{}, hi{};
+        detail::split_box(bounds.data(), lo, hi);
+
+        auto slots = m_tree.range_query(lo, hi);
+        Result r;
+        r.entries.reserve(slots.size());
+        for (auto slot : slots) {
+            entry_type e;
+            e.key   = m_tree.point(slot);
+            e.value = m_tree.id(slot);
+            r.entries.push_back(e);
+        }
+        return r;
+    }
+
+    using Cursor = detail::IdCursor<tree_type>;
+
+    Cursor rangeCursor(const std::vector<Scalar>& bounds) const
+    {
+        std::array<Scalar, Dim> lo{}, hi{};
+        detail::split_box(bounds.data(), lo, hi);
+        return Cursor(m_tree, lo, hi);
+    }
+
+    std::vector<std::uint64_t> rangeSearchMany(const std::vector<Scalar>& boxes) const
+    {
+        std::vector<std::array<Scalar, Dim>> lo, hi;
+        detail::split_boxes(boxes, lo, hi);
+
+        auto slots = m_tree.range_query_many(lo, hi);
+        std::vector<std::uint64_t> values;
+        values.reserve(slots.size());
+        for (auto slot : slots) values.push_back(m_tree.id(slot));
+        return values;
+    }
+
+    void setLeafScan(skd::LeafScan scan) noexcept { m_tree.set_leaf_scan(scan); }
+    void setNodeCapacity(std::size_t cap) noexcept { m_tree.set_node_capacity(cap); }
+
+    const tree_type& tree() const noexcept { return m_tree; }
+
+    std::size_t getMemoryUsage() const noexcept
+    {
+        return m_tree.memoryUsage();
+    }
+
+private:
+    tree_type                     m_tree;
+};
+
+using TripleStrTree    = vStrTree<3>;
+using TripleIntStrTree = vStrTree<3, std::int32_t>;
+
+}
+
+#define STRTREE_EXTERN(D, S)                                         \
+    extern template class skd::StrTree<D, S>;                        \
+    extern template class vec::vStrTree<D, S>;                       \
+    extern template class vec::detail::IdCursor<skd::StrTree<D, S>>;
+VKDTREE_FOR_EACH(STRTREE_EXTERN)
+#undef STRTREE_EXTERN
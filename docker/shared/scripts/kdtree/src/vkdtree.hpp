@@ -1,74 +1,225 @@
 #pragma once
 #include "kdtree.hpp"
 #include <cstdint>
+#include <limits>
+#include <stdexcept>
+#include <string>
 #include <vector>
 
 namespace vec {
 
-template <std::size_t Dim = 3>
+template <std::size_t Dim = 3, typename Scalar = float>
 struct Entry {
-    std::array<float, Dim> key{};  
-    std::uint64_t          value{};
+    std::array<Scalar, Dim> key{};  
+    std::uint64_t           value{};
 };
 
-template <std::size_t Dim = 3>
+namespace detail {
+
+template <typename Id>
+Id checked_id(std::uint64_t value)
+{
+    if (value > std::numeric_limits<Id>::max())
+        throw std::out_of_range("vec: row id " + std::to_string(value)
+                                + " does not fit the 32-bit id column");
+    return static_cast<Id>(value);
+}
+
+// A box is 2*Dim bounds, all lows then all highs.
+template <std::size_t Dim, typename Scalar>
+void split_box(const Scalar* bounds, std::array<Scalar, Dim>& lo,
+               std::array<Scalar, Dim>& hi)
+{
+    for (std::size_t i = 0; i < Dim; ++i) {
+        lo[i] = bounds[i];
+        hi[i] = bounds[i+Dim];
+    }
+}
+
+template <std::size_t Dim, typename Scalar>
+void split_boxes(const std::vector<Scalar>& boxes,
+                 std::vector<std::array<Scalar, Dim>>& lo,
+                 std::vector<std::array<Scalar, Dim>>& hi)
+{
+    const std::size_t nb = boxes.size() / (2*Dim);
+    lo.resize(nb);
+    hi.resize(nb);
+    for (std::size_t k = 0; k < nb; ++k)
+        split_box(boxes.data() + k*2*Dim, lo[k], hi[k]);
+}
+
+// Wraps a tree's slot cursor and resolves slots to row ids.
+template <typename Tree>
+class IdCursor
+{
+public:
+    IdCursor(const Tree& tree, const typename Tree::point_type& lo,
+             const typename Tree::point_type& hi)
+        : m_tree(&tree), m_cur(tree.cursor(lo, hi)), m_slots() {}
+
+    // Writes up to cap values into out; returns 0 once exhausted.
+    std::size_t next(std::uint64_t* out, std::size_t cap)
+    {
+        m_slots.resize(cap);
+        const std::size_t n = m_cur.next(m_slots.data(), cap);
+        for (std::size_t i = 0; i < n; ++i) out[i] = m_tree->id(m_slots[i]);
+        return n;
+    }
+
+    bool done() const noexcept { return m_cur.done(); }
+
+private:
+    const Tree*                               m_tree;
+    typename Tree::Cursor                     m_cur;
+    std::vector<typename Tree::index_type>    m_slots;
+};
+
+}
+
+// Scalar is float, std::int32_t or std::int64_t; the integer trees hold
+// dates as epoch days and decimals scaled by a fixed power of ten, so
+// their boxes compare exactly.
+template <std::size_t Dim = 3, typename Scalar = float>
 class vKdTree
 {
 public:
-    using entry_type = Entry<Dim>;
+    using scalar_type = Scalar;
+    using entry_type  = Entry<Dim, Scalar>;
+    using tree_type   = skd::KdTree<Dim, Scalar>;
+
+    using record_type = typename tree_type::Record;
+    using id_type     = typename tree_type::id_type;
 
-    void build(const std::vector<entry_type>& entries)
+    // Values are stored inside the tree as 32-bit row ids.
+    void build(const std::vector<entry_type>& entries, unsigned threads = 1)
     {
-        std::vector<std::array<float, Dim>> pts;
-        pts.reserve(entries.size());
-        m_values.reserve(entries.size());
+        std::vector<record_type> recs(entries.size());
+        for (std::size_t i = 0; i < entries.size(); ++i)
+            recs[i] = {entries[i].key, detail::checked_id<id_type>(entries[i].value)};
+        m_tree.build(std::move(recs), threads);
+    }
 
-        for (auto const& e : entries) {
-            pts.push_back(e.key);
-            m_values.push_back(e.value);
+    // Bulk-load form of build for contiguous column buffers: cols holds Dim
+    // columns of n values back to back (column d starts at cols + d*n) and
+    // row_ids holds the n values, or is null to number the rows 0..n-1.
+    void build_from_arrays(const Scalar* cols, const std::uint64_t* row_ids,
+                           std::size_t n, unsigned threads = 1)
+    {
+        std::vector<record_type> recs(n);
+        for (std::size_t i = 0; i < n; ++i) {
+            for (std::size_t d = 0; d < Dim; ++d)
+                recs[i].p[d] = cols[d*n + i];
+            recs[i].id = detail::checked_id<id_type>(row_ids ? row_ids[i] : i);
         }
-        m_tree.build(pts);
+        m_tree.build(std::move(recs), threads);
     }
 
     struct Result { std::vector<entry_type> entries; };
 
-    template <typename... Floats>
-    Result rangeSearch(Floats... bounds) const
+    template <typename... Bounds>
+    Result rangeSearch(Bounds... bounds) const
     {
         static_assert(sizeof...(bounds) == Dim*2,
                       "need exactly 2*Dim bounds");
-        std::array<float, Dim*2> b{static_cast<float>(bounds)...};
-        std::array<float, Dim> lo{}, hi{};
-        for (std::size_t i = 0; i < Dim; ++i) {
-            lo[i] = b[i];
-            hi[i] = b[i+Dim];
-        }
+        return rangeSearchBox({static_cast<Scalar>(bounds)...});
+    }
+
+    // Non-template form of rangeSearch, covered by the instantiations
+    // shipped in libfast.so.
+    Result rangeSearchBox(const std::vector<Scalar>& bounds) const
+    {
+        std::array<Scalar, Dim> lo{}, hi{};
+        detail::split_box(bounds.data(), lo, hi);
 
-        auto idxs = m_tree.range_query(lo, hi);
+        auto slots = m_tree.range_query(lo, hi);
         Result r; 
-        r.entries.reserve(idxs.size());
-        for (auto id : idxs) {
+        r.entries.reserve(slots.size());
+        for (auto slot : slots) {
             entry_type e;
-            e.key   = m_tree.point(id);
-            e.value = m_values[id];
+            e.key   = m_tree.point(slot);
+            e.value = m_tree.id(slot);
             r.entries.push_back(e);
         }
         return r;
     }
 
+    // Streams the values of rangeSearchBox's entries in blocks instead of
+    // building the whole result; the tree must outlive the cursor.
+    using Cursor = detail::IdCursor<tree_type>;
+
+    Cursor rangeCursor(const std::vector<Scalar>& bounds) const
+    {
+        std::array<Scalar, Dim> lo{}, hi{};
+        detail::split_box(bounds.data(), lo, hi);
+        return Cursor(m_tree, lo, hi);
+    }
+
+    // boxes holds 2*Dim bounds per box, laid out like rangeSearch's
+    // arguments; returns the values of all entries inside any box, once each.
+    std::vector<std::uint64_t> rangeSearchMany(const std::vector<Scalar>& boxes) const
+    {
+        std::vector<std::array<Scalar, Dim>> lo, hi;
+        detail::split_boxes(boxes, lo, hi);
+
+        auto slots = m_tree.range_query_many(lo, hi);
+        std::vector<std::uint64_t> values;
+        values.reserve(slots.size());
+        for (auto slot : slots) values.push_back(m_tree.id(slot));
+        return values;
+    }
+
+    // values holds one payload per row id (e.g. l_extendedprice * l_discount
+    // for Q6); rangeAggregate then sums it without materialising rows.
+    void setPayload(const double* values, std::size_t n)
+    {
+        m_tree.set_payload(values, n);
+    }
+
+    template <typename... Bounds>
+    skd::Aggregate rangeAggregate(Bounds... bounds) const
+    {
+        static_assert(sizeof...(bounds) == Dim*2,
+                      "need exactly 2*Dim bounds");
+        return rangeAggregateBox({static_cast<Scalar>(bounds)...});
+    }
+
+    skd::Aggregate rangeAggregateBox(const std::vector<Scalar>& bounds) const
+    {
+        std::array<Scalar, Dim> lo{}, hi{};
+        detail::split_box(bounds.data(), lo, hi);
+        return m_tree.range_aggregate(lo, hi);
+    }
+
+    void setLeafScan(skd::LeafScan scan) noexcept { m_tree.set_leaf_scan(scan); }
+
+    // Split rule, bucket size and workload apply to the next build.
+    void setSplitRule(skd::SplitRule rule) noexcept { m_tree.set_split_rule(rule); }
+    void setBucketSize(std::size_t bucket) noexcept { m_tree.set_bucket_size(bucket); }
+
+    // boxes uses the rangeSearchMany layout.
+    void setWorkload(const std::vector<Scalar>& boxes)
+    {
+        std::vector<std::array<Scalar, Dim>> lo, hi;
+        detail::split_boxes(boxes, lo, hi);
+        m_tree.set_workload(std::move(lo), std::move(hi));
+    }
+
+    const tree_type& tree() const noexcept { return m_tree; }
+
     std::size_t getMemoryUsage() const noexcept
     {
-        return m_tree.memoryUsage()
-             + m_values.capacity() * sizeof(std::uint64_t);
+        return m_tree.memoryUsage();
     }
 
 private:
-    skd::KdTree<Dim, float>       m_tree;
-    std::vector<std::uint64_t>    m_values;
+    tree_type                     m_tree;
 };
 
-using TripleEntry  = Entry<3>;
-using TripleKdTree = vKdTree<3>;
+using TripleEntry     = Entry<3>;
+using TripleKdTree    = vKdTree<3>;
+using TripleIntEntry  = Entry<3, std::int32_t>;
+using TripleIntKdTree = vKdTree<3, std::int32_t>;
+
 
 struct DateEntry {
     int32_t  key{};
@@ -80,6 +231,21 @@ struct DateEntry {
 
 } 
 
+#define VKDTREE_FOR_EACH_DIM(X, S) X(2, S) X(3, S) X(4, S) X(5, S) X(6, S)
+#define VKDTREE_FOR_EACH(X)                  \
+    VKDTREE_FOR_EACH_DIM(X, float)           \
+    VKDTREE_FOR_EACH_DIM(X, std::int32_t)    \
+    VKDTREE_FOR_EACH_DIM(X, std::int64_t)
+
+// Definitions live in fastlib.cpp; declaring them extern keeps cppyy from
+// JIT-compiling the tree bodies when a script includes this header.
+#define VKDTREE_EXTERN(D, S)                                        \
+    extern template class skd::KdTree<D, S>;                        \
+    extern template class vec::vKdTree<D, S>;                       \
+    extern template class vec::detail::IdCursor<skd::KdTree<D, S>>;
+VKDTREE_FOR_EACH(VKDTREE_EXTERN)
+#undef VKDTREE_EXTERN
+
 namespace std {
 template <> struct tuple_size<vec::DateEntry> : std::integral_constant<std::size_t, 1> {};
 template <> struct tuple_element<0, vec::DateEntry> { using type = int32_t; };
@@ -0,0 +1,92 @@
+import os
+import time
+import array
+
+import numpy as np
+from pyroaring import BitMap, BitMap64
+
+from common_roaring import ROWS_32, write_csv_results
+
+RESULT_CSV = "../results/roaring/bitmap64.csv"
+ROWS       = 20_000_000
+REPEATS    = 5
+SEED       = 42
+
+# Where the row range starts relative to the 32-bit limit: the lowest and
+# highest ranges BitMap can hold, one straddling 2**32 and one past it.
+OFFSETS = [
+    ("low",        0),
+    ("below_2^32", ROWS_32 - ROWS),
+    ("straddle",   ROWS_32 - ROWS // 2),
+    ("above_2^32", ROWS_32),
+]
+
+DENSITIES = [("dense", 1.0), ("half", 0.5), ("sparse", 0.01)]
+
+FIELDNAMES = [
+    "Width",
+    "Offset",
+    "Density",
+    "Rows",
+    "Cardinality",
+    "Build Time (s)",
+    "And Time (s)",
+    "Or Time (s)",
+    "AndNot Time (s)",
+    "Size (MB)",
+]
+
+
+def sample(rng, density: float) -> np.ndarray:
+    if density >= 1.0:
+        return np.arange(ROWS, dtype=np.uint64)
+    return np.flatnonzero(rng.random(ROWS) < density).astype(np.uint64)
+
+
+def as_array(rows: np.ndarray, typecode: str) -> array.array:
+    out = array.array(typecode)
+    out.frombytes(rows.astype(np.uint32 if typecode == "I" else np.uint64).tobytes())
+    return out
+
+
+def best(fn, *args):
+    times = []
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        times.append(time.perf_counter() - t0)
+    return out, min(times)
+
+
+if __name__ == "__main__":
+    os.makedirs(os.path.dirname(RESULT_CSV), exist_ok=True)
+    rng = np.random.default_rng(SEED)
+
+    rows = []
+    for density_name, density in DENSITIES:
+        left, right = sample(rng, density), sample(rng, density)
+        for offset_name, offset in OFFSETS:
+            for width, cls, typecode in ((32, BitMap, "I"), (64, BitMap64, "Q")):
+                if width == 32 and offset + ROWS > ROWS_32:
+                    continue
+                a_rows = as_array(left + np.uint64(offset), typecode)
+                b_rows = as_array(right + np.uint64(offset), typecode)
+                a, build_secs = best(cls, a_rows)
+                b = cls(b_rows)
+                _, and_secs    = best(a.__and__, b)
+                _, or_secs     = best(a.__or__, b)
+                _, andnot_secs = best(a.__sub__, b)
+                rows.append({
+                    "Width":           width,
+                    "Offset":          offset_name,
+                    "Density":         density_name,
+                    "Rows":            ROWS,
+                    "Cardinality":     len(a),
+                    "Build Time (s)":  build_secs,
+                    "And Time (s)":    and_secs,
+                    "Or Time (s)":     or_secs,
+                    "AndNot Time (s)": andnot_secs,
+                    "Size (MB)":       len(a.serialize()) / (1024 * 1024),
+                })
+
+    write_csv_results(RESULT_CSV, FIELDNAMES, rows)
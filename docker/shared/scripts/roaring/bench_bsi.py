@@ -0,0 +1,116 @@
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from functools import reduce
+from pyroaring import BitMap
+
+from common_roaring import (
+    DECIMAL_SCALE,
+    BitSlicedIndex,
+    index_column,
+    bitmap_memory_size,
+    write_csv_results,
+)
+
+NUM_RUNS   = 20
+RESULT_CSV = "../results/roaring/bsi.csv"
+
+FIELDNAMES = [
+    "Query",
+    "Predicate",
+    "Index",
+    "Matches",
+    "Latency (s)",
+    "Index Size (MB)",
+    "Index Creation Time (s)",
+]
+
+
+def combine(bitmaps):
+    return reduce(lambda a, b: a | b, bitmaps, BitMap())
+
+
+def load_column(path: str, col: str):
+    return pc.cast(pq.read_table(path, columns=[col]).column(col), pa.float64())
+
+
+def build_both(arr):
+    t0 = time.perf_counter()
+    per_value = index_column(arr)
+    per_value_secs = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    bsi = BitSlicedIndex.build(arr.to_numpy(), DECIMAL_SCALE)
+    bsi_secs = time.perf_counter() - t0
+    return per_value, per_value_secs, bsi, bsi_secs
+
+
+def timed(fn, num_runs: int = NUM_RUNS):
+    result = fn()
+    t0 = time.perf_counter()
+    for _ in range(num_runs):
+        fn()
+    return result, (time.perf_counter() - t0) / num_runs
+
+
+def positive_mean(arr) -> float:
+    return pc.mean(pc.filter(arr, pc.greater(arr, 0.0))).as_py()
+
+
+# Per-value predicate and the matching BitSlicedIndex method.
+OPS = {
+    "lt":      (lambda v, t: v < t,              lambda b, t: b.lt(t)),
+    "eq":      (lambda v, t: v == t,             lambda b, t: b.eq(t)),
+    "gt":      (lambda v, t: v > t,              lambda b, t: b.gt(t)),
+    "between": (lambda v, t: t[0] <= v <= t[1],  lambda b, t: b.between(*t)),
+}
+
+# (query, table, column, label, op, threshold or threshold(column))
+PREDICATES = [
+    (6,  "lineitem", "l_quantity", "l_quantity < 24",  "lt", 24),
+    (6,  "lineitem", "l_discount", "l_discount between 0.04 and 0.06",
+     "between", (0.04, 0.06)),
+    (6,  "lineitem", "l_discount", "l_discount = 0.05", "eq", 0.05),
+    (22, "customer", "c_acctbal",  "c_acctbal > avg",   "gt", positive_mean),
+]
+
+
+if __name__ == "__main__":
+    os.makedirs(os.path.dirname(RESULT_CSV), exist_ok=True)
+
+    columns, indexes, rows = {}, {}, []
+    for query, table, col, label, op, threshold in PREDICATES:
+        if col not in indexes:
+            columns[col] = load_column(f"../data/tpch/parquet/{table}.parquet", col)
+            indexes[col] = build_both(columns[col])
+        per_value, per_value_secs, bsi, bsi_secs = indexes[col]
+        if callable(threshold):
+            threshold = threshold(columns[col])
+        keep, lookup = OPS[op]
+
+        # The per-value path is what the roaring scripts do today: test
+        # every distinct value in Python and OR the survivors.
+        expected, t_values = timed(
+            lambda: combine([bm for v, bm in per_value.items() if keep(v, threshold)])
+        )
+        got, t_bsi = timed(lambda: lookup(bsi, threshold))
+        if got != expected:
+            raise RuntimeError(f"bit-sliced index mismatch on {label}")
+
+        rows.append({
+            "Query": query, "Predicate": label, "Index": "per-value",
+            "Matches": len(expected), "Latency (s)": t_values,
+            "Index Size (MB)": bitmap_memory_size(per_value),
+            "Index Creation Time (s)": per_value_secs,
+        })
+        rows.append({
+            "Query": query, "Predicate": label, "Index": "bit-sliced",
+            "Matches": len(got), "Latency (s)": t_bsi,
+            "Index Size (MB)": bsi.nbytes / (1024 * 1024),
+            "Index Creation Time (s)": bsi_secs,
+        })
+
+    write_csv_results(RESULT_CSV, FIELDNAMES, rows)
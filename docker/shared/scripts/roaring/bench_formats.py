@@ -0,0 +1,294 @@
+import os
+import time
+import datetime
+from functools import reduce
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from common_roaring import (
+    RUN_OPTIMIZE,
+    use_row_space,
+    row_dtype,
+    new_bitmap,
+    row_array,
+    bitmap_rows,
+    container_bytes,
+    write_csv_results,
+)
+
+RESULT_CSV = "../results/roaring/formats.csv"
+PATH_L     = "../data/tpch/parquet/lineitem.parquet"
+REPEATS    = 5
+
+D_1994, D_1995 = datetime.date(1994, 1, 1), datetime.date(1995, 1, 1)
+
+
+def _date(value):
+    return pa.scalar(value, pa.date32())
+
+
+def _number(t, col):
+    return pc.cast(t.column(col), pa.float64())
+
+
+# Leaf predicates of roaring_1/6/12, each evaluated once to a boolean mask
+# so that every format encodes exactly the same rows.
+PREDICATES = {
+    "l_returnflag = 'N'":  lambda t: pc.equal(t.column("l_returnflag"), "N"),
+    "l_linestatus = 'O'":  lambda t: pc.equal(t.column("l_linestatus"), "O"),
+    "l_shipdate in 1994":  lambda t: pc.and_(
+        pc.greater_equal(t.column("l_shipdate"), _date(D_1994)),
+        pc.less(t.column("l_shipdate"), _date(D_1995))),
+    "l_discount = 0.05":   lambda t: pc.equal(_number(t, "l_discount"), 0.05),
+    "l_quantity < 24":     lambda t: pc.less(_number(t, "l_quantity"), 24.0),
+    "l_shipmode = 'MAIL'": lambda t: pc.equal(t.column("l_shipmode"), "MAIL"),
+    "l_shipmode = 'SHIP'": lambda t: pc.equal(t.column("l_shipmode"), "SHIP"),
+    "l_commitdate < l_receiptdate": lambda t: pc.less(
+        t.column("l_commitdate"), t.column("l_receiptdate")),
+    "l_shipdate < l_commitdate":    lambda t: pc.less(
+        t.column("l_shipdate"), t.column("l_commitdate")),
+    "l_receiptdate in 1994": lambda t: pc.and_(
+        pc.greater_equal(t.column("l_receiptdate"), _date(D_1994)),
+        pc.less(t.column("l_receiptdate"), _date(D_1995))),
+}
+
+# Each query's filter in conjunctive form: AND across groups, OR within one.
+QUERIES = {
+    1:  [["l_returnflag = 'N'"], ["l_linestatus = 'O'"]],
+    6:  [["l_shipdate in 1994"], ["l_discount = 0.05"], ["l_quantity < 24"]],
+    12: [["l_shipmode = 'MAIL'", "l_shipmode = 'SHIP'"],
+         ["l_commitdate < l_receiptdate"],
+         ["l_shipdate < l_commitdate"],
+         ["l_receiptdate in 1994"]],
+}
+
+FIELDNAMES = [
+    "Query",
+    "Format",
+    "Rows",
+    "Predicates",
+    "Cardinality",
+    "Build Time (s)",
+    "Size (MB)",
+    "And Time (s)",
+    "Or Time (s)",
+    "Selection Vector Time (s)",
+]
+
+
+def merged(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # A stable sort of integers is a radix sort, far quicker than the
+    # generic np.unique behind np.union1d.
+    return np.sort(np.concatenate([a, b]), kind="stable")
+
+
+def intersect_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    c = merged(a, b)
+    return c[:-1][c[1:] == c[:-1]]
+
+
+def union_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    c = merged(a, b)
+    return c[np.concatenate([[True], c[1:] != c[:-1]])] if len(c) else c
+
+
+class RoaringFormat:
+    name = "roaring"
+
+    def __init__(self, universe: int):
+        self.universe = universe
+
+    def build(self, mask: np.ndarray):
+        bm = new_bitmap(row_array(np.flatnonzero(mask)))
+        if RUN_OPTIMIZE:
+            bm.run_optimize()
+            bm.shrink_to_fit()
+        return bm
+
+    def nbytes(self, bm) -> int:
+        return container_bytes([bm])
+
+    def and_(self, a, b):
+        return a & b
+
+    def or_(self, a, b):
+        return a | b
+
+    def rows(self, bm) -> np.ndarray:
+        return bitmap_rows(bm)
+
+
+class BitsetFormat:
+    """One bit per row, packed eight to a byte with ``np.packbits``."""
+    name = "packbits"
+
+    def __init__(self, universe: int):
+        self.universe = universe
+
+    def build(self, mask: np.ndarray) -> np.ndarray:
+        return np.packbits(mask)
+
+    def nbytes(self, bits: np.ndarray) -> int:
+        return bits.nbytes
+
+    def and_(self, a, b):
+        return np.bitwise_and(a, b)
+
+    def or_(self, a, b):
+        return np.bitwise_or(a, b)
+
+    def rows(self, bits: np.ndarray) -> np.ndarray:
+        return np.flatnonzero(
+            np.unpackbits(bits, count=self.universe)
+        ).astype(row_dtype())
+
+
+class SortedFormat:
+    """The matching row ids as a sorted array; already a selection vector."""
+    name = "sorted_array"
+
+    def __init__(self, universe: int):
+        self.universe = universe
+
+    def build(self, mask: np.ndarray) -> np.ndarray:
+        return np.flatnonzero(mask).astype(row_dtype())
+
+    def nbytes(self, rows: np.ndarray) -> int:
+        return rows.nbytes
+
+    def and_(self, a, b):
+        return intersect_sorted(a, b)
+
+    def or_(self, a, b):
+        return union_sorted(a, b)
+
+    def rows(self, rows: np.ndarray) -> np.ndarray:
+        return rows
+
+
+class EliasFanoFormat:
+    """Elias–Fano coded row ids.
+
+    Each id keeps its ``low_bits`` low bits verbatim in a packed array and
+    its high part in unary, as bit ``(id >> low_bits) + i`` of an upper
+    bit vector. Set operations decode both sides, merge the id arrays and
+    re-encode, so their cost includes the round trip.
+    """
+    name = "elias_fano"
+
+    def __init__(self, universe: int):
+        self.universe = universe
+
+    def encode(self, rows: np.ndarray):
+        rows  = rows.astype(np.uint64)
+        count = len(rows)
+        low_bits = max(int(self.universe // count).bit_length() - 1, 0) if count else 0
+
+        upper_len = (self.universe >> low_bits) + count + 1
+        upper     = np.zeros(upper_len, dtype=bool)
+        upper[(rows >> np.uint64(low_bits)) + np.arange(count, dtype=np.uint64)] = True
+
+        shifts = np.arange(low_bits - 1, -1, -1, dtype=np.uint64)
+        low    = np.packbits(((rows[:, None] >> shifts) & np.uint64(1)).astype(np.uint8))
+        return count, low_bits, upper_len, low, np.packbits(upper)
+
+    def decode(self, ef) -> np.ndarray:
+        count, low_bits, upper_len, low, upper = ef
+        high = (np.flatnonzero(np.unpackbits(upper, count=upper_len))
+                - np.arange(count)).astype(np.uint64)
+        rows = high << np.uint64(low_bits)
+        if low_bits:
+            bits    = np.unpackbits(low, count=count * low_bits).reshape(count, low_bits)
+            weights = np.uint64(1) << np.arange(low_bits - 1, -1, -1, dtype=np.uint64)
+            rows   |= bits @ weights
+        return rows.astype(row_dtype())
+
+    def build(self, mask: np.ndarray):
+        return self.encode(np.flatnonzero(mask))
+
+    def nbytes(self, ef) -> int:
+        return ef[3].nbytes + ef[4].nbytes
+
+    def and_(self, a, b):
+        return self.encode(intersect_sorted(self.decode(a), self.decode(b)))
+
+    def or_(self, a, b):
+        return self.encode(union_sorted(self.decode(a), self.decode(b)))
+
+    def rows(self, ef) -> np.ndarray:
+        return self.decode(ef)
+
+
+FORMATS = [RoaringFormat, BitsetFormat, SortedFormat, EliasFanoFormat]
+
+
+def best(fn, *args):
+    times = []
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        times.append(time.perf_counter() - t0)
+    return out, min(times)
+
+
+def evaluate(fmt, leaves, groups):
+    """OR each group's leaves, then AND the groups; returns the result and
+    the time spent in each operator."""
+    or_secs, ors = 0.0, []
+    for group in groups:
+        out, secs = best(reduce, fmt.or_, [leaves[p] for p in group])
+        ors.append(out)
+        or_secs += secs
+    result, and_secs = best(reduce, fmt.and_, ors)
+    return result, and_secs, or_secs
+
+
+if __name__ == "__main__":
+    os.makedirs(os.path.dirname(RESULT_CSV), exist_ok=True)
+    use_row_space(PATH_L)
+
+    cols  = ["l_returnflag", "l_linestatus", "l_shipdate", "l_discount",
+             "l_quantity", "l_shipmode", "l_commitdate", "l_receiptdate"]
+    table = pq.read_table(PATH_L, columns=cols)
+    masks = {p: fn(table).to_numpy(zero_copy_only=False).astype(bool)
+             for p, fn in PREDICATES.items()}
+    n = table.num_rows
+    del table
+
+    rows = []
+    for query, groups in QUERIES.items():
+        used     = [p for group in groups for p in group]
+        expected = np.flatnonzero(np.logical_and.reduce(
+            [np.logical_or.reduce([masks[p] for p in group]) for group in groups]
+        ))
+        for cls in FORMATS:
+            fmt = cls(n)
+            leaves, build_secs = {}, 0.0
+            for p in used:
+                t0 = time.perf_counter()
+                leaves[p] = fmt.build(masks[p])
+                build_secs += time.perf_counter() - t0
+
+            result, and_secs, or_secs = evaluate(fmt, leaves, groups)
+            selection, sel_secs = best(fmt.rows, result)
+            if not np.array_equal(selection, expected):
+                raise RuntimeError(f"{fmt.name} disagrees on Q{query}")
+
+            rows.append({
+                "Query":                     query,
+                "Format":                    fmt.name,
+                "Rows":                      n,
+                "Predicates":                len(used),
+                "Cardinality":               len(selection),
+                "Build Time (s)":            build_secs,
+                "Size (MB)":                 sum(fmt.nbytes(leaves[p]) for p in used)
+                                             / (1024 * 1024),
+                "And Time (s)":              and_secs,
+                "Or Time (s)":               or_secs,
+                "Selection Vector Time (s)": sel_secs,
+            })
+
+    write_csv_results(RESULT_CSV, FIELDNAMES, rows)
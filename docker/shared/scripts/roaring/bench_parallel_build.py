@@ -0,0 +1,64 @@
+import os
+import time
+
+import pyarrow.parquet as pq
+
+from common_roaring import index_columns_parallel, write_csv_results
+
+RESULT_CSV = "../results/roaring/parallel_build.csv"
+
+# (table, columns indexed together in one pass)
+COLUMNS = [
+    ("lineitem", ["l_returnflag", "l_linestatus"]),
+    ("lineitem", ["l_shipmode"]),
+    ("lineitem", ["l_shipdate"]),
+    ("orders",   ["o_orderdate"]),
+]
+
+FIELDNAMES = [
+    "Table",
+    "Columns",
+    "Rows",
+    "Row Groups",
+    "Workers",
+    "Bitmap Creation Time (s)",
+    "Speedup",
+]
+
+
+def worker_counts():
+    cores, n, out = os.cpu_count() or 1, 1, []
+    while n < cores:
+        out.append(n)
+        n *= 2
+    return out + [cores]
+
+
+if __name__ == "__main__":
+    os.makedirs(os.path.dirname(RESULT_CSV), exist_ok=True)
+
+    rows = []
+    for table, cols in COLUMNS:
+        path = f"../data/tpch/parquet/{table}.parquet"
+        meta = pq.ParquetFile(path).metadata
+        base, base_secs = None, None
+        for workers in worker_counts():
+            t0   = time.perf_counter()
+            idx  = index_columns_parallel(path, cols, workers)
+            secs = time.perf_counter() - t0
+            if base is None:
+                base, base_secs = idx, secs
+            elif idx != base:
+                raise RuntimeError(f"bitmap mismatch on {table}.{cols} "
+                                   f"with {workers} workers")
+            rows.append({
+                "Table":                    table,
+                "Columns":                  " ".join(cols),
+                "Rows":                     meta.num_rows,
+                "Row Groups":               meta.num_row_groups,
+                "Workers":                  workers,
+                "Bitmap Creation Time (s)": secs,
+                "Speedup":                  base_secs / secs if secs > 0 else None,
+            })
+
+    write_csv_results(RESULT_CSV, FIELDNAMES, rows)
@@ -1,12 +1,48 @@
 import os
 import sys
+import re
 import csv
-from typing import Dict, Iterable
+import math
+import time
+import mmap
+import array
+import struct
+import pickle
+import decimal
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, Iterable, List, Optional
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyroaring import BitMap, FrozenBitMap, BitMap64, FrozenBitMap64
 from datafusion import SessionContext
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from common import measure_query_execution
 
+SMALL_GROUP   = 64
+DECIMAL_SCALE = 100
+PLAN_CSV      = "../results/roaring/plans.csv"
+INDEX_STORE   = "../data/tpch/roaring_index"
+ROWS_32       = 1 << 32
+RUN_OPTIMIZE  = True
+MEMORY_CSV    = "../results/roaring/memory.csv"
+MEMORY_FIELDNAMES = [
+    "Query", "Index", "Stage", "Bitmaps", "Containers",
+    "Array Containers", "Bitset Containers", "Run Containers",
+    "Array (MB)", "Bitset (MB)", "Run (MB)", "Arrays (MB)", "Size (MB)",
+]
+PLAN_FIELDNAMES = ["Query", "Node", "Depth", "Latency (s)", "Cardinality"]
+CONTAINER_TYPES = ("array", "bitset", "run")
+ROW_ORDERS      = ("none", "lex", "gray")
+
+# Width of every bitmap the helpers below build; see use_row_space().
+_row_bits     = 32
+
 
 def aggregate_metrics(*metric_dicts: Iterable[Dict]) -> Dict:
     out: Dict[str, float] = {}
@@ -46,11 +82,892 @@ def aggregate_metrics(*metric_dicts: Iterable[Dict]) -> Dict:
     return out
 
 
+def use_row_space(*paths) -> int:
+    """Size the bitmaps for a pipeline over the Parquet files ``paths``.
+
+    32-bit BitMaps hold row ids up to 2**32 - 1; once the largest file has
+    more rows than that, every bitmap built afterwards is a BitMap64 so
+    all of them stay combinable (the two classes do not mix). Call before
+    building any index; returns the width in bits.
+    """
+    global _row_bits
+    rows = max((pq.ParquetFile(p).metadata.num_rows for p in paths), default=0)
+    _row_bits = 32 if rows <= ROWS_32 else 64
+    return _row_bits
+
+
+def row_dtype() -> type:
+    return np.uint32 if _row_bits == 32 else np.uint64
+
+
+def new_bitmap(rows=()):
+    """Empty bitmap, or one holding ``rows``, of the current row width."""
+    return (BitMap if _row_bits == 32 else BitMap64)(rows)
+
+
+def row_array(rows: np.ndarray) -> array.array:
+    """Copy ``rows`` into an ``array('I')`` (``'Q'`` for 64-bit rows),
+    which bitmaps ingest through the buffer protocol instead of iterating
+    Python ints."""
+    out = array.array("I" if _row_bits == 32 else "Q")
+    out.frombytes(np.ascontiguousarray(rows, dtype=row_dtype()).tobytes())
+    return out
+
+
+def index_column(arr, offset: int = 0, idx: Optional[Dict] = None) -> Dict:
+    """Add one BitMap per distinct value of the Arrow column ``arr`` to
+    ``idx`` (a new dict by default), numbering rows from ``offset``.
+
+    The column is dictionary-encoded once; a stable argsort of the codes
+    groups the row ids by value and the code counts give each group's
+    slice, so each group goes into its bitmap in one call. Keys are the
+    dictionary's Python values; nulls are not indexed.
+    """
+    idx = {} if idx is None else idx
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    enc   = pc.dictionary_encode(arr)
+    codes = enc.indices
+    rows  = np.arange(offset, offset + len(arr), dtype=np.int64)
+    if codes.null_count:
+        valid = codes.is_valid().to_numpy(zero_copy_only=False)
+        rows, codes = rows[valid], codes.filter(valid)
+    codes = codes.to_numpy(zero_copy_only=False)
+
+    order  = np.argsort(codes, kind="stable")
+    rows   = rows[order]
+    counts = np.bincount(codes, minlength=len(enc.dictionary))
+    ends   = np.cumsum(counts).tolist()
+    # Building the array costs more than iterating a handful of ints, so
+    # the groups of near-unique columns (keys) go in as Python ints. Only
+    # the rows of those groups are converted, in one pass; ``pos`` walks
+    # through them as the small groups come up.
+    is_small = counts < SMALL_GROUP
+    small    = rows[np.repeat(is_small, counts)].tolist()
+
+    start, pos = 0, 0
+    for key, end, tiny in zip(enc.dictionary.to_pylist(), ends, is_small.tolist()):
+        bm = idx.get(key)
+        if bm is None:
+            idx[key] = bm = new_bitmap()
+        if not tiny:
+            bm.update(row_array(rows[start:end]))
+        elif end - start == 1:
+            bm.add(small[pos])
+            pos += 1
+        else:
+            bm.update(small[pos:pos + end - start])
+            pos += end - start
+        start = end
+    return idx
+
+
+def _index_row_group(path: str, group: int, offset: int, columns,
+                     row_bits: int) -> Dict:
+    global _row_bits
+    _row_bits = row_bits
+    table = pq.ParquetFile(path).read_row_group(group, columns=list(columns))
+    return {col: index_column(table.column(col), offset) for col in columns}
+
+
+def index_columns_parallel(path: str, columns, workers: Optional[int] = None
+                           ) -> Dict[str, Dict]:
+    """index_column over every column in ``columns`` of the Parquet file
+    ``path``, one row group per task in a pool of ``workers`` processes
+    (all cores by default; 1 builds in-process).
+
+    Row ids are global: each task starts at its row group's offset from
+    the footer. The parent merges the partial bitmaps of a key with one
+    multi-way union; row groups cover disjoint row ranges, so the merge
+    only appends containers.
+    """
+    meta    = pq.ParquetFile(path).metadata
+    groups  = range(meta.num_row_groups)
+    offsets = np.cumsum([0] + [meta.row_group(g).num_rows for g in groups])
+    args    = (repeat(path), groups, offsets[:-1].tolist(), repeat(tuple(columns)),
+               repeat(_row_bits))
+
+    if workers == 1:
+        parts = list(map(_index_row_group, *args))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(_index_row_group, *args))
+
+    out = {}
+    for col in columns:
+        pieces: Dict[object, List[BitMap]] = {}
+        for part in parts:
+            for key, bm in part[col].items():
+                pieces.setdefault(key, []).append(bm)
+        out[col] = {key: bms[0] if len(bms) == 1 else bms[0].union(*bms[1:])
+                    for key, bms in pieces.items()}
+    return out
+
+
+def column_codes(arr) -> np.ndarray:
+    """Dense 0-based ranks of the Arrow column ``arr`` (any orderable type)."""
+    ranks = pc.rank(arr, sort_keys="ascending", tiebreaker="dense")
+    return ranks.to_numpy(zero_copy_only=False).astype(np.int64) - 1
+
+
+def row_order(table: pa.Table, columns, order: str) -> np.ndarray:
+    """Permutation sorting ``table`` by ``columns`` (most significant
+    first): ``"lex"`` sorts lexicographically, ``"gray"`` in reflected
+    mixed-radix Gray-code order, where each column's direction flips every
+    time the prefix before it advances, so neighbouring groups share
+    values across the boundary and runs get longer. ``"none"`` keeps the
+    table order."""
+    if order not in ROW_ORDERS:
+        raise ValueError(f"unknown row order {order!r}")
+    n = table.num_rows
+    if order == "none" or not columns:
+        return np.arange(n)
+    digits, parity = [], np.zeros(n, dtype=np.int64)
+    for col in columns:
+        codes = column_codes(table.column(col))
+        if order == "gray":
+            radix = int(codes.max()) + 1 if n else 1
+            codes = np.where(parity == 1, radix - 1 - codes, codes)
+            # Parity of the prefix's rank in the Gray sequence, rank * radix + digit.
+            parity = (parity * radix + codes) % 2
+        digits.append(codes)
+    return np.lexsort(digits[::-1])
+
+
+def rewrite_reordered(src: str, dest: str, columns, order: str,
+                      row_group_rows: Optional[int] = None) -> int:
+    """Rewrite the Parquet file ``src`` to ``dest`` in ``row_order``;
+    returns the row count."""
+    table = pq.read_table(src)
+    table = table.take(pa.array(row_order(table, columns, order)))
+    pq.write_table(table, dest, row_group_size=row_group_rows)
+    return table.num_rows
+
+
+def _gather(offsets: np.ndarray, rows: np.ndarray,
+            first: np.ndarray, last: np.ndarray) -> BitMap:
+    """BitMap of ``rows[offsets[first[j]]:offsets[last[j]]]`` over all j."""
+    starts = offsets[first]
+    counts = offsets[last] - starts
+    total  = int(counts.sum())
+    if total == 0:
+        return new_bitmap()
+    # Position k of the gather reads rows[starts[j] + (k - begin_j)].
+    begins = np.cumsum(counts) - counts
+    pos    = np.repeat(starts - begins, counts) + np.arange(total)
+    return new_bitmap(row_array(np.sort(rows[pos])))
+
+
+def bitmap_rows(bm) -> np.ndarray:
+    """Row ids of ``bm`` as a uint32 (uint64 for BitMap64) NumPy array."""
+    rows = bm.to_array()
+    return np.frombuffer(rows, dtype=np.uint32 if rows.typecode == "I" else np.uint64)
+
+
+class PostingIndex:
+    """Row ids grouped by key in CSR form, for columns where one BitMap per
+    key would mean millions of tiny objects.
+
+    ``keys`` holds the sorted distinct values, ``rows[offsets[i]:
+    offsets[i+1]]`` the row ids carrying ``keys[i]``. Lookups gather the
+    matching slices with NumPy and return one combined BitMap.
+    """
+
+    def __init__(self, keys: np.ndarray, offsets: np.ndarray, rows: np.ndarray):
+        self.keys    = keys
+        self.offsets = offsets
+        self.rows    = rows
+
+    @classmethod
+    def build(cls, values: np.ndarray, offset: int = 0) -> "PostingIndex":
+        """Index ``values``, numbering rows from ``offset``."""
+        order        = np.argsort(values, kind="stable")
+        keys, starts = np.unique(values[order], return_index=True)
+        offsets      = np.append(starts, len(values)).astype(np.int64)
+        return cls(keys, offsets, (order + offset).astype(row_dtype()))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.offsets.nbytes + self.rows.nbytes
+
+    def _bitmap(self, first: np.ndarray, last: np.ndarray) -> BitMap:
+        """Union of the key slots ``first[j]:last[j]``."""
+        return _gather(self.offsets, self.rows, first, last)
+
+    def eq(self, key) -> BitMap:
+        return self.isin([key])
+
+    def isin(self, keys) -> BitMap:
+        want = np.unique(np.asarray(keys, dtype=self.keys.dtype))
+        slot = np.searchsorted(self.keys, want)
+        hit  = slot < len(self.keys)
+        hit[hit] = self.keys[slot[hit]] == want[hit]
+        slot = slot[hit]
+        return self._bitmap(slot, slot + 1)
+
+    def range(self, lo=None, hi=None,
+              lo_inclusive: bool = True, hi_inclusive: bool = True) -> BitMap:
+        """Rows whose key lies between ``lo`` and ``hi``; a missing bound is
+        open, so ``range()`` returns every indexed row."""
+        first = 0 if lo is None else np.searchsorted(
+            self.keys, lo, side="left" if lo_inclusive else "right")
+        last  = len(self.keys) if hi is None else np.searchsorted(
+            self.keys, hi, side="right" if hi_inclusive else "left")
+        if first >= last:
+            return new_bitmap()
+        return new_bitmap(row_array(np.sort(
+            self.rows[self.offsets[first]:self.offsets[last]])))
+
+
+class JoinIndex:
+    """Bitmap join index between a parent table and a child table whose
+    foreign key references the parent's key, in row-id space.
+
+    ``rows[offsets[p]:offsets[p+1]]`` are the child rows of parent row
+    ``p`` (CSR); ``parent_of[c]`` is the parent row of child row ``c``, or
+    -1 if its key has no parent. Both directions turn a filter bitmap on
+    one table into one on the other with a single NumPy gather.
+    """
+
+    def __init__(self, offsets: np.ndarray, rows: np.ndarray,
+                 parent_of: np.ndarray):
+        self.offsets   = offsets
+        self.rows      = rows
+        self.parent_of = parent_of
+
+    @classmethod
+    def build(cls, parent_keys: np.ndarray,
+              child_keys: np.ndarray) -> "JoinIndex":
+        """Join child rows to parent rows on equal keys; ``parent_keys``
+        must be unique."""
+        order = np.argsort(parent_keys, kind="stable")
+        keys  = parent_keys[order]
+        slot  = np.searchsorted(keys, child_keys)
+        hit   = slot < len(keys)
+        hit[hit] = keys[slot[hit]] == child_keys[hit]
+        parent_of = np.full(len(child_keys), -1, dtype=np.int64)
+        parent_of[hit] = order[slot[hit]]
+
+        children = np.flatnonzero(hit)
+        parents  = parent_of[children]
+        rows     = children[np.argsort(parents, kind="stable")].astype(row_dtype())
+        counts   = np.bincount(parents, minlength=len(parent_keys))
+        offsets  = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        return cls(offsets, rows, parent_of)
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.rows.nbytes + self.parent_of.nbytes
+
+    def children(self, parents) -> BitMap:
+        """Child rows of the parent rows in ``parents``."""
+        p = bitmap_rows(parents).astype(np.int64)
+        return _gather(self.offsets, self.rows, p, p + 1)
+
+    def parents(self, children) -> BitMap:
+        """Parent rows of the child rows in ``children``."""
+        p = self.parent_of[bitmap_rows(children)]
+        return new_bitmap(row_array(np.unique(p[p >= 0])))
+
+    def with_children(self) -> BitMap:
+        """Parent rows referenced by at least one child row."""
+        return new_bitmap(row_array(np.flatnonzero(np.diff(self.offsets))))
+
+
+class BitSlicedIndex:
+    """Bit-sliced index over an integer or scaled-decimal column.
+
+    Values are stored as ``round(value * scale) - base``; slice ``j`` holds
+    the rows whose stored value has bit ``j`` set. Every comparison walks
+    the slices once from the top bit, so it costs O(bit-width) BitMap
+    operations whatever the number of distinct values.
+    """
+
+    def __init__(self, slices, exists: BitMap, base: int, scale: int):
+        self.slices = slices
+        self.exists = exists
+        self.base   = base
+        self.scale  = scale
+
+    @classmethod
+    def build(cls, values: np.ndarray, scale: int = 1,
+              offset: int = 0) -> "BitSlicedIndex":
+        """Index ``values`` (ints, or decimals/floats with ``scale`` set to
+        their power of ten), numbering rows from ``offset``."""
+        ints   = np.rint(np.asarray(values, dtype=np.float64) * scale)
+        ints   = ints.astype(np.int64)
+        base   = int(ints.min()) if len(ints) else 0
+        stored = (ints - base).astype(np.uint64)
+        width  = max(int(stored.max()).bit_length() if len(stored) else 0, 1)
+        slices = []
+        for j in range(width):
+            bit = (stored >> np.uint64(j)) & np.uint64(1)
+            slices.append(new_bitmap(row_array(np.flatnonzero(bit) + offset)))
+        exists = new_bitmap(range(offset, offset + len(ints)))
+        return cls(slices, exists, base, scale)
+
+    @property
+    def nbytes(self) -> int:
+        return container_bytes(self.slices + [self.exists])
+
+    def _scaled(self, x) -> decimal.Decimal:
+        # Decimal(str(x)) keeps 0.05 * 100 at exactly 5.
+        return decimal.Decimal(str(x)) * self.scale - self.base
+
+    def _lt_eq(self, c: int):
+        """Rows whose stored value is < ``c`` and == ``c``."""
+        if c < 0:
+            return new_bitmap(), new_bitmap()
+        if c >> len(self.slices):
+            return new_bitmap(self.exists), new_bitmap()
+        lt, eq = new_bitmap(), new_bitmap(self.exists)
+        for j in range(len(self.slices) - 1, -1, -1):
+            if (c >> j) & 1:
+                lt |= eq - self.slices[j]
+                eq &= self.slices[j]
+            else:
+                eq -= self.slices[j]
+        return lt, eq
+
+    def _le(self, c: int) -> BitMap:
+        lt, eq = self._lt_eq(c)
+        return lt | eq
+
+    def eq(self, x) -> BitMap:
+        c = self._scaled(x)
+        if c != c.to_integral_value():
+            return new_bitmap()
+        return self._lt_eq(int(c))[1]
+
+    def le(self, x) -> BitMap:
+        return self._le(math.floor(self._scaled(x)))
+
+    def lt(self, x) -> BitMap:
+        return self._le(math.ceil(self._scaled(x)) - 1)
+
+    def gt(self, x) -> BitMap:
+        return self.exists - self.le(x)
+
+    def ge(self, x) -> BitMap:
+        return self.exists - self.lt(x)
+
+    def between(self, lo, hi) -> BitMap:
+        """Inclusive on both ends, like SQL BETWEEN."""
+        return self.le(hi) - self.lt(lo)
+
+
+def epoch_day(value) -> int:
+    """Days since 1970-01-01 of a date, Timestamp or ISO string."""
+    return int(np.datetime64(value, "D").astype(np.int64))
+
+
+def _month_of(day: int) -> int:
+    return int(np.datetime64(day, "D").astype("datetime64[M]").astype(np.int64))
+
+
+def _month_start(month: int) -> int:
+    return int(np.datetime64(month, "M").astype("datetime64[D]").astype(np.int64))
+
+
+class DateBinIndex:
+    """Per-day bitmaps of a date column, rolled up into per-month bins.
+
+    ``range(lo, hi)`` ORs the months lying wholly inside ``[lo, hi)`` and
+    refines both ends with the day bins of the partial months, so any date
+    window costs at most two months' worth of day bitmaps plus one bitmap
+    per full month.
+    """
+
+    def __init__(self):
+        self.days:   Dict[int, BitMap] = {}
+        self.months: Dict[int, BitMap] = {}
+
+    def add(self, arr, offset: int = 0) -> "DateBinIndex":
+        """Index the Arrow date column ``arr``, numbering rows from
+        ``offset``; call once per batch."""
+        dates  = pc.cast(arr, pa.date32())
+        # Months count from 1970-01, like numpy's datetime64[M].
+        months = pc.subtract(pc.add(pc.multiply(pc.year(dates), 12), pc.month(dates)),
+                             1970 * 12 + 1)
+        index_column(pc.cast(dates, pa.int32()), offset, self.days)
+        index_column(months, offset, self.months)
+        return self
+
+    @property
+    def nbytes(self) -> int:
+        return container_bytes(list(self.days.values()) +
+                               list(self.months.values()))
+
+    def _days(self, lo: int, hi: int):
+        return [self.days[d] for d in range(lo, hi) if d in self.days]
+
+    def range(self, lo=None, hi=None) -> BitMap:
+        """Rows dated in ``[lo, hi)``; a missing bound is open."""
+        if not self.days:
+            return new_bitmap()
+        lo = min(self.days) if lo is None else epoch_day(lo)
+        hi = max(self.days) + 1 if hi is None else epoch_day(hi)
+        if lo >= hi:
+            return new_bitmap()
+
+        first = _month_of(lo)
+        if _month_start(first) < lo:
+            first += 1
+        end = _month_of(hi)
+        if first >= end:
+            return new_bitmap().union(*self._days(lo, hi))
+
+        parts  = [self.months[m] for m in range(first, end) if m in self.months]
+        parts += self._days(lo, _month_start(first))
+        parts += self._days(_month_start(end), hi)
+        return new_bitmap().union(*parts)
+
+
+def index_memory_size(*indexes) -> float:
+    """Size in MB of index objects exposing ``nbytes``."""
+    return sum(ix.nbytes for ix in indexes) / (1024 * 1024)
+
+
+def container_stats(bitmaps) -> Dict[str, int]:
+    """Container counts and payload bytes per container type, summed over
+    ``bitmaps`` from get_statistics(), which reads the container headers
+    instead of serialising the bitmap."""
+    out = {"bitmaps": 0, "containers": 0}
+    for kind in CONTAINER_TYPES:
+        out[f"{kind}_containers"] = out[f"{kind}_bytes"] = 0
+    for bm in bitmaps:
+        st = bm.get_statistics()
+        out["bitmaps"]    += 1
+        out["containers"] += st["n_containers"]
+        for kind in CONTAINER_TYPES:
+            out[f"{kind}_containers"] += st[f"n_{kind}_containers"]
+            out[f"{kind}_bytes"]      += st[f"n_bytes_{kind}_containers"]
+    return out
+
+
+def container_bytes(bitmaps) -> int:
+    st = container_stats(bitmaps)
+    return sum(st[f"{kind}_bytes"] for kind in CONTAINER_TYPES)
+
+
+def index_bitmaps(index) -> List:
+    """The bitmaps making up ``index``; CSR indexes have none."""
+    if isinstance(index, dict):
+        return list(index.values())
+    if isinstance(index, DateBinIndex):
+        return list(index.days.values()) + list(index.months.values())
+    if isinstance(index, BitSlicedIndex):
+        return index.slices + [index.exists]
+    if isinstance(index, (PostingIndex, JoinIndex)):
+        return []
+    return [index]
+
+
+def _memory_row(query_number: int, name: str, stage: str, index) -> Dict:
+    st     = container_stats(index_bitmaps(index))
+    arrays = index.nbytes if isinstance(index, (PostingIndex, JoinIndex)) else 0
+    mb     = 1024 * 1024
+    row = {
+        "Query":             query_number,
+        "Index":             name,
+        "Stage":             stage,
+        "Bitmaps":           st["bitmaps"],
+        "Containers":        st["containers"],
+        "Array Containers":  st["array_containers"],
+        "Bitset Containers": st["bitset_containers"],
+        "Run Containers":    st["run_containers"],
+        "Array (MB)":        st["array_bytes"] / mb,
+        "Bitset (MB)":       st["bitset_bytes"] / mb,
+        "Run (MB)":          st["run_bytes"] / mb,
+        "Arrays (MB)":       arrays / mb,
+    }
+    row["Size (MB)"] = (row["Array (MB)"] + row["Bitset (MB)"] +
+                        row["Run (MB)"] + row["Arrays (MB)"])
+    return row
+
+
+def report_index_memory(query_number: int, indexes: Dict[str, object],
+                        optimize: bool = RUN_OPTIMIZE,
+                        csv_path: str = MEMORY_CSV):
+    """Append the container breakdown of each named index to ``csv_path``.
+
+    With ``optimize`` set, every mutable bitmap is then run_optimize()d
+    (and shrunk) in place and a second "run_optimize" row per index
+    records the result. Indexes loaded from the IndexStore were
+    optimized before they were stored, so they only get the
+    "run_optimize" row, the same one a cold run writes.
+    """
+    stored = {name for name, ix in indexes.items()
+              if index_bitmaps(ix) and all(
+                  isinstance(bm, (FrozenBitMap, FrozenBitMap64))
+                  for bm in index_bitmaps(ix))}
+    rows = [_memory_row(query_number, name, "built", ix)
+            for name, ix in indexes.items()
+            if not (optimize and name in stored)]
+    if optimize:
+        for name, ix in indexes.items():
+            if name not in stored:
+                for bm in index_bitmaps(ix):
+                    bm.run_optimize()
+                    bm.shrink_to_fit()
+            rows.append(_memory_row(query_number, name, "run_optimize", ix))
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    write_csv_results(csv_path, MEMORY_FIELDNAMES, rows)
+
+
+class IndexStore:
+    """On-disk cache of built indexes, one file per Parquet file and name.
+
+    Files are keyed by a fingerprint of the Parquet footer, so regenerating
+    the data invalidates them. Bitmaps are stored run-optimized (with
+    RUN_OPTIMIZE) in the portable Roaring format and come back as
+    FrozenBitMaps deserialised straight from the mapped file;
+    PostingIndex arrays are NumPy views over the mapping.
+    Loaded indexes are read-only.
+
+    ``load(paths, name, build)`` returns what ``build()`` returned, an
+    ``(index, stats)`` pair with ``stats`` a small dict of numbers, from
+    disk when it can and building and storing it otherwise.
+    """
+
+    MAGIC = b"RIDX2"
+
+    def __init__(self, root: str = INDEX_STORE):
+        self.root = root
+
+    @staticmethod
+    def fingerprint(path: str) -> str:
+        """Hash of the file size and its Parquet footer."""
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            f.seek(size - 8)
+            footer_len = struct.unpack("<I", f.read(4))[0]
+            f.seek(size - 8 - footer_len)
+            footer = f.read(footer_len)
+        return hashlib.sha1(str(size).encode() + footer).hexdigest()[:16]
+
+    def entry_path(self, paths, name: str) -> str:
+        """Entry of ``name`` over one Parquet path or a list of them (for
+        indexes, like joins, that depend on several files)."""
+        paths = [paths] if isinstance(paths, str) else list(paths)
+        stem  = "-".join(os.path.splitext(os.path.basename(p))[0] for p in paths)
+        fp    = "".join(self.fingerprint(p) for p in paths)
+        if len(paths) > 1:
+            fp = hashlib.sha1(fp.encode()).hexdigest()[:16]
+        # Entries are per row width: 32- and 64-bit bitmaps do not mix.
+        return os.path.join(self.root, f"{stem}-{fp}-{name}-{_row_bits}.ridx")
+
+    def load(self, paths, name: str, build):
+        dest = self.entry_path(paths, name)
+        if os.path.exists(dest):
+            loaded = self._read(dest)
+            if loaded is not None:
+                return loaded
+        index, stats = build()
+        os.makedirs(self.root, exist_ok=True)
+        self._write(dest, index, stats)
+        return index, stats
+
+    @staticmethod
+    def _serialize(bm) -> bytes:
+        # Optimize a copy: the caller's bitmaps stay as built until
+        # report_index_memory has recorded them.
+        if RUN_OPTIMIZE and not isinstance(bm, (FrozenBitMap, FrozenBitMap64)):
+            bm = bm.copy()
+            bm.run_optimize()
+        return bm.serialize()
+
+    @classmethod
+    def _encode(cls, index):
+        if isinstance(index, (PostingIndex, JoinIndex)):
+            if isinstance(index, PostingIndex):
+                kind, arrays = "postings", (index.keys, index.offsets, index.rows)
+            else:
+                kind, arrays = "join", (index.offsets, index.rows, index.parent_of)
+            return ({"type": kind, "dtypes": [a.dtype.str for a in arrays]},
+                    [np.ascontiguousarray(a).tobytes() for a in arrays])
+        if isinstance(index, DateBinIndex):
+            return ({"type": "dates", "days": list(index.days),
+                     "months": list(index.months)},
+                    [cls._serialize(bm) for bins in (index.days, index.months)
+                     for bm in bins.values()])
+        if isinstance(index, dict):
+            return ({"type": "dict", "keys": list(index)},
+                    [cls._serialize(bm) for bm in index.values()])
+        return {"type": "bitmap"}, [cls._serialize(index)]
+
+    @staticmethod
+    def _decode(meta, blobs):
+        kind = meta["type"]
+        if kind in ("postings", "join"):
+            cls = PostingIndex if kind == "postings" else JoinIndex
+            return cls(*(np.frombuffer(b, dtype=d)
+                         for b, d in zip(blobs, meta["dtypes"])))
+        frozen  = FrozenBitMap if _row_bits == 32 else FrozenBitMap64
+        bitmaps = [frozen.deserialize(b) for b in blobs]
+        if kind == "dates":
+            index = DateBinIndex()
+            split = len(meta["days"])
+            index.days   = dict(zip(meta["days"],   bitmaps[:split]))
+            index.months = dict(zip(meta["months"], bitmaps[split:]))
+            return index
+        if kind == "dict":
+            return dict(zip(meta["keys"], bitmaps))
+        return bitmaps[0]
+
+    def _write(self, dest: str, index, stats: Dict):
+        meta, blobs = self._encode(index)
+        meta["stats"] = stats
+        meta["sizes"] = [len(b) for b in blobs]
+        header = pickle.dumps(meta)
+        tmp = dest + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.MAGIC + struct.pack("<Q", len(header)) + header)
+            for blob in blobs:
+                # 8-byte alignment keeps the NumPy views aligned.
+                f.write(b"\0" * (-f.tell() % 8))
+                f.write(blob)
+        os.replace(tmp, dest)
+
+    def _read(self, src: str):
+        with open(src, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        if view[:len(self.MAGIC)] != self.MAGIC:
+            # Written by an older format version; the caller rebuilds it.
+            return None
+        pos = len(self.MAGIC) + 8
+        (header_len,) = struct.unpack_from("<Q", view, len(self.MAGIC))
+        meta = pickle.loads(view[pos:pos + header_len])
+        pos += header_len
+        blobs = []
+        for size in meta["sizes"]:
+            pos += -pos % 8
+            blobs.append(view[pos:pos + size])
+            pos += size
+        return self._decode(meta, blobs), meta["stats"]
+
+
+def join_index(parent_path: str, parent_key: str,
+               child_path: str, child_key: str):
+    """JoinIndex from ``parent_path.parent_key`` to the child rows of
+    ``child_path`` whose ``child_key`` references it, through the
+    IndexStore. Returns ``(index, stats)``; stats holds each side's row
+    count and key-column size in bytes."""
+    def build():
+        parent = pq.read_table(parent_path, columns=[parent_key]).column(0)
+        child  = pq.read_table(child_path,  columns=[child_key]).column(0)
+        stats  = {
+            "parent_rows":  len(parent),
+            "child_rows":   len(child),
+            "parent_bytes": int(parent.to_pandas().memory_usage(deep=True)),
+            "child_bytes":  int(child.to_pandas().memory_usage(deep=True)),
+        }
+        return JoinIndex.build(parent.to_numpy(), child.to_numpy()), stats
+
+    return IndexStore().load([parent_path, child_path],
+                             f"{parent_key}-{child_key}-join", build)
+
+
+# Quoted literals and identifiers, numbers (exponent included), multi-
+# character operators, words, then any other single character.
+_SQL_TOKEN = re.compile(r"""
+    '(?:[^']|'')*' | "(?:[^"]|"")*"
+  | (?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?
+  | <>|!=|<=|>=|::|\|\| | \w+ | \S
+""", re.VERBOSE)
+
+
+def normalize_predicate(predicate: str) -> str:
+    """Cache key of a SQL predicate: its tokens, lower-cased outside quotes
+    and joined by single spaces. Only the whitespace between tokens
+    changes, so literals like ``1e-5`` or ``'A-B'`` stay intact and
+    spellings of the same predicate share one cache entry."""
+    return " ".join(t if t[0] in "'\"" else t.lower()
+                    for t in _SQL_TOKEN.findall(predicate))
+
+
+def predicate_bitmap(path: str, predicate: str):
+    """Bitmap of the rows of ``path`` matching the SQL ``predicate``.
+
+    DuckDB evaluates the predicate as written over the Parquet file, and
+    the bitmap goes through the IndexStore under a hash of its normalized
+    text, so any script asking for the same predicate on the same file
+    reuses it until the file changes. Returns ``(bitmap, stats)``; stats
+    holds the number of matching rows.
+    """
+    def build():
+        con  = duckdb.connect(":memory:")
+        rows = con.execute(
+            f"SELECT file_row_number FROM read_parquet('{path}', file_row_number = true) "
+            f"WHERE {predicate}"
+        ).fetchnumpy()["file_row_number"]
+        con.close()
+        return new_bitmap(row_array(rows)), {"matches": len(rows)}
+
+    key  = normalize_predicate(predicate)
+    name = "pred-" + hashlib.sha1(key.encode()).hexdigest()[:16]
+    return IndexStore().load(path, name, build)
+
+
+class Expr:
+    """Node of a bitmap expression; ``&``, ``|``, ``-`` and ``~`` build
+    And, Or, AndNot and Not nodes."""
+
+    def __and__(self, other: "Expr") -> "Expr":
+        return And(self, other)
+
+    def __or__(self, other: "Expr") -> "Expr":
+        return Or(self, other)
+
+    def __sub__(self, other: "Expr") -> "Expr":
+        return AndNot(self, other)
+
+    def __invert__(self) -> "Expr":
+        return Not(self)
+
+
+class Ref(Expr):
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+class And(Expr):
+    def __init__(self, *children: Expr):
+        self.children = children
+
+    def __repr__(self) -> str:
+        return "(" + " & ".join(map(repr, self.children)) + ")"
+
+
+class Or(Expr):
+    def __init__(self, *children: Expr):
+        self.children = children
+
+    def __repr__(self) -> str:
+        return "(" + " | ".join(map(repr, self.children)) + ")"
+
+
+class Not(Expr):
+    def __init__(self, child: Expr):
+        self.child = child
+
+    def __repr__(self) -> str:
+        return f"~{self.child!r}"
+
+
+class AndNot(Expr):
+    def __init__(self, left: Expr, right: Expr):
+        self.left  = left
+        self.right = right
+
+    def __repr__(self) -> str:
+        return f"({self.left!r} - {self.right!r})"
+
+
+class BitmapPlanner:
+    """Evaluates Expr trees over named bitmaps.
+
+    ``bitmaps`` maps names to BitMaps, or to zero-argument callables that
+    are only run (once) if the plan reaches them. ``universe`` is a row
+    count or a BitMap; Not complements against it without materialising
+    ``range(rows)``. And intersects the leaves smallest first, folds its
+    Not children in as differences and stops at the first empty result;
+    Or is one multi-way union. Each evaluate() leaves one row per
+    evaluated node in ``timings``, children before parents.
+    """
+
+    def __init__(self, bitmaps: Dict[str, object], universe=None):
+        self.bitmaps  = dict(bitmaps)
+        self.universe = universe
+        self.timings: List[Dict[str, object]] = []
+
+    def evaluate(self, expr: Expr) -> BitMap:
+        self.timings = []
+        out = self._eval(expr, 0)
+        if any(out is bm for bm in self.bitmaps.values()):
+            out = new_bitmap(out)
+        return out
+
+    def _leaf(self, name: str) -> BitMap:
+        bm = self.bitmaps[name]
+        if callable(bm):
+            bm = self.bitmaps[name] = bm()
+        return bm
+
+    def _complement(self, bm: BitMap) -> BitMap:
+        if self.universe is None:
+            raise ValueError("Not needs a universe")
+        if isinstance(self.universe, (int, np.integer)):
+            return bm.flip(0, int(self.universe))
+        return self.universe - bm
+
+    def _eval(self, expr: Expr, depth: int) -> BitMap:
+        t0 = time.perf_counter()
+        if isinstance(expr, Ref):
+            out = self._leaf(expr.name)
+        elif isinstance(expr, Or):
+            out = new_bitmap().union(*(self._eval(c, depth + 1)
+                                       for c in expr.children))
+        elif isinstance(expr, And):
+            out = self._and(expr, depth)
+        elif isinstance(expr, AndNot):
+            out = self._eval(expr.left, depth + 1)
+            if out:
+                out = out - self._eval(expr.right, depth + 1)
+        elif isinstance(expr, Not):
+            out = self._complement(self._eval(expr.child, depth + 1))
+        else:
+            raise TypeError(f"not a bitmap expression: {expr!r}")
+        self.timings.append({
+            "Node":        repr(expr),
+            "Depth":       depth,
+            "Latency (s)": time.perf_counter() - t0,
+            "Cardinality": len(out),
+        })
+        return out
+
+    def _and(self, expr: And, depth: int) -> BitMap:
+        pos = [c for c in expr.children if not isinstance(c, Not)]
+        neg = [c.child for c in expr.children if isinstance(c, Not)]
+
+        # Materialised leaves go first, smallest first; lazy leaves and
+        # subexpressions only run if the running result is still non-empty.
+        ready = [c for c in pos if isinstance(c, Ref)
+                 and not callable(self.bitmaps[c.name])]
+        ready.sort(key=lambda c: len(self.bitmaps[c.name]))
+        order = ready + [c for c in pos if not any(c is r for r in ready)]
+
+        out = None
+        for child in order:
+            bm  = self._eval(child, depth + 1)
+            out = bm if out is None else out & bm
+            if not out:
+                return new_bitmap()
+        if out is None:
+            out = self._complement(new_bitmap())
+        for child in neg:
+            out = out - self._eval(child, depth + 1)
+            if not out:
+                break
+        return out
+
+
+def write_plan_timings(query_number: int, planner: BitmapPlanner,
+                       csv_path: str = PLAN_CSV):
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    rows = [{"Query": query_number, **t} for t in planner.timings]
+    write_csv_results(csv_path, PLAN_FIELDNAMES, rows)
+
+
 def bitmap_memory_size(*bitmap_dicts):
-    total_bytes = 0
-    for bm_dict in bitmap_dicts:
-        for bitmap in bm_dict.values():
-            total_bytes += len(bitmap.serialize())
+    total_bytes = sum(container_bytes(bm_dict.values()) for bm_dict in bitmap_dicts)
     return total_bytes / (1024 * 1024)
 
 
@@ -8,6 +8,10 @@ from pyroaring import BitMap
 from datafusion import SessionContext
 
 from common_roaring import (
+    report_index_memory,
+    new_bitmap,
+    use_row_space,
+    index_columns_parallel,
     bitmap_memory_size,
     measure_query_duckdb,
     measure_query_datafusion,
@@ -22,36 +26,22 @@ os.makedirs("../results", exist_ok=True)
 
 FILE        = "../data/tpch/parquet/lineitem.parquet"
 BATCH       = 6000000
+WORKERS     = os.cpu_count()
 RET_FLAG    = "N"
 LINE_STAT   = "O"
 QUERY_PATH  = "../data/tpch/queries/1.sql"
 
 
-def build_bitmap_indexes(file_path: str, batch_size: int):
-    returnflag_idx, linestatus_idx = {}, {}
-    global_offset, orig_bytes      = 0, 0
-    t0 = time.perf_counter()
-
-    for batch in pq.ParquetFile(file_path).iter_batches(batch_size=batch_size):
-        df      = batch.to_pandas()
-        n_rows  = len(df)
-
-        if "l_returnflag" in df.columns:
-            orig_bytes += df["l_returnflag"].memory_usage(deep=True)
-        if "l_linestatus" in df.columns:
-            orig_bytes += df["l_linestatus"].memory_usage(deep=True)
-
-        for col, idx in (("l_returnflag", returnflag_idx),
-                         ("l_linestatus", linestatus_idx)):
-            for v in df[col].unique():
-                local = df.index[df[col] == v].tolist()
-                idx.setdefault(v, BitMap()).update(i + global_offset for i in local)
-
-        global_offset += n_rows
-        del df
+def build_bitmap_indexes(file_path: str, workers: int):
+    cols       = ["l_returnflag", "l_linestatus"]
+    table      = pq.read_table(file_path, columns=cols)
+    orig_bytes = sum(table.column(c).to_pandas().memory_usage(deep=True)
+                     for c in cols)
 
+    t0  = time.perf_counter()
+    idx = index_columns_parallel(file_path, cols, workers)
     build_secs = time.perf_counter() - t0
-    return returnflag_idx, linestatus_idx, orig_bytes, build_secs
+    return idx["l_returnflag"], idx["l_linestatus"], orig_bytes, build_secs
 
 
 def materialise_filtered_df(file_path: str, bitmap: BitMap, batch_size: int) -> pd.DataFrame:
@@ -105,10 +95,12 @@ def prepare_datafusion(df: pd.DataFrame, query_file: str):
 
 
 if __name__ == "__main__":
-    ret_idx, line_idx, orig_bytes, build_secs = build_bitmap_indexes(FILE, BATCH)
+    use_row_space(FILE)
+    ret_idx, line_idx, orig_bytes, build_secs = build_bitmap_indexes(FILE, WORKERS)
+    report_index_memory(1, {"l_returnflag": ret_idx, "l_linestatus": line_idx})
 
     bitmap_metrics = measure_query_execution(
-        lambda: ret_idx.get(RET_FLAG, BitMap()) & line_idx.get(LINE_STAT, BitMap())
+        lambda: ret_idx.get(RET_FLAG, new_bitmap()) & line_idx.get(LINE_STAT, new_bitmap())
     )
     filtered_bitmap = bitmap_metrics["result"]
     filtered_df     = materialise_filtered_df(FILE, filtered_bitmap, BATCH)
@@ -1,11 +1,20 @@
 import os, sys, time
 import duckdb, pyarrow.parquet as pq, pandas as pd
-from pyroaring import BitMap
 from datafusion import SessionContext
-from functools import reduce
 
 from common_roaring import (
+    report_index_memory,
+    new_bitmap,
+    use_row_space,
+    index_column,
+    DateBinIndex,
+    IndexStore,
+    join_index,
+    BitmapPlanner,
+    Ref, And,
+    write_plan_timings,
     bitmap_memory_size,
+    index_memory_size,
     measure_query_duckdb,
     measure_query_datafusion,
     write_csv_results,
@@ -22,30 +31,26 @@ DATE_TO   = pd.to_datetime("1994-01-01")
 RET_FLAG  = "R"
 
 
-def combine(bitmaps):
-    return reduce(lambda a, b: a | b, bitmaps, BitMap())
-
-
 def idx_orders(path):
-    idx, rows, bytes_, t0 = {}, 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = b.to_pandas(), len(b)
-        df["o_orderdate"] = pd.to_datetime(df["o_orderdate"])
-        bytes_ += df["o_orderdate"].memory_usage(deep=True)
-        for d in df["o_orderdate"].unique():
-            idx.setdefault(d, BitMap()).update(i + rows for i in df.index[df["o_orderdate"] == d])
-        rows += n
-    return idx, rows, bytes_, time.perf_counter() - t0
+    def build():
+        idx, rows, bytes_ = DateBinIndex(), 0, 0
+        for b in pq.ParquetFile(path).iter_batches(BATCH, columns=["o_orderdate"]):
+            bytes_ += pd.to_datetime(b.column("o_orderdate").to_pandas()).memory_usage(deep=True)
+            idx.add(b.column("o_orderdate"), rows)
+            rows += len(b)
+        return idx, {"rows": rows, "bytes": int(bytes_)}
+
+    t0 = time.perf_counter()
+    idx, stats = IndexStore().load(path, "o_orderdate-dates", build)
+    return idx, stats["rows"], stats["bytes"], time.perf_counter() - t0
 
 
 def idx_line(path):
     idx, rows, bytes_, t0 = {}, 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = b.to_pandas(), len(b)
-        bytes_ += df["l_returnflag"].memory_usage(deep=True)
-        for v in df["l_returnflag"].unique():
-            idx.setdefault(v, BitMap()).update(i + rows for i in df.index[df["l_returnflag"] == v])
-        rows += n
+    for b in pq.ParquetFile(path).iter_batches(BATCH, columns=["l_returnflag"]):
+        bytes_ += b.column("l_returnflag").to_pandas().memory_usage(deep=True)
+        index_column(b.column("l_returnflag"), rows, idx)
+        rows += len(b)
     return idx, rows, bytes_, time.perf_counter() - t0
 
 
@@ -105,18 +110,31 @@ if __name__ == "__main__":
     PATH_O = "../data/tpch/parquet/orders.parquet"
     PATH_L = "../data/tpch/parquet/lineitem.parquet"
     PATH_N = "../data/tpch/parquet/nation.parquet"
+    use_row_space(PATH_C, PATH_O, PATH_L, PATH_N)
 
     o_idx, rows_o, bytes_o, sec_o = idx_orders(PATH_O)
     l_idx, rows_l, bytes_l, sec_l = idx_line(PATH_L)
 
-    bm_o = measure_query_execution(
-        lambda: BitMap(range(rows_o)) & combine(
-            bm for d, bm in o_idx.items() if DATE_FROM <= d < DATE_TO
-        )
-    )
-    bm_l = measure_query_execution(
-        lambda: BitMap(range(rows_l)) & l_idx.get(RET_FLAG, BitMap())
-    )
+    t0 = time.perf_counter()
+    join_ol, _ = join_index(PATH_O, "o_orderkey", PATH_L, "l_orderkey")
+    sec_j = time.perf_counter() - t0
+    report_index_memory(10, {"o_orderdate": o_idx, "l_returnflag": l_idx,
+                             "orders-lineitem": join_ol})
+
+    plan_o = BitmapPlanner({
+        "orderdate_range": lambda: o_idx.range(DATE_FROM, DATE_TO),
+    }, universe=rows_o)
+    bm_o = measure_query_execution(lambda: plan_o.evaluate(Ref("orderdate_range")))
+    write_plan_timings(10, plan_o)
+
+    plan_l = BitmapPlanner({
+        "order_lines": lambda: join_ol.children(bm_o["result"]),
+        "returnflag":  l_idx.get(RET_FLAG, new_bitmap()),
+    }, universe=rows_l)
+    bm_l = measure_query_execution(lambda: plan_l.evaluate(
+        And(Ref("order_lines"), Ref("returnflag"))
+    ))
+    write_plan_timings(10, plan_l)
 
     df_o = materialise(PATH_O, bm_o["result"],
                        ["o_orderkey", "o_custkey", "o_orderdate"])
@@ -125,9 +143,9 @@ if __name__ == "__main__":
     df_c = pd.read_parquet(PATH_C)
     df_n = pd.read_parquet(PATH_N)
 
-    bitmap_mb   = bitmap_memory_size(o_idx, l_idx)
+    bitmap_mb   = bitmap_memory_size(l_idx) + index_memory_size(o_idx, join_ol)
     original_mb = (bytes_o + bytes_l) / (1024 * 1024)
-    build_secs  = sec_o + sec_l
+    build_secs  = sec_o + sec_l + sec_j
 
     con, q_duck = prep_duck(df_c, df_o, df_l, df_n, "../data/tpch/queries/10.sql")
     eng_duck    = measure_query_duckdb(10, con, q_duck)
@@ -1,11 +1,19 @@
 import os, sys, time
 import duckdb, pyarrow.parquet as pq, pandas as pd
-from functools import reduce
-from pyroaring import BitMap
 from datafusion import SessionContext
 
 from common_roaring import (
+    report_index_memory,
+    use_row_space,
+    index_column,
+    join_index,
+    predicate_bitmap,
+    DateBinIndex,
+    BitmapPlanner,
+    Ref, And, Or,
+    write_plan_timings,
     bitmap_memory_size,
+    index_memory_size,
     measure_query_duckdb,
     measure_query_datafusion,
     write_csv_results,
@@ -21,55 +29,33 @@ SHIPMODES      = {"MAIL", "SHIP"}
 R_FROM, R_TO   = pd.to_datetime("1994-01-01"), pd.to_datetime("1995-01-01")
 
 
-def or_reduce(bitmaps):
-    return reduce(lambda a, b: a | b, bitmaps, BitMap())
-
-
-def index_orders(path):
-    idx, rows, bytes_, t0 = {}, 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = b.to_pandas(), len(b)
-        bytes_ += df["o_orderkey"].memory_usage(deep=True)
-        for key, loc in zip(df["o_orderkey"], df.index):
-            idx.setdefault(key, BitMap()).add(loc + rows)
-        rows += n
-    return idx, rows, bytes_, time.perf_counter() - t0
+def index_orders(path_o, path_l):
+    t0 = time.perf_counter()
+    idx_join, stats = join_index(path_o, "o_orderkey", path_l, "l_orderkey")
+    return (idx_join, stats["parent_rows"], stats["parent_bytes"],
+            time.perf_counter() - t0)
 
 
 def index_line(path):
-    idx_ship = {}
-    bm_commit_lt_receipt = BitMap()
-    bm_ship_lt_commit   = BitMap()
-    bm_receipt_range    = BitMap()
+    idx_ship    = {}
+    idx_receipt = DateBinIndex()
 
+    cols = ["l_shipmode", "l_commitdate", "l_receiptdate", "l_shipdate"]
     rows, bytes_, t0 = 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = b.to_pandas(), len(b)
-
+    for b in pq.ParquetFile(path).iter_batches(BATCH, columns=cols):
         for col in ("l_commitdate", "l_receiptdate", "l_shipdate"):
-            df[col] = pd.to_datetime(df[col])
-            bytes_ += df[col].memory_usage(deep=True)
-
-        bytes_ += df["l_shipmode"].memory_usage(deep=True)
+            bytes_ += pd.to_datetime(b.column(col).to_pandas()).memory_usage(deep=True)
+        bytes_ += b.column("l_shipmode").to_pandas().memory_usage(deep=True)
 
-        for v in df["l_shipmode"].unique():
-            idx_ship.setdefault(v, BitMap()).update(i + rows
-                                                    for i in df.index[df["l_shipmode"] == v])
+        index_column(b.column("l_shipmode"), rows, idx_ship)
+        idx_receipt.add(b.column("l_receiptdate"), rows)
 
-        bm_commit_lt_receipt.update(
-            (df.index[df["l_commitdate"] < df["l_receiptdate"]] + rows).tolist()
-        )
-        bm_ship_lt_commit.update(
-            (df.index[df["l_shipdate"]  < df["l_commitdate"]] + rows).tolist()
-        )
-        bm_receipt_range.update(
-            (df.index[(df["l_receiptdate"] >= R_FROM) & (df["l_receiptdate"] < R_TO)] + rows).tolist()
-        )
-
-        rows += n
+        rows += len(b)
 
+    bm_commit_lt_receipt, _ = predicate_bitmap(path, "l_commitdate < l_receiptdate")
+    bm_ship_lt_commit,    _ = predicate_bitmap(path, "l_shipdate < l_commitdate")
     return (idx_ship, bm_commit_lt_receipt, bm_ship_lt_commit,
-            bm_receipt_range, rows, bytes_, time.perf_counter() - t0)
+            idx_receipt, rows, bytes_, time.perf_counter() - t0)
 
 
 def materialise(path, bitmap, cols):
@@ -117,19 +103,31 @@ def prep_df(o_df, l_df, sql):
 if __name__ == "__main__":
     PATH_O = "../data/tpch/parquet/orders.parquet"
     PATH_L = "../data/tpch/parquet/lineitem.parquet"
+    use_row_space(PATH_O, PATH_L)
 
-    idx_okey, rows_o, bytes_o, sec_o = index_orders(PATH_O)
-    (idx_ship, bm_clt, bm_slt, bm_rng,
+    idx_join, rows_o, bytes_o, sec_o = index_orders(PATH_O, PATH_L)
+    (idx_ship, bm_clt, bm_slt, idx_receipt,
      rows_l, bytes_l, sec_l)         = index_line(PATH_L)
+    report_index_memory(12, {"orders-lineitem": idx_join, "l_shipmode": idx_ship,
+                             "commit_lt_receipt": bm_clt, "ship_lt_commit": bm_slt,
+                             "l_receiptdate": idx_receipt})
+
+    modes   = sorted(m for m in SHIPMODES if m in idx_ship)
+    planner = BitmapPlanner({
+        **{f"shipmode_{m}": idx_ship[m] for m in modes},
+        "commit_lt_receipt": bm_clt,
+        "ship_lt_commit":    bm_slt,
+        "receipt_range":     lambda: idx_receipt.range(R_FROM, R_TO),
+    })
+    plan = And(Or(*[Ref(f"shipmode_{m}") for m in modes]),
+               Ref("commit_lt_receipt"),
+               Ref("ship_lt_commit"),
+               Ref("receipt_range"))
 
-    shipmode_bm = or_reduce([idx_ship[m] for m in SHIPMODES if m in idx_ship])
-
-    bm_line   = measure_query_execution(
-        lambda: shipmode_bm & bm_clt & bm_slt & bm_rng
-    )
+    bm_line   = measure_query_execution(lambda: planner.evaluate(plan))
+    write_plan_timings(12, planner)
     bm_orders = measure_query_execution(
-        lambda: or_reduce([idx_okey[k] for k in idx_okey
-                           if (idx_okey[k] & bm_line["result"])])
+        lambda: idx_join.parents(bm_line["result"])
     )
 
     df_o = materialise(PATH_O, bm_orders["result"],
@@ -139,9 +137,9 @@ if __name__ == "__main__":
                         "l_commitdate", "l_receiptdate", "l_shipdate"])
 
     bitmap_mb   = bitmap_memory_size(
-        idx_okey, idx_ship,
-        {"cmp": bm_clt}, {"slt": bm_slt}, {"rng": bm_rng}
-    )
+        idx_ship,
+        {"cmp": bm_clt}, {"slt": bm_slt}
+    ) + index_memory_size(idx_join, idx_receipt)
     original_mb = (bytes_o + bytes_l) / (1024 * 1024)
     build_secs  = sec_o + sec_l
 
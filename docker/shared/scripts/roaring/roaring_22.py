@@ -1,11 +1,18 @@
 import os, sys, time
-import duckdb, pyarrow.parquet as pq, pandas as pd
-from functools import reduce
-from pyroaring import BitMap
+import duckdb, numpy as np, pyarrow.compute as pc, pyarrow.parquet as pq, pandas as pd
 from datafusion import SessionContext
 
 from common_roaring import (
+    report_index_memory,
+    use_row_space,
+    index_column,
+    PostingIndex,
+    join_index,
+    BitmapPlanner,
+    Ref, And, Or, Not,
+    write_plan_timings,
     bitmap_memory_size,
+    index_memory_size,
     measure_query_duckdb,
     measure_query_datafusion,
     write_csv_results,
@@ -21,12 +28,8 @@ NUM_RUNS_SQL   = 3
 PREFIXES       = {"13", "31", "23", "29", "30", "18", "17"}
 
 
-def or_reduce(bitmaps):
-    return reduce(lambda a, b: a | b, bitmaps, BitMap())
-
-
 def index_customer(path):
-    idx_pref, idx_cust, idx_bal = {}, {}, {}
+    idx_pref, custkeys, balances = {}, [], []
     rows, bytes_, pos_sum, pos_n = 0, 0, 0.0, 0
     t0 = time.perf_counter()
 
@@ -41,33 +44,27 @@ def index_customer(path):
 
         pref_series = df["c_phone"].str[:2]
 
-        for pref in pref_series.unique():
-            idx_pref.setdefault(pref, BitMap()).update(
-                loc + rows - n for loc in pref_series.index[pref_series == pref]
-            )
-
-        for key, bal, loc in zip(df["c_custkey"], df["c_acctbal"], df.index):
-            idx_cust.setdefault(key, BitMap()).add(loc + rows - n)
-            idx_bal.setdefault(bal, BitMap()).add(loc + rows - n)
+        index_column(pc.utf8_slice_codeunits(batch.column("c_phone"), 0, 2),
+                     rows - n, idx_pref)
+        custkeys.append(batch.column("c_custkey").to_numpy())
+        balances.append(df["c_acctbal"].to_numpy())
 
         good = (pref_series.isin(PREFIXES)) & (df["c_acctbal"] > 0.0)
         pos_sum += df.loc[good, "c_acctbal"].sum()
         pos_n   += int(good.sum())
 
+    idx_cust  = PostingIndex.build(np.concatenate(custkeys))
+    idx_bal   = PostingIndex.build(np.concatenate(balances))
     avg_bal   = pos_sum / pos_n if pos_n else 0.0
     build_sec = time.perf_counter() - t0
     return idx_pref, idx_cust, idx_bal, rows, bytes_, build_sec, avg_bal
 
 
-def index_orders(path):
-    idx_cust, rows, bytes_, t0 = {}, 0, 0, time.perf_counter()
-    for batch in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = batch.to_pandas(), len(batch)
-        rows  += n
-        bytes_ += df["o_custkey"].memory_usage(deep=True)
-        for key, loc in zip(df["o_custkey"], df.index):
-            idx_cust.setdefault(key, BitMap()).add(loc + rows - n)
-    return idx_cust, rows, bytes_, time.perf_counter() - t0
+def index_orders(path_c, path_o):
+    t0 = time.perf_counter()
+    idx_join, stats = join_index(path_c, "c_custkey", path_o, "o_custkey")
+    return (idx_join, stats["child_rows"], stats["child_bytes"],
+            time.perf_counter() - t0)
 
 
 def materialise(path, bitmap, cols):
@@ -98,12 +95,12 @@ def prep_duck(c_df, o_df, sql):
     c_df["c_acctbal"] = c_df["c_acctbal"].astype("float64")
     c_df["c_phone"]   = c_df["c_phone"].astype("string")
 
-    pc = save_parquet(c_df, "../data/tpch/parquet/filtered_customer.parquet")
-    po = save_parquet(o_df, "../data/tpch/parquet/filtered_orders.parquet")
+    p_c = save_parquet(c_df, "../data/tpch/parquet/filtered_customer.parquet")
+    p_o = save_parquet(o_df, "../data/tpch/parquet/filtered_orders.parquet")
 
     con = duckdb.connect(":memory:")
-    con.execute(f"CREATE TABLE customer AS SELECT * FROM read_parquet('{pc}')")
-    con.execute(f"CREATE TABLE orders   AS SELECT * FROM read_parquet('{po}')")
+    con.execute(f"CREATE TABLE customer AS SELECT * FROM read_parquet('{p_c}')")
+    con.execute(f"CREATE TABLE orders   AS SELECT * FROM read_parquet('{p_o}')")
     return con, open(sql).read()
 
 
@@ -111,56 +108,61 @@ def prep_df(c_df, o_df, sql):
     c_df["c_acctbal"] = c_df["c_acctbal"].astype("float64")
     c_df["c_phone"]   = c_df["c_phone"].astype("string")
 
-    pc = save_parquet(c_df, "../data/tpch/parquet/filtered_customer.parquet")
-    po = save_parquet(o_df, "../data/tpch/parquet/filtered_orders.parquet")
+    p_c = save_parquet(c_df, "../data/tpch/parquet/filtered_customer.parquet")
+    p_o = save_parquet(o_df, "../data/tpch/parquet/filtered_orders.parquet")
 
     ctx = SessionContext()
-    ctx.register_parquet("customer", pc)
-    ctx.register_parquet("orders",   po)
+    ctx.register_parquet("customer", p_c)
+    ctx.register_parquet("orders",   p_o)
     return ctx, open(sql).read()
 
 
 if __name__ == "__main__":
     PATH_C = "../data/tpch/parquet/customer.parquet"
     PATH_O = "../data/tpch/parquet/orders.parquet"
+    use_row_space(PATH_C, PATH_O)
 
     (idx_pref, idx_cust, idx_bal,
      rows_c, bytes_c, sec_c, AVG_BAL) = index_customer(PATH_C)
-    idx_ord, rows_o, bytes_o, sec_o   = index_orders(PATH_O)
-
-    bm_prefix   = measure_query_execution(
-        lambda: or_reduce([idx_pref[p] for p in PREFIXES if p in idx_pref])
-    )
-    bm_balance  = measure_query_execution(
-        lambda: or_reduce([bm for bal, bm in idx_bal.items() if bal > AVG_BAL])
-    )
-    has_orders_bm = or_reduce(idx_ord.values())
-    bm_no_orders = measure_query_execution(
-        lambda: BitMap(range(rows_c)) - has_orders_bm
-    )
-
-    final_cust_bm = (bm_prefix["result"] &
-                     bm_balance["result"] &
-                     bm_no_orders["result"])
+    idx_ord, rows_o, bytes_o, sec_o   = index_orders(PATH_C, PATH_O)
+    report_index_memory(22, {"c_phone_prefix": idx_pref, "c_custkey": idx_cust,
+                             "c_acctbal": idx_bal, "customer-orders": idx_ord})
+
+    # Customer rows referenced by some order; the join keeps this in the
+    # customer row space the rest of the plan works in.
+    has_orders_bm = idx_ord.with_children()
+    prefixes = sorted(p for p in PREFIXES if p in idx_pref)
+    planner  = BitmapPlanner({
+        **{f"prefix_{p}": idx_pref[p] for p in prefixes},
+        "balance":    lambda: idx_bal.range(lo=AVG_BAL, lo_inclusive=False),
+        "has_orders": has_orders_bm,
+    }, universe=rows_c)
+    plan = And(Or(*[Ref(f"prefix_{p}") for p in prefixes]),
+               Ref("balance"),
+               Not(Ref("has_orders")))
+
+    bm_cust = measure_query_execution(lambda: planner.evaluate(plan))
+    final_cust_bm = bm_cust["result"]
+    write_plan_timings(22, planner)
 
     df_customer = materialise(
         PATH_C, final_cust_bm,
         ["c_custkey", "c_acctbal", "c_phone"]
     )
     df_orders   = materialise(
-        PATH_O, has_orders_bm,
+        PATH_O, idx_ord.children(final_cust_bm),
         ["o_custkey"]
     )
 
-    bitmap_mb   = bitmap_memory_size(idx_pref, idx_cust, idx_bal, idx_ord)
+    bitmap_mb   = (bitmap_memory_size(idx_pref) +
+                   index_memory_size(idx_cust, idx_bal, idx_ord))
     original_mb = (bytes_c + bytes_o) / (1024 * 1024)
     build_secs  = sec_c + sec_o
 
     con, sql_duck  = prep_duck(df_customer, df_orders, "../data/tpch/queries/22.sql")
     eng_duck       = measure_query_duckdb(22, con, sql_duck, num_runs=NUM_RUNS_SQL)
 
-    res_duck = aggregate_metrics(bm_prefix, bm_balance,
-                                 bm_no_orders, eng_duck)     
+    res_duck = aggregate_metrics(bm_cust, eng_duck)     
     res_duck.update({
         "Query": 22,
         "Roaring Bitmap Size (MB)": bitmap_mb,
@@ -172,8 +174,7 @@ if __name__ == "__main__":
     ctx, sql_df   = prep_df(df_customer, df_orders, "../data/tpch/queries/22.sql")
     eng_df        = measure_query_datafusion(22, ctx, sql_df, num_runs=NUM_RUNS_SQL)
 
-    res_df = aggregate_metrics(bm_prefix, bm_balance,
-                               bm_no_orders, eng_df)          
+    res_df = aggregate_metrics(bm_cust, eng_df)          
     res_df.update({
         "Query": 22,
         "Roaring Bitmap Size (MB)": bitmap_mb,
@@ -1,10 +1,18 @@
 import os, sys, time
 import duckdb, pyarrow.parquet as pq, pandas as pd
-from pyroaring import BitMap
 from datafusion import SessionContext
-from functools import reduce
 
 from common_roaring import (
+    report_index_memory,
+    new_bitmap,
+    use_row_space,
+    index_column,
+    IndexStore,
+    join_index,
+    BitmapPlanner,
+    Ref, And,
+    write_plan_timings,
+    index_memory_size,
     bitmap_memory_size,
     measure_query_duckdb,
     measure_query_datafusion,
@@ -18,43 +26,39 @@ os.makedirs("../results", exist_ok=True)
 
 BATCH   = 6000000
 SEGMENT = "BUILDING"
-BEFORE  = pd.to_datetime("1995-03-15")
-AFTER   = pd.to_datetime("1995-03-15")
-
-
-def combine(bitmaps): return reduce(lambda a, b: a | b, bitmaps, BitMap())
+BEFORE  = pd.to_datetime("1995-03-15").date()
+AFTER   = pd.to_datetime("1995-03-15").date()
 
 
 def index_customer(path):
     idx, rows, bytes_, t0 = {}, 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = b.to_pandas(), len(b)
-        bytes_ += df["c_mktsegment"].memory_usage(deep=True)
-        for v in df["c_mktsegment"].unique():
-            idx.setdefault(v, BitMap()).update(i + rows for i in df.index[df["c_mktsegment"] == v])
-        rows += n
+    for b in pq.ParquetFile(path).iter_batches(BATCH, columns=["c_mktsegment"]):
+        bytes_ += b.column("c_mktsegment").to_pandas().memory_usage(deep=True)
+        index_column(b.column("c_mktsegment"), rows, idx)
+        rows += len(b)
     return idx, rows, bytes_, time.perf_counter() - t0
 
 
 def index_orders(path):
-    idx, rows, bytes_, t0 = {}, 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = b.to_pandas(), len(b); df["o_orderdate"] = pd.to_datetime(df["o_orderdate"])
-        bytes_ += df["o_orderdate"].memory_usage(deep=True)
-        for d in df["o_orderdate"].unique():
-            idx.setdefault(d, BitMap()).update(i + rows for i in df.index[df["o_orderdate"] == d])
-        rows += n
-    return idx, rows, bytes_, time.perf_counter() - t0
+    def build():
+        idx, rows, bytes_ = {}, 0, 0
+        for b in pq.ParquetFile(path).iter_batches(BATCH, columns=["o_orderdate"]):
+            bytes_ += pd.to_datetime(b.column("o_orderdate").to_pandas()).memory_usage(deep=True)
+            index_column(b.column("o_orderdate"), rows, idx)
+            rows += len(b)
+        return idx, {"rows": rows, "bytes": int(bytes_)}
+
+    t0 = time.perf_counter()
+    idx, stats = IndexStore().load(path, "o_orderdate-values", build)
+    return idx, stats["rows"], stats["bytes"], time.perf_counter() - t0
 
 
 def index_line(path):
     idx, rows, bytes_, t0 = {}, 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = b.to_pandas(), len(b); df["l_shipdate"] = pd.to_datetime(df["l_shipdate"])
-        bytes_ += df["l_shipdate"].memory_usage(deep=True)
-        for d in df["l_shipdate"].unique():
-            idx.setdefault(d, BitMap()).update(i + rows for i in df.index[df["l_shipdate"] == d])
-        rows += n
+    for b in pq.ParquetFile(path).iter_batches(BATCH, columns=["l_shipdate"]):
+        bytes_ += pd.to_datetime(b.column("l_shipdate").to_pandas()).memory_usage(deep=True)
+        index_column(b.column("l_shipdate"), rows, idx)
+        rows += len(b)
     return idx, rows, bytes_, time.perf_counter() - t0
 
 
@@ -107,20 +111,47 @@ if __name__ == "__main__":
     PATH_C = "../data/tpch/parquet/customer.parquet"
     PATH_O = "../data/tpch/parquet/orders.parquet"
     PATH_L = "../data/tpch/parquet/lineitem.parquet"
+    use_row_space(PATH_C, PATH_O, PATH_L)
 
     mkt_idx, rows_c, bytes_c, sec_c = index_customer(PATH_C)
     date_idx, rows_o, bytes_o, sec_o = index_orders(PATH_O)
     ship_idx, rows_l, bytes_l, sec_l = index_line(PATH_L)
 
-    bm_cust = measure_query_execution(lambda:
-        BitMap(range(rows_c)) & mkt_idx.get(SEGMENT, BitMap())
-    )
-    bm_orders = measure_query_execution(lambda:
-        BitMap(range(rows_o)) & combine([bm for d, bm in date_idx.items() if d < BEFORE])
-    )
-    bm_lines = measure_query_execution(lambda:
-        BitMap(range(rows_l)) & combine([bm for d, bm in ship_idx.items() if d > AFTER])
-    )
+    t0 = time.perf_counter()
+    join_co, _ = join_index(PATH_C, "c_custkey", PATH_O, "o_custkey")
+    join_ol, _ = join_index(PATH_O, "o_orderkey", PATH_L, "l_orderkey")
+    sec_j = time.perf_counter() - t0
+    report_index_memory(3, {"c_mktsegment": mkt_idx, "o_orderdate": date_idx,
+                            "l_shipdate": ship_idx, "customer-orders": join_co,
+                            "orders-lineitem": join_ol})
+
+    plan_c = BitmapPlanner({
+        "segment": mkt_idx.get(SEGMENT, new_bitmap()),
+    }, universe=rows_c)
+    bm_cust = measure_query_execution(lambda: plan_c.evaluate(Ref("segment")))
+    write_plan_timings(3, plan_c)
+
+    plan_o = BitmapPlanner({
+        "customer_orders": lambda: join_co.children(bm_cust["result"]),
+        "orderdate_before": lambda: new_bitmap().union(
+            *[bm for d, bm in date_idx.items() if d < BEFORE]
+        ),
+    }, universe=rows_o)
+    bm_orders = measure_query_execution(lambda: plan_o.evaluate(
+        And(Ref("customer_orders"), Ref("orderdate_before"))
+    ))
+    write_plan_timings(3, plan_o)
+
+    plan_l = BitmapPlanner({
+        "order_lines": lambda: join_ol.children(bm_orders["result"]),
+        "shipdate_after": lambda: new_bitmap().union(
+            *[bm for d, bm in ship_idx.items() if d > AFTER]
+        ),
+    }, universe=rows_l)
+    bm_lines = measure_query_execution(lambda: plan_l.evaluate(
+        And(Ref("order_lines"), Ref("shipdate_after"))
+    ))
+    write_plan_timings(3, plan_l)
 
     df_c = materialise(PATH_C, bm_cust["result"],
                        ["c_custkey", "c_mktsegment"])
@@ -129,9 +160,10 @@ if __name__ == "__main__":
     df_l = materialise(PATH_L, bm_lines["result"],
                        ["l_orderkey", "l_extendedprice", "l_discount", "l_shipdate"])
 
-    bitmap_mb   = bitmap_memory_size(mkt_idx, date_idx, ship_idx)
+    bitmap_mb   = (bitmap_memory_size(mkt_idx, date_idx, ship_idx) +
+                   index_memory_size(join_co, join_ol))
     original_mb = (bytes_c + bytes_o + bytes_l) / (1024 * 1024)
-    build_secs  = sec_c + sec_o + sec_l
+    build_secs  = sec_c + sec_o + sec_l + sec_j
 
     con, sql_duck      = prepare_duckdb(df_c, df_o, df_l, "../data/tpch/queries/3.sql")
     eng_duck           = measure_query_duckdb(3, con, sql_duck)
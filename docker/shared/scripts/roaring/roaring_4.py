@@ -1,10 +1,18 @@
 import os, sys, time
 import duckdb, pyarrow.parquet as pq, pandas as pd
-from pyroaring import BitMap
 from datafusion import SessionContext
 
 from common_roaring import (
+    report_index_memory,
+    use_row_space,
+    DateBinIndex,
+    IndexStore,
+    predicate_bitmap,
+    BitmapPlanner,
+    Ref,
+    write_plan_timings,
     bitmap_memory_size,
+    index_memory_size,
     measure_query_duckdb,
     measure_query_datafusion,
     write_csv_results,
@@ -21,31 +29,28 @@ DATE_TO   = pd.to_datetime("1993-10-01")
 
 
 def index_orders(path):
-    idx, rows, bytes_, t0 = {}, 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = b.to_pandas(), len(b)
-        df["o_orderdate"] = pd.to_datetime(df["o_orderdate"])
-        bytes_ += df["o_orderdate"].memory_usage(deep=True)
-        for d in df["o_orderdate"].unique():
-            idx.setdefault(d, BitMap()).update(i + rows for i in df.index[df["o_orderdate"] == d])
-        rows += n
-    return idx, rows, bytes_, time.perf_counter() - t0
+    def build():
+        idx, rows, bytes_ = DateBinIndex(), 0, 0
+        for b in pq.ParquetFile(path).iter_batches(BATCH, columns=["o_orderdate"]):
+            bytes_ += pd.to_datetime(b.column("o_orderdate").to_pandas()).memory_usage(deep=True)
+            idx.add(b.column("o_orderdate"), rows)
+            rows += len(b)
+        return idx, {"rows": rows, "bytes": int(bytes_)}
+
+    t0 = time.perf_counter()
+    idx, stats = IndexStore().load(path, "o_orderdate-dates", build)
+    return idx, stats["rows"], stats["bytes"], time.perf_counter() - t0
 
 
 def index_line(path):
-    bm_commit_lt_receipt = BitMap()
+    cols = ["l_commitdate", "l_receiptdate"]
     rows, bytes_, t0 = 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = b.to_pandas(), len(b)
-        df["l_commitdate"]  = pd.to_datetime(df["l_commitdate"])
-        df["l_receiptdate"] = pd.to_datetime(df["l_receiptdate"])
-        bytes_ += df["l_commitdate"].memory_usage(deep=True)
-        bytes_ += df["l_receiptdate"].memory_usage(deep=True)
+    for b in pq.ParquetFile(path).iter_batches(BATCH, columns=cols):
+        for col in cols:
+            bytes_ += pd.to_datetime(b.column(col).to_pandas()).memory_usage(deep=True)
+        rows += len(b)
 
-        loc = df.index[df["l_commitdate"] < df["l_receiptdate"]].tolist()
-        bm_commit_lt_receipt.update(i + rows for i in loc)
-
-        rows += n
+    bm_commit_lt_receipt, _ = predicate_bitmap(path, "l_commitdate < l_receiptdate")
     return bm_commit_lt_receipt, rows, bytes_, time.perf_counter() - t0
 
 
@@ -89,25 +94,32 @@ def prepare_datafusion(o_df, l_df, sql_file):
 if __name__ == "__main__":
     PATH_O = "../data/tpch/parquet/orders.parquet"
     PATH_L = "../data/tpch/parquet/lineitem.parquet"
+    use_row_space(PATH_O, PATH_L)
 
     date_idx, rows_o, bytes_o, sec_o = index_orders(PATH_O)
     commit_lt_bm, rows_l, bytes_l, sec_l = index_line(PATH_L)
+    report_index_memory(4, {"o_orderdate": date_idx,
+                            "commit_lt_receipt": commit_lt_bm})
+
+    plan_o = BitmapPlanner({
+        "orderdate_range": lambda: date_idx.range(DATE_FROM, DATE_TO),
+    }, universe=rows_o)
+    bm_orders = measure_query_execution(lambda: plan_o.evaluate(Ref("orderdate_range")))
+    write_plan_timings(4, plan_o)
 
-    bm_orders = measure_query_execution(lambda:
-        BitMap(range(rows_o)) & BitMap().union(
-            *[bm for d, bm in date_idx.items() if DATE_FROM <= d < DATE_TO]
-        )
-    )
-    bm_lines = measure_query_execution(lambda:
-        BitMap(range(rows_l)) & commit_lt_bm
-    )
+    plan_l = BitmapPlanner({
+        "commit_lt_receipt": commit_lt_bm,
+    }, universe=rows_l)
+    bm_lines = measure_query_execution(lambda: plan_l.evaluate(Ref("commit_lt_receipt")))
+    write_plan_timings(4, plan_l)
 
     df_o = materialise(PATH_O, bm_orders["result"],
                        ["o_orderkey", "o_orderpriority", "o_orderdate"])
     df_l = materialise(PATH_L, bm_lines["result"],
                        ["l_orderkey", "l_commitdate", "l_receiptdate"])
 
-    bitmap_mb   = bitmap_memory_size(date_idx, {"lt_commit": commit_lt_bm})
+    bitmap_mb   = (bitmap_memory_size({"lt_commit": commit_lt_bm}) +
+                   index_memory_size(date_idx))
     original_mb = (bytes_o + bytes_l) / (1024 * 1024)
     build_secs  = sec_o + sec_l
 
@@ -1,9 +1,15 @@
 import os, sys, time
 import duckdb, pyarrow.parquet as pq, pandas as pd
-from pyroaring import BitMap
 from datafusion import SessionContext
 
 from common_roaring import (
+    report_index_memory,
+    new_bitmap,
+    use_row_space,
+    index_column,
+    BitmapPlanner,
+    Ref,
+    write_plan_timings,
     bitmap_memory_size,
     measure_query_duckdb,
     measure_query_datafusion,
@@ -17,29 +23,25 @@ os.makedirs("../results", exist_ok=True)
 
 BATCH  = 6000000
 REGION = "ASIA"
-FROM   = pd.to_datetime("1994-01-01")
-TO     = pd.to_datetime("1995-01-01")
+FROM   = pd.to_datetime("1994-01-01").date()
+TO     = pd.to_datetime("1995-01-01").date()
 
 
 def index_region(path):
     idx, rows, bytes_, t0 = {}, 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = b.to_pandas(), len(b)
-        bytes_ += df["r_name"].memory_usage(deep=True)
-        for v in df["r_name"].unique():
-            idx.setdefault(v, BitMap()).update(i + rows for i in df.index[df["r_name"] == v])
-        rows += n
+    for b in pq.ParquetFile(path).iter_batches(BATCH, columns=["r_name"]):
+        bytes_ += b.column("r_name").to_pandas().memory_usage(deep=True)
+        index_column(b.column("r_name"), rows, idx)
+        rows += len(b)
     return idx, rows, bytes_, time.perf_counter() - t0
 
 
 def index_orders(path):
     idx, rows, bytes_, t0 = {}, 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = b.to_pandas(), len(b); df["o_orderdate"] = pd.to_datetime(df["o_orderdate"])
-        bytes_ += df["o_orderdate"].memory_usage(deep=True)
-        for d in df["o_orderdate"].unique():
-            idx.setdefault(d, BitMap()).update(i + rows for i in df.index[df["o_orderdate"] == d])
-        rows += n
+    for b in pq.ParquetFile(path).iter_batches(BATCH, columns=["o_orderdate"]):
+        bytes_ += pd.to_datetime(b.column("o_orderdate").to_pandas()).memory_usage(deep=True)
+        index_column(b.column("o_orderdate"), rows, idx)
+        rows += len(b)
     return idx, rows, bytes_, time.perf_counter() - t0
 
 
@@ -109,18 +111,25 @@ if __name__ == "__main__":
     PATH_O = "../data/tpch/parquet/orders.parquet"
     PATH_S = "../data/tpch/parquet/supplier.parquet"
     PATH_L = "../data/tpch/parquet/lineitem.parquet"
+    use_row_space(PATH_R, PATH_N, PATH_C, PATH_O, PATH_S, PATH_L)
 
     r_idx, rows_r, bytes_r, sec_r = index_region(PATH_R)
     o_idx, rows_o, bytes_o, sec_o = index_orders(PATH_O)
+    report_index_memory(5, {"r_name": r_idx, "o_orderdate": o_idx})
+
+    plan_r = BitmapPlanner({
+        "region": r_idx.get(REGION, new_bitmap()),
+    }, universe=rows_r)
+    bm_region = measure_query_execution(lambda: plan_r.evaluate(Ref("region")))
+    write_plan_timings(5, plan_r)
 
-    bm_region = measure_query_execution(
-        lambda: BitMap(range(rows_r)) & r_idx.get(REGION, BitMap())
-    )
-    bm_orders = measure_query_execution(
-        lambda: BitMap(range(rows_o)) & BitMap().union(
+    plan_o = BitmapPlanner({
+        "orderdate_range": lambda: new_bitmap().union(
             *[bm for d, bm in o_idx.items() if FROM <= d < TO]
-        )
-    )
+        ),
+    }, universe=rows_o)
+    bm_orders = measure_query_execution(lambda: plan_o.evaluate(Ref("orderdate_range")))
+    write_plan_timings(5, plan_o)
 
     df_r = materialise(PATH_R, bm_region["result"], ["r_regionkey", "r_name"])
     df_n = pd.read_parquet(PATH_N)
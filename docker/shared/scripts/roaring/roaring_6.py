@@ -1,11 +1,17 @@
 import os, sys, time
-import duckdb, pyarrow.parquet as pq, pandas as pd
-from pyroaring import BitMap
+import duckdb, pyarrow as pa, pyarrow.compute as pc, pyarrow.parquet as pq, pandas as pd
 from datafusion import SessionContext
-from functools import reduce
 
 from common_roaring import (
-    bitmap_memory_size,
+    report_index_memory,
+    use_row_space,
+    DECIMAL_SCALE,
+    BitSlicedIndex,
+    DateBinIndex,
+    BitmapPlanner,
+    Ref, And,
+    write_plan_timings,
+    index_memory_size,
     measure_query_duckdb,
     measure_query_datafusion,
     write_csv_results,
@@ -19,32 +25,32 @@ os.makedirs("../results", exist_ok=True)
 BATCH = 6000000
 FROM  = pd.to_datetime("1994-01-01")
 TO    = pd.to_datetime("1995-01-01")
-DISC  = 0.05
+DISC_LO, DISC_HI = 0.05, 0.05
 QTY_LT = 24
 
 
-def combine(bitmaps):
-    return reduce(lambda a, b: a | b, bitmaps, BitMap())
-
-
 def index_line(path):
-    idx_ship, idx_disc, idx_qty = {}, {}, {}
+    cols     = ["l_shipdate", "l_discount", "l_quantity"]
+    idx_ship = DateBinIndex()
     rows, bytes_, t0 = 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
+    for b in pq.ParquetFile(path).iter_batches(BATCH, columns=cols):
         df, n = b.to_pandas(), len(b)
         df["l_shipdate"] = pd.to_datetime(df["l_shipdate"])
         bytes_ += (df["l_shipdate"].memory_usage(deep=True) +
                    df["l_discount"].memory_usage(deep=True) +
                    df["l_quantity"].memory_usage(deep=True))
-        for col, idx in (("l_shipdate", idx_ship),
-                         ("l_discount", idx_disc),
-                         ("l_quantity", idx_qty)):
-            for v in df[col].unique():
-                idx.setdefault(v, BitMap()).update(
-                    i + rows for i in df.index[df[col] == v]
-                )
+        idx_ship.add(b.column("l_shipdate"), rows)
         rows += n
-    return idx_ship, idx_disc, idx_qty, rows, bytes_, time.perf_counter() - t0
+
+    # The BSIs store the decimals as hundredths, so a range costs one pass
+    # over the slices instead of an OR over every distinct value.
+    table = pq.read_table(path, columns=["l_discount", "l_quantity"])
+    bsi_disc, bsi_qty = (
+        BitSlicedIndex.build(pc.cast(table.column(c), pa.float64()).to_numpy(),
+                             DECIMAL_SCALE)
+        for c in ("l_discount", "l_quantity")
+    )
+    return idx_ship, bsi_disc, bsi_qty, rows, bytes_, time.perf_counter() - t0
 
 
 def materialise(path, bitmap, cols):
@@ -88,30 +94,34 @@ def prepare_datafusion(df_line, sql_file):
 
 if __name__ == "__main__":
     PATH_L = "../data/tpch/parquet/lineitem.parquet"
+    use_row_space(PATH_L)
 
-    ship_idx, disc_idx, qty_idx, rows, bytes_, build_secs = index_line(PATH_L)
+    ship_idx, disc_bsi, qty_bsi, rows, bytes_, build_secs = index_line(PATH_L)
+    report_index_memory(6, {"l_shipdate": ship_idx, "l_discount": disc_bsi,
+                            "l_quantity": qty_bsi})
 
-    t0 = time.perf_counter()
-    ship_bm = combine([bm for d, bm in ship_idx.items() if FROM <= d < TO])
-    disc_bm = disc_idx.get(DISC, BitMap())
-    qty_bm  = combine([bm for q, bm in qty_idx.items() if q < QTY_LT])
-    bm_build_time = time.perf_counter() - t0               
+    planner = BitmapPlanner({
+        "ship": lambda: ship_idx.range(FROM, TO),
+        "disc": lambda: disc_bsi.between(DISC_LO, DISC_HI),
+        "qty":  lambda: qty_bsi.lt(QTY_LT),
+    })
+    plan = And(Ref("ship"), Ref("disc"), Ref("qty"))
 
-    bm_filter = measure_query_execution(lambda: ship_bm & disc_bm & qty_bm)
+    bm_filter = measure_query_execution(lambda: planner.evaluate(plan))
     final_bitmap = bm_filter["result"]
+    write_plan_timings(6, planner)
 
     df_line = materialise(
         PATH_L, final_bitmap,
         ["l_extendedprice", "l_discount", "l_quantity", "l_shipdate"]
     )
 
-    bitmap_mb   = bitmap_memory_size(ship_idx, disc_idx, qty_idx)
+    bitmap_mb   = index_memory_size(ship_idx, disc_bsi, qty_bsi)
     original_mb = bytes_ / (1024 * 1024)
 
     con, q_duck = prepare_duckdb(df_line, "../data/tpch/queries/6.sql")
     eng_duck    = measure_query_duckdb(6, con, q_duck)
-    stage_build = {"Latency (s)": bm_build_time}            
-    res_duck    = aggregate_metrics(stage_build, bm_filter, eng_duck)
+    res_duck    = aggregate_metrics(bm_filter, eng_duck)
 
     res_duck.update({
         "Query": 6,
@@ -123,7 +133,7 @@ if __name__ == "__main__":
 
     ctx, q_df = prepare_datafusion(df_line, "../data/tpch/queries/6.sql")
     eng_df    = measure_query_datafusion(6, ctx, q_df)
-    res_df    = aggregate_metrics(stage_build, bm_filter, eng_df)
+    res_df    = aggregate_metrics(bm_filter, eng_df)
 
     res_df.update({
         "Query": 6,
@@ -1,10 +1,15 @@
 import os, sys, time
 import duckdb, pyarrow.parquet as pq, pandas as pd
-from pyroaring import BitMap
 from datafusion import SessionContext
-from functools import reduce
 
 from common_roaring import (
+    report_index_memory,
+    new_bitmap,
+    use_row_space,
+    index_column,
+    BitmapPlanner,
+    Ref,
+    write_plan_timings,
     bitmap_memory_size,
     measure_query_duckdb,
     measure_query_datafusion,
@@ -19,45 +24,34 @@ os.makedirs("../results", exist_ok=True)
 BATCH = 6000000
 REGION = "AMERICA"
 PART   = "ECONOMY ANODIZED STEEL"
-FROM   = pd.to_datetime("1995-01-01")
-TO     = pd.to_datetime("1997-01-01")
-
-
-def combine(bitmaps):
-    return reduce(lambda a, b: a | b, bitmaps, BitMap())
+FROM   = pd.to_datetime("1995-01-01").date()
+TO     = pd.to_datetime("1997-01-01").date()
 
 
 def idx_region(path):
     idx, rows, bytes_, t0 = {}, 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = b.to_pandas(), len(b)
-        bytes_ += df["r_name"].memory_usage(deep=True)
-        for v in df["r_name"].unique():
-            idx.setdefault(v, BitMap()).update(i + rows for i in df.index[df["r_name"] == v])
-        rows += n
+    for b in pq.ParquetFile(path).iter_batches(BATCH, columns=["r_name"]):
+        bytes_ += b.column("r_name").to_pandas().memory_usage(deep=True)
+        index_column(b.column("r_name"), rows, idx)
+        rows += len(b)
     return idx, rows, bytes_, time.perf_counter() - t0
 
 
 def idx_part(path):
     idx, rows, bytes_, t0 = {}, 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = b.to_pandas(), len(b)
-        bytes_ += df["p_type"].memory_usage(deep=True)
-        for v in df["p_type"].unique():
-            idx.setdefault(v, BitMap()).update(i + rows for i in df.index[df["p_type"] == v])
-        rows += n
+    for b in pq.ParquetFile(path).iter_batches(BATCH, columns=["p_type"]):
+        bytes_ += b.column("p_type").to_pandas().memory_usage(deep=True)
+        index_column(b.column("p_type"), rows, idx)
+        rows += len(b)
     return idx, rows, bytes_, time.perf_counter() - t0
 
 
 def idx_orders(path):
     idx, rows, bytes_, t0 = {}, 0, 0, time.perf_counter()
-    for b in pq.ParquetFile(path).iter_batches(BATCH):
-        df, n = b.to_pandas(), len(b)
-        df["o_orderdate"] = pd.to_datetime(df["o_orderdate"])
-        bytes_ += df["o_orderdate"].memory_usage(deep=True)
-        for d in df["o_orderdate"].unique():
-            idx.setdefault(d, BitMap()).update(i + rows for i in df.index[df["o_orderdate"] == d])
-        rows += n
+    for b in pq.ParquetFile(path).iter_batches(BATCH, columns=["o_orderdate"]):
+        bytes_ += pd.to_datetime(b.column("o_orderdate").to_pandas()).memory_usage(deep=True)
+        index_column(b.column("o_orderdate"), rows, idx)
+        rows += len(b)
     return idx, rows, bytes_, time.perf_counter() - t0
 
 
@@ -132,22 +126,32 @@ if __name__ == "__main__":
     PATH_L = "../data/tpch/parquet/lineitem.parquet"
     PATH_O = "../data/tpch/parquet/orders.parquet"
     PATH_C = "../data/tpch/parquet/customer.parquet"
+    use_row_space(PATH_R, PATH_N, PATH_P, PATH_S, PATH_L, PATH_O, PATH_C)
 
     r_idx, rows_r, bytes_r, sec_r = idx_region(PATH_R)
     p_idx, rows_p, bytes_p, sec_p = idx_part(PATH_P)
     o_idx, rows_o, bytes_o, sec_o = idx_orders(PATH_O)
-
-    bm_r = measure_query_execution(
-        lambda: BitMap(range(rows_r)) & r_idx.get(REGION, BitMap())
-    )
-    bm_p = measure_query_execution(
-        lambda: BitMap(range(rows_p)) & p_idx.get(PART, BitMap())
-    )
-    bm_o = measure_query_execution(
-        lambda: BitMap(range(rows_o)) & combine(
-            [bm for d, bm in o_idx.items() if FROM <= d < TO]
-        )
-    )
+    report_index_memory(8, {"r_name": r_idx, "p_type": p_idx, "o_orderdate": o_idx})
+
+    plan_r = BitmapPlanner({
+        "region": r_idx.get(REGION, new_bitmap()),
+    }, universe=rows_r)
+    bm_r = measure_query_execution(lambda: plan_r.evaluate(Ref("region")))
+    write_plan_timings(8, plan_r)
+
+    plan_p = BitmapPlanner({
+        "part_type": p_idx.get(PART, new_bitmap()),
+    }, universe=rows_p)
+    bm_p = measure_query_execution(lambda: plan_p.evaluate(Ref("part_type")))
+    write_plan_timings(8, plan_p)
+
+    plan_o = BitmapPlanner({
+        "orderdate_range": lambda: new_bitmap().union(
+            *[bm for d, bm in o_idx.items() if FROM <= d < TO]
+        ),
+    }, universe=rows_o)
+    bm_o = measure_query_execution(lambda: plan_o.evaluate(Ref("orderdate_range")))
+    write_plan_timings(8, plan_o)
 
     df_r = materialise(PATH_R, bm_r["result"], ["r_regionkey", "r_name"])
     df_p = materialise(PATH_P, bm_p["result"], ["p_partkey", "p_type"])
@@ -7,6 +7,7 @@ PLOTS_DIR="../results/plots"
 RESULTS_ROARING_DIR="../results/roaring"
 RESULTS_FAST_DIR="../results/fast"
 RESULTS_KDTREE_DIR="../results/kdtree"
+RESULTS_ZORDER_DIR="../results/zorder"
 DATA_TPCH_DIR="../data/tpch/parquet/"
 
 
@@ -31,6 +32,11 @@ mkdir "$RESULTS_KDTREE_DIR"/duckdb
 mkdir "$RESULTS_KDTREE_DIR"/datafusion
 mkdir "$RESULTS_KDTREE_DIR"/plots
 mkdir "$RESULTS_KDTREE_DIR"/analyze
+mkdir $RESULTS_ZORDER_DIR
+mkdir "$RESULTS_ZORDER_DIR"/duckdb
+mkdir "$RESULTS_ZORDER_DIR"/datafusion
+mkdir "$RESULTS_ZORDER_DIR"/plots
+mkdir "$RESULTS_ZORDER_DIR"/analyze
 mkdir $PLOTS_DIR
 mkdir "$PLOTS_DIR"/tpch
 mkdir "$PLOTS_DIR"/tpcds
@@ -52,6 +58,12 @@ python3 ./roaring/roaring_8.py
 python3 ./roaring/roaring_10.py
 python3 ./roaring/roaring_12.py
 python3 ./roaring/roaring_22.py
+python3 ./roaring/bench_bitmap_build.py
+python3 ./roaring/bench_bsi.py
+python3 ./roaring/bench_parallel_build.py
+python3 ./roaring/bench_bitmap64.py
+python3 ./roaring/bench_reorder.py
+python3 ./roaring/bench_formats.py
 python3 ./roaring/plots_roaring.py
 
 make clean -C ./fast && make -C ./fast
@@ -74,9 +86,19 @@ make clean -C ./kdtree && make -C ./kdtree
 
 python3 ./kdtree/kdtree_6.py
 python3 ./kdtree/kdtree_19.py
+python3 ./kdtree/kdtree_6.py --index strtree
+python3 ./kdtree/kdtree_19.py --index strtree
+python3 ./kdtree/bench_leaf_scan.py
+python3 ./kdtree/kdtree_build_scaling.py
+python3 ./kdtree/kdtree_autotune.py
 python3 ./kdtree/plots_kdtree.py 
 
+python3 ./zorder/zorder_6.py
+python3 ./zorder/plots_zorder.py
+
 DATA_TPCH_DIR="../data/tpch/parquet/"
 if [ -d "$DATA_TPCH_DIR" ]; then
   rm -f "$DATA_TPCH_DIR"/filtered_*.parquet
+  rm -f "$DATA_TPCH_DIR"/lineitem_{lex,gray}.parquet
+  rm -f "$DATA_TPCH_DIR"/lineitem_{none,zorder,hilbert}.parquet
 fi
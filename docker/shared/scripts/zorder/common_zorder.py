@@ -0,0 +1,303 @@
+import os
+import sys
+import csv
+import datetime
+import decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from datafusion import SessionContext
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from common import measure_query_execution
+
+DECIMAL_SCALE = 100
+KEY_BITS      = 63
+BLOCK_ROWS    = 1 << 14
+CURVES        = ("none", "zorder", "hilbert")
+EPOCH         = datetime.date(1970, 1, 1)
+
+
+def column_codes(arr) -> np.ndarray:
+    """Dense 0-based ranks of ``arr``; works for any orderable Arrow type
+    (dates, decimals, strings), so every column lands on 0..k-1."""
+    ranks = pc.rank(arr, sort_keys="ascending", tiebreaker="dense")
+    return ranks.to_numpy(zero_copy_only=False).astype(np.uint64) - 1
+
+
+def stretch(codes: np.ndarray, bits: int) -> np.ndarray:
+    """Spread dense codes over the full ``bits``-bit range so a column with
+    eleven values weighs as much in the curve as one with thousands."""
+    top  = np.uint64((1 << bits) - 1)
+    span = max(int(codes.max()) if len(codes) else 0, 1)
+    return codes * top // np.uint64(span)
+
+
+def interleave(coords: Sequence[np.ndarray], bits: int) -> np.ndarray:
+    """Morton key: bit b of coordinate i goes to bit b*n + (n-1-i), so the
+    first coordinate holds the most significant bit of every group."""
+    n   = len(coords)
+    key = np.zeros(len(coords[0]), dtype=np.uint64)
+    one = np.uint64(1)
+    for b in range(bits):
+        for i, c in enumerate(coords):
+            key |= ((c >> np.uint64(b)) & one) << np.uint64(b * n + n - 1 - i)
+    return key
+
+
+def z_order_keys(coords: Sequence[np.ndarray], bits: int) -> np.ndarray:
+    return interleave(coords, bits)
+
+
+# Skilling, "Programming the Hilbert curve" (2004): turn the axes into the
+# transposed Hilbert index in place, then interleave it like a Morton key.
+def hilbert_keys(coords: Sequence[np.ndarray], bits: int) -> np.ndarray:
+    x = [c.astype(np.uint64, copy=True) for c in coords]
+    n = len(x)
+
+    q = 1 << (bits - 1)
+    while q > 1:
+        p = np.uint64(q - 1)
+        for i in range(n):
+            hit = (x[i] & np.uint64(q)) != 0
+            x[0] = np.where(hit, x[0] ^ p, x[0])
+            t = np.where(hit, np.uint64(0), (x[0] ^ x[i]) & p)
+            x[0] ^= t
+            x[i] ^= t
+        q >>= 1
+
+    for i in range(1, n):
+        x[i] ^= x[i - 1]
+    t = np.zeros_like(x[0])
+    q = 1 << (bits - 1)
+    while q > 1:
+        t = np.where((x[n - 1] & np.uint64(q)) != 0, t ^ np.uint64(q - 1), t)
+        q >>= 1
+    for i in range(n):
+        x[i] ^= t
+
+    return interleave(x, bits)
+
+
+def curve_keys(table: pa.Table,
+               columns: Sequence[str],
+               curve: str,
+               bits: Optional[int] = None) -> np.ndarray:
+    """One uint64 sort key per row of ``table`` over ``columns``."""
+    bits   = bits or min(KEY_BITS // len(columns), 32)
+    coords = [stretch(column_codes(table.column(c)), bits) for c in columns]
+    if curve == "hilbert":
+        return hilbert_keys(coords, bits)
+    return z_order_keys(coords, bits)
+
+
+def rewrite_clustered(src: str,
+                      dest: str,
+                      columns: Sequence[str],
+                      curve: str,
+                      block_rows: int = BLOCK_ROWS) -> int:
+    """Rewrite ``src`` sorted along ``curve`` (``"none"`` keeps the original
+    order) with one row group per ``block_rows`` rows, so the row group
+    statistics become the per-block min/max synopsis. Returns the row count."""
+    table = pq.read_table(src)
+    if curve != "none":
+        order = np.argsort(curve_keys(table, columns, curve), kind="stable")
+        table = table.take(pa.array(order))
+    pq.write_table(table, dest, row_group_size=block_rows)
+    return table.num_rows
+
+
+def encode_value(value):
+    """Synopsis encoding: dates as epoch days, decimals scaled by
+    DECIMAL_SCALE, everything else as is."""
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return (value - EPOCH).days
+    if isinstance(value, decimal.Decimal):
+        return int(value * DECIMAL_SCALE)
+    return value
+
+
+def load_synopsis(path: str, columns: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Per-block min/max of ``columns`` read from the row group statistics
+    alone; blocks without statistics get an unbounded range and are never
+    skipped. ``starts`` holds each block's first row, plus the row count."""
+    meta  = pq.ParquetFile(path).metadata
+    names = [meta.schema.column(i).name for i in range(meta.num_columns)]
+    nb    = meta.num_row_groups
+
+    lo     = np.full((len(columns), nb), -np.inf)
+    hi     = np.full((len(columns), nb),  np.inf)
+    starts = np.zeros(nb + 1, dtype=np.int64)
+    for g in range(nb):
+        rg = meta.row_group(g)
+        starts[g + 1] = starts[g] + rg.num_rows
+        for d, col in enumerate(columns):
+            stats = rg.column(names.index(col)).statistics
+            if stats is not None and stats.has_min_max:
+                lo[d, g] = encode_value(stats.min)
+                hi[d, g] = encode_value(stats.max)
+    return {"lo": lo, "hi": hi, "starts": starts}
+
+
+def synopsis_memory_size(synopsis: Dict[str, np.ndarray]) -> float:
+    return sum(a.nbytes for a in synopsis.values()) / (1024 * 1024)
+
+
+def skip_blocks(synopsis: Dict[str, np.ndarray],
+                lo: Sequence[float],
+                hi: Sequence[float]) -> np.ndarray:
+    """Ids of the blocks whose min/max box overlaps the inclusive query box
+    ``lo``..``hi`` (one bound per synopsis column)."""
+    lo = np.asarray(lo, dtype=np.float64)[:, None]
+    hi = np.asarray(hi, dtype=np.float64)[:, None]
+    hit = ((synopsis["hi"] >= lo) & (synopsis["lo"] <= hi)).all(axis=0)
+    return np.flatnonzero(hit)
+
+
+def block_ranges(synopsis: Dict[str, np.ndarray],
+                 blocks: np.ndarray) -> List[Tuple[int, int]]:
+    """Merge runs of adjacent ``blocks`` into half-open row ranges."""
+    if len(blocks) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(blocks) != 1) + 1
+    firsts = np.concatenate(([blocks[0]], blocks[breaks]))
+    lasts  = np.concatenate((blocks[breaks - 1], [blocks[-1]]))
+    starts = synopsis["starts"]
+    return [(int(starts[f]), int(starts[l + 1])) for f, l in zip(firsts, lasts)]
+
+
+def range_filter(synopsis: Dict[str, np.ndarray],
+                 lo: Sequence[float],
+                 hi: Sequence[float]) -> List[Tuple[int, int]]:
+    """Block-skipping filter: the row ranges that may hold rows inside the
+    box. Rows outside the ranges are guaranteed not to match; rows inside
+    still need the predicate."""
+    return block_ranges(synopsis, skip_blocks(synopsis, lo, hi))
+
+
+def write_blocks_parquet(file_path: str,
+                         blocks: np.ndarray,
+                         dest: str,
+                         float_cols: Iterable[str] = ()) -> int:
+    """Copy the row groups ``blocks`` of ``file_path`` to ``dest``, casting
+    ``float_cols`` to float64. Returns the number of rows written."""
+    pf     = pq.ParquetFile(file_path)
+    schema = pf.schema_arrow
+    for name in float_cols:
+        if name in schema.names:
+            schema = schema.set(schema.get_field_index(name),
+                                pa.field(name, pa.float64()))
+
+    written = 0
+    with pq.ParquetWriter(dest, schema) as writer:
+        for g in blocks:
+            table = pf.read_row_group(int(g))
+            writer.write_table(table.cast(schema))
+            written += table.num_rows
+    return written
+
+
+def aggregate_metrics(*metric_dicts: Dict[str, float]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+
+    tot_latency      = 0.0
+    cpu_weighted_sum = 0.0
+    iops_weighted_sum = 0.0
+
+    for md in metric_dicts:
+        if not md:
+            continue
+
+        lat = md.get("Latency (s)")
+        if lat is not None:
+            out["Latency (s)"] = (out.get("Latency (s)", 0.0) + lat)
+            tot_latency += lat
+
+        for mkey in ("Peak Memory Usage (MB)", "Average Memory Usage (MB)"):
+            mem = md.get(mkey)
+            if mem is not None:
+                out[mkey] = max(out.get(mkey, 0.0), mem)
+
+        cpu  = md.get("CPU Usage (%)")
+        if cpu is not None and lat is not None:
+            cpu_weighted_sum  += cpu  * lat
+
+        iops = md.get("IOPS (ops/s)")
+        if iops is not None and lat is not None:
+            iops_weighted_sum += iops * lat
+
+    if tot_latency > 0:
+        if cpu_weighted_sum:
+            out["CPU Usage (%)"] = cpu_weighted_sum / tot_latency
+        if iops_weighted_sum:
+            out["IOPS (ops/s)"]  = iops_weighted_sum / tot_latency
+
+    return out
+
+
+def measure_query_duckdb(query_number: int, con, query, num_runs: int = 3):
+    con.execute("SET explain_output = 'all';")
+    con.execute("PRAGMA enable_profiling = json;")
+    con.execute("SET profiling_mode = detailed;")
+    profile_path = f"../results/zorder/analyze/{query_number}.json"
+    os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+    con.execute(f"SET profiling_output = '{profile_path}';")
+    con.execute(query)
+    con.execute("PRAGMA disable_profiling;")
+    runs = [measure_query_execution(lambda: con.execute(query).fetchall())
+            for _ in range(num_runs)]
+    result = _aggregate_runs(runs)
+    result["Query"] = query_number
+    return result
+
+
+def measure_query_datafusion(
+    query_number: int,
+    ctx: SessionContext,
+    query_str: str,
+    num_runs: int = 3,
+):
+    runs = [measure_query_execution(lambda: ctx.sql(query_str).collect())
+            for _ in range(num_runs)]
+    result = _aggregate_runs(runs)
+    result["Query"] = query_number
+    return result
+
+
+def write_csv_results(csv_path, fieldnames, rows):
+    first_time = (not os.path.exists(csv_path)) or os.path.getsize(csv_path) == 0
+    with open(csv_path, "a", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=fieldnames)
+        if first_time:
+            w.writeheader()
+        w.writerows(rows)
+
+
+def _aggregate_runs(runs_data):
+    if not runs_data:
+        return {}
+
+    agg: Dict[str, float] = {}
+    numeric = (int, float)
+
+    keys = set().union(*(rd.keys() for rd in runs_data))
+
+    for k in keys:
+        vals = [rd.get(k) for rd in runs_data if rd.get(k) is not None]
+
+        if not vals:
+            continue
+
+        if all(isinstance(v, numeric) for v in vals):
+            if k == "Peak Memory Usage (MB)":
+                agg[k] = max(vals)
+            else:
+                agg[k] = sum(vals) / len(vals)
+        else:
+            agg[k] = vals[0]
+
+    return agg
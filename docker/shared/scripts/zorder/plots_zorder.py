@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import argparse
+import pathlib
+import sys
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+DEFAULT_PATHS = {
+    "zorder_duckdb":      "../results/zorder/duckdb/zorder_tpch.csv",
+    "zorder_datafusion":  "../results/zorder/datafusion/zorder_tpch.csv",
+    "kdtree_duckdb":      "../results/kdtree/duckdb/kdtree_tpch.csv",
+    "kdtree_datafusion":  "../results/kdtree/datafusion/kdtree_tpch.csv",
+    "roaring_duckdb":     "../results/roaring/duckdb/roaring_tpch.csv",
+    "roaring_datafusion": "../results/roaring/datafusion/roaring_tpch.csv",
+    "out_dir":            "../results/zorder/plots",
+}
+
+METRICS: List[Tuple[str, str]] = [
+    ("Latency (s)",               "latency"),
+    ("CPU Usage (%)",             "cpu_usage"),
+    ("Peak Memory Usage (MB)",    "peak_mem"),
+    ("Average Memory Usage (MB)", "avg_mem"),
+]
+
+
+def _load_q6(path: str, label: str) -> pd.DataFrame | None:
+    p = pathlib.Path(path)
+    if not p.exists():
+        print(f"[WARN] {label} → file not found: {p.resolve()}", file=sys.stderr)
+        return None
+    df = pd.read_csv(p)
+    return df[df["Query"] == 6]
+
+
+def _methods(zorder: pd.DataFrame,
+             kdtree: pd.DataFrame | None,
+             roaring: pd.DataFrame | None) -> pd.DataFrame:
+    frames = [zorder.assign(Method=zorder["Layout"].map(lambda l: f"blocks ({l})"))]
+    if kdtree is not None:
+        frames.append(kdtree.assign(Method="kdtree"))
+    if roaring is not None:
+        frames.append(roaring.assign(Method="roaring"))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _plot_methods(df: pd.DataFrame, metric: str, title: str,
+                  outfile: pathlib.Path) -> None:
+    df = df.dropna(subset=[metric])
+    if df.empty:
+        return
+    y = np.arange(len(df))
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    bars = ax.barh(y, df[metric])
+    ax.set_yticks(y)
+    ax.set_yticklabels(df["Method"])
+    ax.set_xlabel(metric)
+    ax.set_title(title)
+    for rect in bars:
+        value = rect.get_width()
+        ax.annotate(f"{value:.3f}",
+                    xy=(value, rect.get_y() + rect.get_height() / 2),
+                    xytext=(3, 0), textcoords="offset points",
+                    ha="left", va="center")
+    fig.tight_layout()
+    fig.savefig(outfile)
+    plt.close(fig)
+
+
+def _plot_blocks(df: pd.DataFrame, outfile: pathlib.Path) -> None:
+    y = np.arange(len(df))
+    frac = df["Blocks Scanned"] / df["Blocks Total"]
+
+    fig, ax = plt.subplots(figsize=(8, 4))
+    bars = ax.barh(y, frac)
+    ax.set_yticks(y)
+    ax.set_yticklabels(df["Layout"])
+    ax.set_xlim(0, 1.05)
+    ax.set_xlabel("Fraction of blocks scanned")
+    ax.set_title("Q6 block skipping by layout")
+    for rect, scanned, total in zip(bars, df["Blocks Scanned"], df["Blocks Total"]):
+        ax.annotate(f"{scanned}/{total}",
+                    xy=(rect.get_width(), rect.get_y() + rect.get_height() / 2),
+                    xytext=(3, 0), textcoords="offset points",
+                    ha="left", va="center")
+    fig.tight_layout()
+    fig.savefig(outfile)
+    plt.close(fig)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Plot Q6 block skipping against the KD-tree and Roaring indexes"
+    )
+    for key, default in DEFAULT_PATHS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", default=default)
+    args = parser.parse_args()
+
+    out_dir = pathlib.Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    for engine, label in (("duckdb", "DuckDB"), ("datafusion", "DataFusion")):
+        zorder = _load_q6(getattr(args, f"zorder_{engine}"), f"Z-order {label}")
+        if zorder is None or zorder.empty:
+            continue
+        df = _methods(zorder,
+                      _load_q6(getattr(args, f"kdtree_{engine}"),  f"KDTree {label}"),
+                      _load_q6(getattr(args, f"roaring_{engine}"), f"Roaring {label}"))
+        for metric, stem in METRICS:
+            _plot_methods(df, metric, f"Q6 {metric} ({label})",
+                          out_dir / f"{stem}_{engine}.png")
+        if engine == "duckdb":
+            _plot_blocks(zorder, out_dir / "blocks_scanned.png")
+
+
+if __name__ == "__main__":
+    main()
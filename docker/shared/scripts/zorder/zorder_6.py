@@ -0,0 +1,127 @@
+import os
+import time
+import duckdb
+from datetime import datetime
+from datafusion import SessionContext
+
+from common_zorder import (
+    BLOCK_ROWS,
+    CURVES,
+    DECIMAL_SCALE,
+    rewrite_clustered,
+    load_synopsis,
+    synopsis_memory_size,
+    skip_blocks,
+    block_ranges,
+    write_blocks_parquet,
+    measure_query_duckdb,
+    measure_query_datafusion,
+    write_csv_results,
+    aggregate_metrics,
+)
+from common import measure_query_execution
+from zorder_rewrite import clustered_path
+
+# Same file, box and engines as kdtree_6.py and roaring_6.py, so the three
+# result CSVs line up on Query 6.
+FILE          = "../data/tpch/parquet/lineitem.parquet"
+START_DATE    = "1994-01-01"
+END_DATE      = "1995-01-01"
+DISC          = 0.05
+QTY_LT        = 24
+QUERY_PATH    = "../data/tpch/queries/6.sql"
+FILTERED_PATH = "../data/tpch/parquet/filtered_lineitem.parquet"
+NUMERIC_COLS  = ("l_extendedprice", "l_quantity", "l_discount", "l_tax")
+KEY_COLS      = ("l_shipdate", "l_discount", "l_quantity")
+RESULT_DIR    = "../results/zorder/"
+
+FIELDNAMES = [
+    "Query",
+    "Layout",
+    "Latency (s)",
+    "CPU Usage (%)",
+    "Peak Memory Usage (MB)",
+    "Average Memory Usage (MB)",
+    "IOPS (ops/s)",
+    "Blocks Scanned",
+    "Blocks Total",
+    "Row Ranges",
+    "Rows Scanned",
+    "Synopsis Size (MB)",
+    "Layout Creation Time (s)",
+]
+
+
+def date_to_int32(date_str: str) -> int:
+    dt    = datetime.strptime(date_str, "%Y-%m-%d")
+    epoch = datetime(1970, 1, 1)
+    return int((dt - epoch).days)
+
+
+def q6_box():
+    lo = [date_to_int32(START_DATE),     round(DISC * DECIMAL_SCALE), 0]
+    hi = [date_to_int32(END_DATE) - 1,   round(DISC * DECIMAL_SCALE),
+          QTY_LT * DECIMAL_SCALE - 1]
+    return lo, hi
+
+
+def prepare_duckdb(dest: str, query_file: str):
+    con = duckdb.connect(":memory:")
+    con.execute(f"CREATE TABLE lineitem AS SELECT * FROM read_parquet('{dest}')")
+    return con, open(query_file).read()
+
+
+def prepare_datafusion(dest: str, query_file: str):
+    ctx = SessionContext()
+    ctx.register_parquet("lineitem", dest)
+    return ctx, open(query_file).read()
+
+
+if __name__ == "__main__":
+    os.makedirs(os.path.join(RESULT_DIR, "duckdb"),     exist_ok=True)
+    os.makedirs(os.path.join(RESULT_DIR, "datafusion"), exist_ok=True)
+
+    lo, hi = q6_box()
+    rows_duck, rows_df = [], []
+
+    for curve in CURVES:
+        path = clustered_path(FILE, curve)
+        t0 = time.perf_counter()
+        rewrite_clustered(FILE, path, KEY_COLS, curve, BLOCK_ROWS)
+        synopsis    = load_synopsis(path, KEY_COLS)
+        layout_secs = time.perf_counter() - t0
+
+        lookup_metrics = measure_query_execution(
+            lambda: skip_blocks(synopsis, lo, hi)
+        )
+        blocks = lookup_metrics.pop("result")
+        ranges = block_ranges(synopsis, blocks)
+
+        scanned = write_blocks_parquet(path, blocks, FILTERED_PATH, NUMERIC_COLS)
+        extras  = {
+            "Query": 6,
+            "Layout":                   curve,
+            "Blocks Scanned":           len(blocks),
+            "Blocks Total":             len(synopsis["starts"]) - 1,
+            "Row Ranges":               len(ranges),
+            "Rows Scanned":             scanned,
+            "Synopsis Size (MB)":       synopsis_memory_size(synopsis),
+            "Layout Creation Time (s)": layout_secs,
+        }
+
+        con, sql_duck = prepare_duckdb(FILTERED_PATH, QUERY_PATH)
+        combined_duck = aggregate_metrics(lookup_metrics,
+                                          measure_query_duckdb(6, con, sql_duck))
+        combined_duck.update(extras)
+        rows_duck.append(combined_duck)
+
+        ctx, sql_df = prepare_datafusion(FILTERED_PATH, QUERY_PATH)
+        combined_df = aggregate_metrics(lookup_metrics,
+                                        measure_query_datafusion(6, ctx, sql_df))
+        combined_df.update(extras)
+        rows_df.append(combined_df)
+
+    write_csv_results(os.path.join(RESULT_DIR, "duckdb", "zorder_tpch.csv"),
+                      FIELDNAMES, rows_duck)
+    write_csv_results(os.path.join(RESULT_DIR, "datafusion", "zorder_tpch.csv"),
+                      FIELDNAMES, rows_df)
@@ -0,0 +1,30 @@
+import os
+import argparse
+import time
+
+from common_zorder import BLOCK_ROWS, CURVES, rewrite_clustered
+
+SOURCE = "../data/tpch/parquet/lineitem.parquet"
+
+
+def clustered_path(source: str, curve: str) -> str:
+    root, ext = os.path.splitext(source)
+    return f"{root}_{curve}{ext}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rewrite a Parquet table clustered along a space-filling curve"
+    )
+    parser.add_argument("--input", default=SOURCE)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--curve", choices=CURVES, default="zorder")
+    parser.add_argument("--columns", nargs="+",
+                        default=["l_shipdate", "l_discount", "l_quantity"])
+    parser.add_argument("--block-rows", type=int, default=BLOCK_ROWS)
+    args = parser.parse_args()
+
+    dest = args.output or clustered_path(args.input, args.curve)
+    t0   = time.perf_counter()
+    rows = rewrite_clustered(args.input, dest, args.columns, args.curve, args.block_rows)
+    print(f"{dest}: {rows} rows in {time.perf_counter() - t0:.2f}s")